@@ -3,12 +3,19 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import codecs
+import collections
+import mmap
+import os
+import random
 import socket
 import sys
+import threading
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import BinaryIO, Iterator, Optional, TextIO, Tuple
 
 EXIT_SOCKET_CREATE = 10
 EXIT_CONNECT_FAILURE = 20
@@ -17,6 +24,7 @@ EXIT_PROTOCOL_ERROR = 40
 EXIT_UTF8_WARNING = 41
 
 BUFFER_SIZE = 4096
+RETRY_BACKOFF_CAP = 10.0  # seconds; upper bound for one jittered retry delay
 
 
 def _now_ts() -> str:
@@ -24,8 +32,9 @@ def _now_ts() -> str:
 
 
 class Logger:
-    def __init__(self, debug: bool = False) -> None:
+    def __init__(self, debug: bool = False, stream: Optional[TextIO] = None) -> None:
         self.debug = debug
+        self.stream = stream  # None means stdout
 
     def info(self, message: str, **extra: object) -> None:
         self._log("INFO", message, extra)
@@ -45,7 +54,7 @@ class Logger:
             bits = " ".join(f"{key}={value}" for key, value in extra.items())
             if bits:
                 suffix = f" {bits}"
-        print(f"{_now_ts()} {level} {message}{suffix}", flush=True)
+        print(f"{_now_ts()} {level} {message}{suffix}", file=self.stream, flush=True)
 
 
 @dataclass
@@ -60,6 +69,9 @@ class ClientConfig:
     retry_count: int
     retry_backoff: float
     debug: bool
+    stream: bool = False
+    records: str = "line"
+    window: int = 32
 
 
 def parse_args(argv: list[str]) -> ClientConfig:
@@ -91,15 +103,36 @@ def parse_args(argv: list[str]) -> ClientConfig:
         "--retry-backoff",
         type=float,
         default=0.3,
-        help="Base backoff in seconds between retries (default: 0.3)",
+        help="Base delay in seconds for jittered exponential backoff between retries (default: 0.3)",
     )
     parser.add_argument("--debug", action="store_true", help="Enable hex previews in logs")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Send every record from --input stdin/file over one connection and write the echoes to stdout",
+    )
+    parser.add_argument(
+        "--records",
+        choices=["line", "len"],
+        default="line",
+        help="Record format of --stream input and output: lines or 4-byte length-prefixed (default: line)",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=32,
+        help="Records in flight at once in --stream mode (default: 32)",
+    )
     args = parser.parse_args(argv)
 
     if args.input == "inline" and args.text is None:
         parser.error("--text is required when --input inline")
     if args.input == "file" and args.path is None:
         parser.error("--path is required when --input file")
+    if args.stream and args.input == "inline":
+        parser.error("--stream reads records from --input stdin or file")
+    if args.window < 1:
+        parser.error("--window must be at least 1")
 
     return ClientConfig(
         host=args.host,
@@ -112,6 +145,9 @@ def parse_args(argv: list[str]) -> ClientConfig:
         retry_count=max(args.retry_count, 1),
         retry_backoff=max(args.retry_backoff, 0.0),
         debug=args.debug,
+        stream=args.stream,
+        records=args.records,
+        window=args.window,
     )
 
 
@@ -154,6 +190,158 @@ def prepare_payload(config: ClientConfig) -> bytes:
     return payload
 
 
+FILE_CHUNK_SIZE = 1 << 20  # slice of the mapping validated and sent per step
+MAX_FRAME_BYTES = 0xFFFFFFFF  # largest payload a 4-byte len-mode prefix can announce
+
+
+def release_mapped(mapping: mmap.mmap, offset: int) -> None:
+    """Drop the pages of one chunk from RSS once read; the kernel refaults them from the file if needed."""
+    if hasattr(mapping, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+        mapping.madvise(mmap.MADV_DONTNEED, offset, min(FILE_CHUNK_SIZE, len(mapping) - offset))
+
+
+def open_file_mapping(config: ClientConfig) -> Optional[Tuple[BinaryIO, mmap.mmap]]:
+    """Map --path read-only; None for an empty file (mmap rejects those).
+
+    The UTF-8 check happens in run_file_transfer as each slice is sent, so the
+    file is read from disk once.
+    """
+    assert config.path is not None
+    try:
+        source = config.path.open("rb")
+        size = os.fstat(source.fileno()).st_size
+        if size == 0:
+            source.close()
+            return None
+        if config.mode == "len" and size > MAX_FRAME_BYTES:
+            source.close()
+            print(
+                f"File is too large for one len-mode frame ({size} bytes; the limit is {MAX_FRAME_BYTES}). "
+                "Use --mode line or split the file.",
+                file=sys.stderr,
+            )
+            sys.exit(EXIT_PROTOCOL_ERROR)
+        mapping = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError as err:
+        print(f"Failed to read file: {err}", file=sys.stderr)
+        sys.exit(EXIT_IO_ERROR)
+    return source, mapping
+
+
+def run_file_transfer(
+    conn: socket.socket, source: BinaryIO, mapping: mmap.mmap, config: ClientConfig, logger: Logger
+) -> None:
+    """Send a mapped file as the payload and stream the echo to stdout.
+
+    The payload never sits in memory: a sender thread checks each slice of
+    the mapping is UTF-8 and then hands it to socket.sendfile, which finds
+    the pages it just read in the page cache (or sends the memoryview slice
+    where sendfile is unavailable), while this thread reads the echo, which
+    the server relays as it arrives, through a fixed buffer. A file that is
+    not UTF-8 stops the send at the first bad slice with a ProtocolError. In line mode every line of the file
+    is its own message, so lines are echoed one by one; in len mode the file
+    is a single frame.
+    """
+    size = len(mapping)
+    if config.mode == "line":
+        head = b""
+        tail = b"" if mapping[size - 1 : size] == b"\n" else b"\n"
+    else:
+        head = size.to_bytes(4, "big")
+        tail = b""
+    expected = len(head) + size + len(tail)
+    failure: list[BaseException] = []
+
+    def sender() -> None:
+        checker = codecs.getincrementaldecoder("utf-8")()
+        try:
+            conn.sendall(head)
+            with memoryview(mapping) as view:
+                for offset in range(0, size, FILE_CHUNK_SIZE):
+                    with view[offset : offset + FILE_CHUNK_SIZE] as chunk:
+                        try:
+                            checker.decode(chunk, final=offset + len(chunk) == size)
+                        except UnicodeDecodeError as err:
+                            start = offset - len(checker.getstate()[0]) + err.start
+                            raise ProtocolError(
+                                f"File is not valid UTF-8 (offset {start}). Provide UTF-8 text for --input file."
+                            ) from None
+                        if hasattr(os, "sendfile"):
+                            conn.sendfile(source, offset, len(chunk))
+                        else:
+                            conn.sendall(chunk)
+                    release_mapped(mapping, offset)
+            conn.sendall(tail)
+        except ProtocolError as err:
+            failure.append(err)
+        except socket.timeout:
+            failure.append(TimeoutError("Send timeout"))
+        except OSError as err:
+            failure.append(ConnectionError(f"Send failed: {err}"))
+        if failure:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    logger.debug_dump("send", head + mapping[: 64 - len(head)])
+    thread = threading.Thread(target=sender, name="file-sender", daemon=True)
+    thread.start()
+    out = sys.stdout.buffer
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = bytearray(min(FILE_CHUNK_SIZE, expected))
+    view = memoryview(buffer)
+    received = 0
+    try:
+        while received < expected:
+            try:
+                count = conn.recv_into(view[: expected - received])
+            except socket.timeout as err:
+                raise TimeoutError("Receive timeout") from err
+            except OSError as err:
+                raise ConnectionError("Receive failed") from err
+            if not count:
+                raise ConnectionError("Connection closed before the echo completed")
+            chunk = view[:count]
+            if received == 0:
+                logger.debug_dump("recv", bytes(chunk[:64]))
+            payload = chunk[len(head) - received :] if received < len(head) else chunk
+            # Position in the payload of the first byte the decoder sees next (pending bytes included).
+            position = max(received - len(head), 0) - len(decoder.getstate()[0])
+            received += count
+            try:
+                decoder.decode(payload, final=received == expected)
+            except UnicodeDecodeError as err:
+                offset = position + err.start
+                print(
+                    f"UTF-8 decode error at byte offset {offset}; showing hex preview: {mapping[:32].hex()} (len={size})",
+                    file=sys.stderr,
+                )
+                sys.exit(EXIT_UTF8_WARNING)
+            out.write(payload)
+    except (TimeoutError, ConnectionError):
+        if failure:
+            raise failure[0] from None  # the sender's error explains this one
+        raise
+    finally:
+        out.flush()
+        view.release()
+    thread.join()
+    if failure:
+        raise failure[0]
+    logger.info("Payload sent", bytes=expected)
+    logger.info("Received response", bytes=received, payload=received - len(head))
+
+
+def backoff_delay(attempt: int, base: float, cap: float = RETRY_BACKOFF_CAP) -> float:
+    """Delay before retry number attempt (0-based): exponential growth with full jitter.
+
+    Picking uniformly below the exponential bound keeps clients that failed
+    together from retrying in lockstep against a recovering server.
+    """
+    return random.uniform(0.0, min(cap, base * 2.0 ** min(attempt, 32)))
+
+
 def connect_with_retry(config: ClientConfig, logger: Logger) -> socket.socket:
     attempt = 0
     last_error: Optional[Exception] = None
@@ -165,11 +353,13 @@ def connect_with_retry(config: ClientConfig, logger: Logger) -> socket.socket:
             return conn
         except OSError as err:
             last_error = err
-            logger.error("Connect failed", error=err)
             attempt += 1
             if attempt < config.retry_count:
-                sleep_for = config.retry_backoff * attempt
+                sleep_for = backoff_delay(attempt - 1, config.retry_backoff)
+                logger.error("Connect failed", error=err, retry_in=f"{sleep_for:.3f}")
                 time.sleep(sleep_for)
+            else:
+                logger.error("Connect failed", error=err)
     logger.error("Giving up after retries", attempts=config.retry_count, error=last_error)
     sys.exit(EXIT_CONNECT_FAILURE)
 
@@ -279,8 +469,616 @@ def display_payload(payload: bytes) -> None:
         sys.stdout.flush()
 
 
+def iter_records(source: BinaryIO, records: str) -> Iterator[bytes]:
+    """Yield record payloads from newline-delimited or 4-byte length-prefixed input."""
+    if records == "line":
+        for line in source:
+            yield line[:-1] if line.endswith(b"\n") else line
+        return
+    while True:
+        header = source.read(4)
+        if not header:
+            return
+        if len(header) < 4:
+            raise ProtocolError("Input ends inside a record header")
+        length = int.from_bytes(header, "big")
+        payload = source.read(length)
+        if len(payload) < length:
+            raise ProtocolError("Input ends inside a record")
+        yield payload
+
+
+def encode_record(record: bytes, records: str) -> bytes:
+    if records == "line":
+        return record + b"\n"
+    return len(record).to_bytes(4, "big") + record
+
+
+def encode_frame(record: bytes, mode: str) -> bytes:
+    if mode == "line":
+        if b"\n" in record:
+            raise ProtocolError("Record contains a newline; use --mode len to send it")
+        return record + b"\n"
+    return len(record).to_bytes(4, "big") + record
+
+
+def read_echo(reader: BinaryIO, mode: str) -> bytes:
+    """Read one echoed message from a buffered socket reader and return its payload."""
+    try:
+        if mode == "line":
+            frame = reader.readline()
+            if not frame.endswith(b"\n"):
+                raise ConnectionError("Connection closed before newline")
+            return frame[:-1]
+        header = reader.read(4)
+        if len(header) < 4:
+            raise ConnectionError("Connection closed before length header")
+        length = int.from_bytes(header, "big")
+        payload = reader.read(length)
+        if len(payload) < length:
+            raise ConnectionError("Connection closed before payload completed")
+        return payload
+    except socket.timeout as err:
+        raise TimeoutError("Receive timeout") from err
+    except OSError as err:
+        raise ConnectionError("Receive failed") from err
+
+
+def open_record_source(config: ClientConfig) -> BinaryIO:
+    if config.input_mode == "stdin":
+        return sys.stdin.buffer
+    assert config.path is not None
+    try:
+        return config.path.open("rb")
+    except OSError as err:
+        print(f"Failed to read file: {err}", file=sys.stderr)
+        sys.exit(EXIT_IO_ERROR)
+
+
+def run_stream(conn: socket.socket, config: ClientConfig, logger: Logger) -> None:
+    """Pipeline every input record over conn, writing echoes to stdout in order.
+
+    A sender thread reads records lazily and keeps up to --window of them in
+    flight; this thread reads the echoes, checks each against the record it
+    answers and writes it out in the input record format.
+    """
+    source = open_record_source(config)
+    out = sys.stdout.buffer
+    window = threading.Semaphore(config.window)
+    pending = threading.Semaphore(0)
+    inflight: collections.deque[Optional[bytes]] = collections.deque()
+    failure: list[BaseException] = []
+
+    def sender() -> None:
+        try:
+            for record in iter_records(source, config.records):
+                frame = encode_frame(record, config.mode)
+                window.acquire()
+                inflight.append(record)
+                pending.release()
+                logger.debug_dump("send", frame)
+                conn.sendall(frame)
+        except socket.timeout:
+            failure.append(TimeoutError("Send timeout"))
+        except OSError as err:
+            failure.append(ConnectionError(f"Send failed: {err}"))
+        except ProtocolError as err:
+            failure.append(err)
+        finally:
+            if failure and not isinstance(failure[0], ProtocolError):
+                # Unblock the reader, which may be waiting for an echo that will never come.
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            inflight.append(None)  # end of input
+            pending.release()
+
+    reader = conn.makefile("rb")
+    thread = threading.Thread(target=sender, name="stream-sender", daemon=True)
+    started = time.perf_counter()
+    thread.start()
+    count = 0
+    total = 0
+    while True:
+        pending.acquire()
+        record = inflight.popleft()
+        if record is None:
+            break
+        try:
+            echo = read_echo(reader, config.mode)
+        except (TimeoutError, ConnectionError):
+            if failure:
+                raise failure[0] from None  # the sender's error explains this one
+            raise
+        logger.debug_dump("recv", echo)
+        if echo != record:
+            raise ProtocolError(f"Echo of record {count + 1} does not match what was sent")
+        out.write(encode_record(echo, config.records))
+        window.release()
+        count += 1
+        total += len(echo)
+    out.flush()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    if failure:
+        raise failure[0]
+    logger.info(
+        "Stream complete",
+        records=count,
+        bytes=total,
+        seconds=f"{elapsed:.3f}",
+        records_per_sec=f"{count / elapsed:.0f}",
+        mib_per_sec=f"{total / elapsed / 1048576:.2f}",
+    )
+
+
+PIPELINE_BYTES = 65536  # unanswered bytes EchoClient.echo_many keeps on the wire
+
+
+def _check_pool_args(mode: str, min_size: int, max_size: int) -> None:
+    if mode not in ("line", "len"):
+        raise ValueError(f"Unknown mode {mode!r}; expected 'line' or 'len'")
+    if max_size < 1 or not 0 <= min_size <= max_size:
+        raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+
+
+class _PooledSocket:
+    __slots__ = ("sock", "reader", "last_used")
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.last_used = time.monotonic()
+
+    def alive(self, timeout: float) -> bool:
+        """Non-blocking peek: an idle echo connection has nothing to read unless the peer closed it."""
+        try:
+            self.sock.setblocking(False)
+            try:
+                self.sock.recv(1, socket.MSG_PEEK)
+            finally:
+                self.sock.settimeout(timeout)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False  # EOF, or bytes nobody asked for
+
+    def close(self) -> None:
+        self.reader.close()
+        self.sock.close()
+
+
+class EchoClient:
+    """Thread-safe echo client that reuses connections from a bounded pool.
+
+    echo() borrows a connection, sends one message and returns the echoed
+    payload; echo_many() pipelines a batch over a single connection. Idle
+    connections are checked before reuse and closed after idle_timeout
+    (keeping min_size open). Connects retry with jittered exponential backoff,
+    and a request that fails on a reused connection the server has since
+    closed is retried once on a fresh one. Failures raise ConnectionError,
+    TimeoutError or ProtocolError instead of exiting.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        mode: str = "line",
+        *,
+        timeout: float = 5.0,
+        min_size: int = 0,
+        max_size: int = 8,
+        idle_timeout: float = 30.0,
+        health_check_interval: float = 1.0,
+        retry_count: int = 3,
+        retry_backoff: float = 0.1,
+        window: int = 32,
+    ) -> None:
+        _check_pool_args(mode, min_size, max_size)
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.timeout = timeout
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.retry_count = max(retry_count, 1)
+        self.retry_backoff = retry_backoff
+        self.window = max(window, 1)
+        self._idle: collections.deque[_PooledSocket] = collections.deque()
+        self._size = 0  # idle + borrowed + being opened
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __enter__(self) -> "EchoClient":
+        self.open()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """Open min_size connections up front."""
+        conns = [self._acquire()[0] for _ in range(self.min_size)]
+        for conn in conns:
+            self._release(conn, True)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._size -= 1
+            self._cond.notify_all()
+
+    def echo(self, payload: bytes) -> bytes:
+        return self.echo_many([payload])[0]
+
+    def echo_many(self, payloads: list[bytes]) -> list[bytes]:
+        """Echo payloads in order over one connection, keeping up to window of them in flight."""
+        frames = [encode_frame(payload, self.mode) for payload in payloads]
+        for attempt in (1, 2):
+            conn, reused = self._acquire()
+            try:
+                results = self._pipeline(conn, frames, payloads)
+            except ConnectionError:
+                self._release(conn, False)
+                if reused and attempt == 1:
+                    continue  # the server closed it while idle; echoing again is harmless
+                raise
+            except BaseException:
+                self._release(conn, False)
+                raise
+            self._release(conn, True)
+            return results
+        raise AssertionError("unreachable")
+
+    def _pipeline(self, conn: _PooledSocket, frames: list[bytes], payloads: list[bytes]) -> list[bytes]:
+        # Bounding the unanswered bytes as well as the count keeps the server's echoes
+        # within our receive buffer, so neither side can block the other on send.
+        results: list[bytes] = []
+        inflight: collections.deque[int] = collections.deque()
+        outstanding = 0
+
+        def read_one() -> None:
+            nonlocal outstanding
+            echo = read_echo(conn.reader, self.mode)
+            if echo != payloads[len(results)]:
+                raise ProtocolError(f"Echo of message {len(results) + 1} does not match what was sent")
+            results.append(echo)
+            outstanding -= inflight.popleft()
+
+        for frame in frames:
+            while inflight and (len(inflight) >= self.window or outstanding + len(frame) > PIPELINE_BYTES):
+                read_one()
+            try:
+                conn.sock.sendall(frame)
+            except socket.timeout as err:
+                raise TimeoutError("Send timeout") from err
+            except OSError as err:
+                raise ConnectionError(f"Send failed: {err}") from err
+            inflight.append(len(frame))
+            outstanding += len(frame)
+        while inflight:
+            read_one()
+        return results
+
+    def _acquire(self) -> Tuple[_PooledSocket, bool]:
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ConnectionError("Client is closed")
+                now = time.monotonic()
+                self._evict_idle(now)
+                if self._idle:
+                    conn = self._idle.pop()  # most recently used first, so the oldest age out
+                    if now - conn.last_used < self.health_check_interval or conn.alive(self.timeout):
+                        return conn, True
+                    conn.close()
+                    self._size -= 1
+                    continue
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                if not self._cond.wait(deadline - now):
+                    raise TimeoutError("No pooled connection became free")
+        try:
+            return _PooledSocket(self._connect()), False
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn: _PooledSocket, healthy: bool) -> None:
+        with self._cond:
+            if healthy and not self._closed:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            else:
+                conn.close()
+                self._size -= 1
+            self._cond.notify()
+
+    def _evict_idle(self, now: float) -> None:
+        while self._idle and self._size > self.min_size and now - self._idle[0].last_used > self.idle_timeout:
+            self._idle.popleft().close()
+            self._size -= 1
+
+    def _connect(self) -> socket.socket:
+        for attempt in range(self.retry_count):
+            try:
+                conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+                conn.settimeout(self.timeout)
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return conn
+            except OSError as err:
+                if attempt + 1 == self.retry_count:
+                    raise ConnectionError(f"Connect to {self.host}:{self.port} failed: {err}") from err
+                time.sleep(backoff_delay(attempt, self.retry_backoff))
+        raise AssertionError("unreachable")
+
+
+async def read_echo_async(reader: asyncio.StreamReader, mode: str) -> bytes:
+    try:
+        if mode == "line":
+            return (await reader.readuntil(b"\n"))[:-1]
+        header = await reader.readexactly(4)
+        return await reader.readexactly(int.from_bytes(header, "big"))
+    except asyncio.IncompleteReadError as err:
+        raise ConnectionError("Connection closed mid-message" if err.partial else "Connection closed") from err
+    except asyncio.LimitOverrunError as err:
+        raise ProtocolError("Echoed line exceeds max_bytes") from err
+
+
+class _MultiplexedConnection:
+    __slots__ = ("reader", "writer", "pending", "last_used", "task", "closed")
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        # Echoes come back in request order, so a FIFO of waiters is all the routing needed.
+        self.pending: collections.deque[Tuple[asyncio.Future[bytes], bytes]] = collections.deque()
+        self.last_used = time.monotonic()
+        self.task: Optional[asyncio.Task[None]] = None
+        self.closed = False
+
+
+class AsyncEchoClient:
+    """asyncio echo client that multiplexes concurrent requests over pooled connections.
+
+    Each connection carries up to max_in_flight requests at once; a reader task
+    per connection resolves them in order as the echoes arrive, and notices at
+    once when the server closes it. A request goes to an idle connection if
+    there is one, otherwise a new connection is opened while the pool is below
+    max_size, otherwise it joins the least busy connection. Connections idle
+    longer than idle_timeout are closed, keeping min_size open.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        mode: str = "line",
+        *,
+        timeout: float = 5.0,
+        min_size: int = 0,
+        max_size: int = 8,
+        max_in_flight: int = 64,
+        idle_timeout: float = 30.0,
+        retry_count: int = 3,
+        retry_backoff: float = 0.1,
+        max_bytes: int = 1_048_576,
+    ) -> None:
+        _check_pool_args(mode, min_size, max_size)
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.timeout = timeout
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_in_flight = max(max_in_flight, 1)
+        self.idle_timeout = idle_timeout
+        self.retry_count = max(retry_count, 1)
+        self.retry_backoff = retry_backoff
+        self.max_bytes = max_bytes
+        self._conns: list[_MultiplexedConnection] = []
+        self._opening = 0
+        # Callers beyond max_size * max_in_flight queue here in FIFO order.
+        self._slots = asyncio.Semaphore(max_size * self.max_in_flight)
+        self._room = asyncio.Event()
+        self._closed = False
+
+    async def __aenter__(self) -> "AsyncEchoClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        """Open min_size connections up front."""
+        while len(self._conns) < self.min_size:
+            await self._open_connection()
+
+    async def close(self) -> None:
+        self._closed = True
+        conns, self._conns = self._conns, []
+        for conn in conns:
+            self._discard(conn, ConnectionError("Client is closed"))
+        await asyncio.gather(*(conn.task for conn in conns if conn.task is not None), return_exceptions=True)
+        self._room.set()
+
+    async def echo(self, payload: bytes) -> bytes:
+        frame = encode_frame(payload, self.mode)
+        async with self._slots:
+            return await self._echo(frame, payload)
+
+    async def _echo(self, frame: bytes, payload: bytes) -> bytes:
+        for attempt in (1, 2):
+            conn, reused = await self._acquire()
+            future: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+            conn.pending.append((future, payload))
+            conn.writer.write(frame)  # queued right after its waiter, so order matches the wire
+            try:
+                await asyncio.wait_for(self._send_and_wait(conn, future), self.timeout)
+            except asyncio.TimeoutError:
+                self._discard(conn, TimeoutError("Receive timeout"))
+                raise TimeoutError("Receive timeout") from None
+            except ConnectionError:
+                if reused and attempt == 1:
+                    continue  # the server closed it while idle; echoing again is harmless
+                raise
+            return future.result()
+        raise AssertionError("unreachable")
+
+    async def echo_many(self, payloads: list[bytes]) -> list[bytes]:
+        return list(await asyncio.gather(*(self.echo(payload) for payload in payloads)))
+
+    async def _send_and_wait(self, conn: _MultiplexedConnection, future: asyncio.Future[bytes]) -> None:
+        try:
+            await conn.writer.drain()
+        except OSError as err:
+            self._discard(conn, ConnectionError(f"Send failed: {err}"))
+        await future
+
+    async def _acquire(self) -> Tuple[_MultiplexedConnection, bool]:
+        while True:
+            if self._closed:
+                raise ConnectionError("Client is closed")
+            self._evict_idle(time.monotonic())
+            best = min(self._conns, key=lambda conn: len(conn.pending), default=None)
+            if best is not None and not best.pending:
+                return best, True
+            if len(self._conns) + self._opening < self.max_size:
+                return await self._open_connection(), False
+            if best is not None and len(best.pending) < self.max_in_flight:
+                return best, True
+            # Holding a slot means a connection that is still opening will have room.
+            self._room.clear()
+            await self._room.wait()
+
+    async def _open_connection(self) -> _MultiplexedConnection:
+        self._opening += 1
+        try:
+            reader, writer = await self._connect()
+        finally:
+            self._opening -= 1
+            self._room.set()
+        conn = _MultiplexedConnection(reader, writer)
+        if self._closed:
+            writer.close()
+            raise ConnectionError("Client is closed")
+        self._conns.append(conn)
+        conn.task = asyncio.get_running_loop().create_task(self._read_loop(conn))
+        return conn
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        for attempt in range(self.retry_count):
+            try:
+                return await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, limit=self.max_bytes + 1), self.timeout
+                )
+            except (OSError, asyncio.TimeoutError) as err:
+                if attempt + 1 == self.retry_count:
+                    raise ConnectionError(f"Connect to {self.host}:{self.port} failed: {err!r}") from err
+                await asyncio.sleep(backoff_delay(attempt, self.retry_backoff))
+        raise AssertionError("unreachable")
+
+    async def _read_loop(self, conn: _MultiplexedConnection) -> None:
+        error: Exception = ConnectionError("Connection closed")
+        try:
+            while True:
+                echo = await read_echo_async(conn.reader, self.mode)
+                if not conn.pending:
+                    raise ProtocolError("Server sent data nobody asked for")
+                future, payload = conn.pending.popleft()
+                conn.last_used = time.monotonic()
+                self._room.set()
+                if future.done():
+                    continue  # its caller gave up
+                if echo != payload:
+                    error = ProtocolError("Echo does not match what was sent")
+                    future.set_exception(error)
+                    break
+                future.set_result(echo)
+        except (ConnectionError, ProtocolError) as err:
+            error = err
+        except OSError as err:
+            error = ConnectionError(f"Receive failed: {err}")
+        finally:
+            self._discard(conn, error)
+
+    def _discard(self, conn: _MultiplexedConnection, error: Exception) -> None:
+        if conn.closed:
+            return
+        conn.closed = True
+        if conn in self._conns:
+            self._conns.remove(conn)
+        while conn.pending:
+            future, _payload = conn.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+        conn.writer.close()
+        if conn.task is not None and conn.task is not asyncio.current_task():
+            conn.task.cancel()
+        self._room.set()
+
+    def _evict_idle(self, now: float) -> None:
+        for conn in list(self._conns):
+            if len(self._conns) <= self.min_size:
+                break
+            if not conn.pending and now - conn.last_used > self.idle_timeout:
+                self._discard(conn, ConnectionError("Evicted while idle"))
+
+
 def main(argv: list[str]) -> None:
     config = parse_args(argv)
+    if config.stream:
+        # stdout carries the echoed records, so logs go to stderr.
+        logger = Logger(debug=config.debug, stream=sys.stderr)
+        conn = connect_with_retry(config, logger)
+        try:
+            run_stream(conn, config, logger)
+        except TimeoutError as err:
+            logger.error("Timeout", error=err)
+            sys.exit(EXIT_IO_ERROR)
+        except ConnectionError as err:
+            logger.error("I/O error", error=err)
+            sys.exit(EXIT_IO_ERROR)
+        except ProtocolError as err:
+            logger.error("Protocol error", error=err)
+            sys.exit(EXIT_PROTOCOL_ERROR)
+        finally:
+            conn.close()
+        return
+
+    mapped = open_file_mapping(config) if config.input_mode == "file" else None
+    if mapped is not None:
+        # stdout carries the echo as it streams in, so logs go to stderr.
+        logger = Logger(debug=config.debug, stream=sys.stderr)
+        source, mapping = mapped
+        conn = connect_with_retry(config, logger)
+        try:
+            run_file_transfer(conn, source, mapping, config, logger)
+        except TimeoutError as err:
+            logger.error("Timeout", error=err)
+            sys.exit(EXIT_IO_ERROR)
+        except ConnectionError as err:
+            logger.error("I/O error", error=err)
+            sys.exit(EXIT_IO_ERROR)
+        except ProtocolError as err:
+            print(err, file=sys.stderr)
+            sys.exit(EXIT_PROTOCOL_ERROR)
+        finally:
+            conn.close()
+            source.close()
+        return
+
     logger = Logger(debug=config.debug)
     payload = prepare_payload(config)
 
@@ -3,12 +3,24 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import collections
+import contextlib
+import csv
+import json
 import socket
+import sys
 import threading
 import time
-from statistics import mean
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
 
 BUFFER_SIZE = 4096
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+PROGRESS_INTERVAL = 1.0
+MAX_ERROR_KINDS = 20  # distinct error messages kept per run; the rest count as OTHER_ERRORS
+OTHER_ERRORS = "(other errors)"
 
 
 def parse_args() -> argparse.Namespace:
@@ -16,11 +28,205 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", type=int, default=8080)
     parser.add_argument("--mode", choices=["line", "len"], default="line")
-    parser.add_argument("--count", type=int, default=1000, help="Total requests to send")
-    parser.add_argument("--concurrency", type=int, default=10, help="Parallel client workers")
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=None,
+        help="Total requests to send (default: 1000, or unlimited with --duration)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Stop sending after this many seconds, even if --count is not reached",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Print a 'progress' line with completions and errors every second",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Parallel client workers (threads, or coroutines with --engine asyncio) across all processes",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "asyncio"],
+        default="threads",
+        help="Client engine: one thread per worker or one coroutine per worker (default: threads)",
+    )
+    parser.add_argument(
+        "--procs",
+        type=int,
+        default=1,
+        help="Client processes sharing --count and --concurrency; results are merged (default: 1)",
+    )
     parser.add_argument("--payload", default="benchmark", help="Message to send")
+    parser.add_argument(
+        "--payload-size",
+        type=int,
+        default=None,
+        help="Send this many bytes ('x' repeated) instead of --payload",
+    )
     parser.add_argument("--timeout", type=float, default=5.0)
-    return parser.parse_args()
+    parser.add_argument(
+        "--keepalive",
+        action="store_true",
+        help="Reuse one connection per worker instead of connecting for every request",
+    )
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        default=1,
+        help="Requests in flight per connection (implies --keepalive, default: 1)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Open-loop target rate in requests/sec across all workers (implies --keepalive); "
+        "latency is measured from each request's scheduled send time",
+    )
+    parser.add_argument("--json", type=Path, help="Write the full report (summary, timeline, histogram) as JSON")
+    parser.add_argument("--csv", type=Path, help="Append a one-row summary to this CSV file (header added if new)")
+    args = parser.parse_args()
+    if args.pipeline < 1:
+        parser.error("--pipeline must be at least 1")
+    if args.duration is not None and args.duration <= 0:
+        parser.error("--duration must be positive")
+    if args.count is None:
+        args.count = sys.maxsize if args.duration is not None else 1000
+    if args.procs < 1:
+        parser.error("--procs must be at least 1")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.payload_size is not None:
+        if args.payload_size < 0:
+            parser.error("--payload-size must not be negative")
+        args.payload = "x" * args.payload_size
+    args.keepalive = args.keepalive or args.pipeline > 1 or args.rate is not None
+    return args
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram with fixed memory, in the style of HdrHistogram.
+
+    Values are recorded in whole microseconds. Below 2 * SUB_BUCKETS every
+    value has its own bucket; above that, each power-of-two range is split into
+    SUB_BUCKETS linear buckets, so reported values are within 1/SUB_BUCKETS
+    (under 1%) of the truth while memory stays constant however many requests
+    are recorded.
+    """
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    MAX_VALUE_BITS = 40  # ~12.7 days in microseconds; larger values are clamped
+
+    def __init__(self) -> None:
+        size = ((self.MAX_VALUE_BITS - self.SUB_BUCKET_BITS - 1) << self.SUB_BUCKET_BITS) + 2 * self.SUB_BUCKETS
+        self.counts = [0] * size
+        self.count = 0
+        self.total_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS - 1
+        if shift <= 0:
+            return value
+        return (shift << cls.SUB_BUCKET_BITS) + (value >> shift)
+
+    @classmethod
+    def _highest_equivalent(cls, index: int) -> int:
+        if index < 2 * cls.SUB_BUCKETS:
+            return index
+        shift = (index - cls.SUB_BUCKETS) >> cls.SUB_BUCKET_BITS
+        mantissa = index - (shift << cls.SUB_BUCKET_BITS)
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        value = min(max(int(seconds * 1_000_000), 0), (1 << self.MAX_VALUE_BITS) - 1)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total_us += value
+        if self.min_us is None or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total_us += other.total_us
+        if other.min_us is not None and (self.min_us is None or other.min_us < self.min_us):
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, percent: float) -> int:
+        """Value in microseconds at or below which percent% of samples fall."""
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * percent // 100))  # ceil without floats drifting
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max_us)
+        return self.max_us
+
+    def mean_us(self) -> float:
+        return self.total_us / self.count if self.count else 0.0
+
+    def buckets(self) -> list[list[int]]:
+        """Non-empty buckets as [highest equivalent value in us, count] pairs."""
+        return [[self._highest_equivalent(i), c] for i, c in enumerate(self.counts) if c]
+
+
+class WorkerStats:
+    """Latency histogram, completions per 1-second window and errors for one worker.
+
+    Errors are counted per message, keeping at most MAX_ERROR_KINDS distinct
+    ones, so memory stays fixed however many requests fail. Each worker owns
+    its instance, so recording needs no locks; main() merges them after the
+    workers finish.
+    """
+
+    def __init__(self, origin: float) -> None:
+        self.origin = origin
+        self.histogram = LatencyHistogram()
+        self.windows: list[int] = []
+        self.errors: collections.Counter[str] = collections.Counter()
+        self.error_count = 0
+        self.duration = 0.0
+
+    def record(self, latency: float) -> None:
+        self.histogram.record(latency)
+        second = int(time.perf_counter() - self.origin)
+        windows = self.windows
+        if second >= len(windows):
+            windows.extend([0] * (second + 1 - len(windows)))
+        windows[second] += 1
+
+    def record_error(self, message: str, count: int = 1) -> None:
+        if message not in self.errors and len(self.errors) >= MAX_ERROR_KINDS:
+            message = OTHER_ERRORS
+        self.errors[message] += count
+        self.error_count += count
+
+    def merge(self, other: "WorkerStats") -> None:
+        self.histogram.merge(other.histogram)
+        if len(other.windows) > len(self.windows):
+            self.windows.extend([0] * (len(other.windows) - len(self.windows)))
+        for second, count in enumerate(other.windows):
+            self.windows[second] += count
+        for message, count in other.errors.items():
+            self.record_error(message, count)
+        self.duration = max(self.duration, other.duration)
 
 
 def send_line(host: str, port: int, payload: bytes, timeout: float) -> float:
@@ -61,87 +267,431 @@ def send_len(host: str, port: int, payload: bytes, timeout: float) -> float:
     return time.perf_counter() - start
 
 
-def worker(
+def encode_frame(mode: str, payload: bytes) -> bytes:
+    if mode == "line":
+        return payload if payload.endswith(b"\n") else payload + b"\n"
+    return len(payload).to_bytes(4, "big") + payload
+
+
+def read_response(reader, mode: str) -> None:
+    if mode == "line":
+        if not reader.readline().endswith(b"\n"):
+            raise RuntimeError("Connection closed before newline")
+        return
+    header = reader.read(4)
+    if len(header) < 4:
+        raise RuntimeError("Connection closed before header")
+    length = int.from_bytes(header, "big")
+    if len(reader.read(length)) < length:
+        raise RuntimeError("Connection closed before payload")
+
+
+def run_persistent(
     host: str,
     port: int,
     mode: str,
     payload: bytes,
     timeout: float,
     iterations: int,
-    latencies: list[float],
-    latency_lock: threading.Lock,
-    errors: list[str],
-    error_lock: threading.Lock,
+    pipeline: int,
+    interval: Optional[float],
+    deadline: Optional[float],
+    stats: WorkerStats,
 ) -> None:
-    send_fn = send_line if mode == "line" else send_len
-    for _ in range(iterations):
+    """Send iterations requests (or until deadline) over one connection with up to pipeline in flight.
+
+    A sender thread writes requests (paced every interval seconds when set)
+    while this thread reads responses in order. With pacing, latency counts
+    from the scheduled send time, so a stalled server is not hidden by the
+    client waiting for it (coordinated omission).
+    """
+    frame = encode_frame(mode, payload)
+    window = threading.Semaphore(pipeline)
+    ready = threading.Semaphore(0)
+    scheduled: collections.deque[Optional[float]] = collections.deque()  # None: nothing more was sent
+    failed = threading.Event()
+
+    with socket.create_connection((host, port), timeout=timeout) as conn:
+        conn.settimeout(timeout)
+        reader = conn.makefile("rb")
+
+        def sender() -> None:
+            start = time.perf_counter()
+            try:
+                for index in range(iterations):
+                    if expired(deadline):
+                        return
+                    due = None
+                    if interval is not None:
+                        due = start + index * interval
+                        delay = due - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    if not window.acquire(timeout=timeout) or failed.is_set():
+                        return
+                    scheduled.append(due if due is not None else time.perf_counter())
+                    ready.release()
+                    conn.sendall(frame)
+            except OSError as err:
+                if not failed.is_set():
+                    stats.record_error(f"Send failed: {err}")
+                failed.set()
+            finally:
+                scheduled.append(None)
+                ready.release()
+
+        send_thread = threading.Thread(target=sender, daemon=True)
+        send_thread.start()
         try:
-            latency = send_fn(host, port, payload, timeout)
-            with latency_lock:
-                latencies.append(latency)
+            while True:
+                ready.acquire()
+                due = scheduled.popleft()
+                if due is None:
+                    break
+                read_response(reader, mode)
+                stats.record(time.perf_counter() - due)
+                window.release()
         except Exception as err:  # noqa: BLE001 - collect error text
-            with error_lock:
-                errors.append(str(err))
-
+            if not failed.is_set():
+                stats.record_error(str(err))
+            failed.set()
+            window.release()
+        finally:
+            send_thread.join(timeout=timeout)
+            reader.close()
 
-def main() -> None:
-    args = parse_args()
-    total = max(1, args.count)
-    concurrency = max(1, args.concurrency)
-    per_worker = total // concurrency
-    remainder = total % concurrency
-    payload = args.payload.encode("utf-8")
 
-    latencies: list[float] = []
-    errors: list[str] = []
-    latency_lock = threading.Lock()
-    error_lock = threading.Lock()
-    threads: list[threading.Thread] = []
-
-    for idx in range(concurrency):
-        iterations = per_worker + (1 if idx < remainder else 0)
-        if iterations == 0:
-            continue
-        thread = threading.Thread(
-            target=worker,
-            args=(
+def worker(args: argparse.Namespace, payload: bytes, iterations: int, stats: WorkerStats) -> None:
+    if args.keepalive:
+        interval = None
+        if args.rate is not None:
+            interval = max(1, args.concurrency) / args.rate
+        try:
+            run_persistent(
                 args.host,
                 args.port,
                 args.mode,
                 payload,
                 args.timeout,
                 iterations,
-                latencies,
-                latency_lock,
-                errors,
-                error_lock,
-            ),
-            daemon=True,
-        )
-        threads.append(thread)
+                args.pipeline,
+                interval,
+                args.deadline,
+                stats,
+            )
+        except Exception as err:  # noqa: BLE001 - collect error text
+            stats.record_error(str(err))
+        return
+    send_fn = send_line if args.mode == "line" else send_len
+    for _ in range(iterations):
+        if expired(args.deadline):
+            return
+        try:
+            stats.record(send_fn(args.host, args.port, payload, args.timeout))
+        except Exception as err:  # noqa: BLE001 - collect error text
+            stats.record_error(str(err))
+
 
+async def async_request(args: argparse.Namespace, frame: bytes) -> float:
+    """One request on a fresh connection, mirroring send_line/send_len."""
     start = time.perf_counter()
-    for thread in threads:
-        thread.start()
-    for thread in threads:
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(args.host, args.port), args.timeout)
+    try:
+        writer.write(frame)
+        await asyncio.wait_for(async_read_response(reader, args.mode), args.timeout)
+    finally:
+        writer.close()
+    return time.perf_counter() - start
+
+
+async def async_read_response(reader: asyncio.StreamReader, mode: str) -> None:
+    try:
+        if mode == "line":
+            await reader.readuntil(b"\n")
+        else:
+            header = await reader.readexactly(4)
+            await reader.readexactly(int.from_bytes(header, "big"))
+    except asyncio.IncompleteReadError as err:
+        raise RuntimeError("Connection closed before response completed") from err
+
+
+async def async_persistent(
+    args: argparse.Namespace,
+    frame: bytes,
+    iterations: int,
+    interval: Optional[float],
+    stats: WorkerStats,
+) -> None:
+    """Coroutine counterpart of run_persistent: paced sender task plus in-order reader."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(args.host, args.port), args.timeout)
+    window = asyncio.Semaphore(args.pipeline)
+    ready = asyncio.Semaphore(0)
+    scheduled: collections.deque[Optional[float]] = collections.deque()  # None: nothing more was sent
+
+    async def sender() -> None:
+        start = time.perf_counter()
+        try:
+            for index in range(iterations):
+                if expired(args.deadline):
+                    return
+                due = None
+                if interval is not None:
+                    due = start + index * interval
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await window.acquire()
+                scheduled.append(due if due is not None else time.perf_counter())
+                ready.release()
+                writer.write(frame)
+                await writer.drain()
+        finally:
+            scheduled.append(None)
+            ready.release()
+
+    send_task = asyncio.get_running_loop().create_task(sender())
+    try:
+        while True:
+            await ready.acquire()
+            due = scheduled.popleft()
+            if due is None:
+                break
+            await asyncio.wait_for(async_read_response(reader, args.mode), args.timeout)
+            stats.record(time.perf_counter() - due)
+            window.release()
+        await send_task
+    finally:
+        send_task.cancel()
+        writer.close()
+
+
+async def async_worker(args: argparse.Namespace, payload: bytes, iterations: int, stats: WorkerStats) -> None:
+    frame = encode_frame(args.mode, payload)
+    if args.keepalive:
+        interval = max(1, args.concurrency) / args.rate if args.rate is not None else None
+        try:
+            await async_persistent(args, frame, iterations, interval, stats)
+        except Exception as err:  # noqa: BLE001 - collect error text
+            stats.record_error(str(err) or type(err).__name__)
+        return
+    for _ in range(iterations):
+        if expired(args.deadline):
+            return
+        try:
+            stats.record(await async_request(args, frame))
+        except Exception as err:  # noqa: BLE001 - collect error text
+            stats.record_error(str(err) or type(err).__name__)
+
+
+async def run_async_share(args: argparse.Namespace, payload: bytes, counts: list[int]) -> WorkerStats:
+    # All coroutines share one WorkerStats: they run on a single thread, so no locking is needed.
+    stats = WorkerStats(time.perf_counter())
+    with progress_reporter(args, [stats]):
+        await asyncio.gather(*(async_worker(args, payload, count, stats) for count in counts))
+    return stats
+
+
+def run_thread_share(args: argparse.Namespace, payload: bytes, counts: list[int]) -> WorkerStats:
+    origin = time.perf_counter()
+    worker_stats = [WorkerStats(origin) for _ in counts]
+    threads = [
+        threading.Thread(target=worker, args=(args, payload, count, stats), daemon=True)
+        for count, stats in zip(counts, worker_stats)
+    ]
+    with progress_reporter(args, worker_stats):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    merged = WorkerStats(origin)
+    for stats in worker_stats:
+        merged.merge(stats)
+    return merged
+
+
+def raise_fd_limit() -> None:
+    """Allow one client process to hold thousands of sockets where the OS permits."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+    if soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+@contextlib.contextmanager
+def progress_reporter(args: argparse.Namespace, stats: list[WorkerStats]) -> Iterator[None]:
+    """With --progress, print this process's completions and errors so far once a second.
+
+    The counters are read without locks while workers update them, which is
+    fine for a progress line: each read is a plain int.
+    """
+    if not args.progress:
+        yield
+        return
+    stop = threading.Event()
+    origin = time.perf_counter()
+
+    def report() -> None:
+        while not stop.wait(PROGRESS_INTERVAL):
+            completed = sum(item.histogram.count for item in stats)
+            errors = sum(item.error_count for item in stats)
+            print(f"progress elapsed={time.perf_counter() - origin:.1f} completed={completed} errors={errors}", flush=True)
+
+    thread = threading.Thread(target=report, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
         thread.join()
-    duration = time.perf_counter() - start
 
-    completed = len(latencies)
-    if latencies:
-        avg_ms = mean(latencies) * 1000
-        p95_index = max(0, int(len(latencies) * 0.95) - 1)
-        p95_ms = sorted(latencies)[p95_index] * 1000
+
+def run_share(args: argparse.Namespace, payload: bytes, counts: list[int], start_at: Optional[float]) -> WorkerStats:
+    """Run one process's share of the workers (each entry of counts is one worker's requests)."""
+    raise_fd_limit()
+    if start_at is not None:
+        # Line processes up on a common wall-clock start so their 1-second windows align.
+        time.sleep(max(0.0, start_at - time.time()))
+    args.deadline = time.monotonic() + args.duration if args.duration is not None else None
+    start = time.perf_counter()
+    if args.engine == "asyncio":
+        stats = asyncio.run(run_async_share(args, payload, counts))
+    else:
+        stats = run_thread_share(args, payload, counts)
+    stats.duration = time.perf_counter() - start
+    return stats
+
+
+def split(total: int, parts: int) -> list[int]:
+    return [total // parts + (1 if index < total % parts else 0) for index in range(parts)]
+
+
+def describe_load(args: argparse.Namespace) -> str:
+    if args.rate is not None:
+        return f"open-loop {args.rate:g} req/s, pipeline {args.pipeline}"
+    if args.keepalive:
+        return f"keepalive, pipeline {args.pipeline}"
+    return "new connection per request"
+
+
+def build_report(args: argparse.Namespace, total: int, stats: WorkerStats, duration: float) -> dict[str, object]:
+    histogram = stats.histogram
+    latency_ms: dict[str, float] = {
+        "min": (histogram.min_us or 0) / 1000,
+        "mean": histogram.mean_us() / 1000,
+    }
+    for percent in PERCENTILES:
+        latency_ms[f"p{percent:g}"] = histogram.percentile(percent) / 1000
+    latency_ms["max"] = histogram.max_us / 1000
+    return {
+        "config": {
+            "host": args.host,
+            "port": args.port,
+            "mode": args.mode,
+            "count": None if total == sys.maxsize else total,  # None: bounded by --duration only
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "engine": args.engine,
+            "procs": args.procs,
+            "payload_bytes": len(args.payload.encode("utf-8")),
+            "load": describe_load(args),
+            "keepalive": args.keepalive,
+            "pipeline": args.pipeline,
+            "rate": args.rate,
+        },
+        "summary": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - duration)),
+            "completed": histogram.count,
+            "errors": stats.error_count,
+            "error_kinds": dict(stats.errors.most_common()),
+            "duration_s": round(duration, 6),
+            "throughput_rps": round(histogram.count / max(duration, 1e-9), 1),
+            "latency_ms": {key: round(value, 3) for key, value in latency_ms.items()},
+        },
+        "timeline": [{"second": second, "completed": count} for second, count in enumerate(stats.windows)],
+        "histogram_us": histogram.buckets(),
+    }
+
+
+def write_csv(path: Path, report: dict[str, object]) -> None:
+    config = report["config"]
+    summary = report["summary"]
+    row = {
+        "started": summary["started"],
+        "mode": config["mode"],
+        "load": config["load"],
+        "concurrency": config["concurrency"],
+        "engine": config["engine"],
+        "procs": config["procs"],
+        "payload_bytes": config["payload_bytes"],
+        "completed": summary["completed"],
+        "errors": summary["errors"],
+        "duration_s": summary["duration_s"],
+        "throughput_rps": summary["throughput_rps"],
+    }
+    row.update({f"latency_{key}_ms": value for key, value in summary["latency_ms"].items()})
+    new_file = not path.exists() or path.stat().st_size == 0
+    with path.open("a", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(row))
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def main() -> None:
+    args = parse_args()
+    total = max(1, args.count)
+    concurrency = max(1, args.concurrency)
+    payload = args.payload.encode("utf-8")
+    counts = [count for count in split(total, concurrency) if count]
+    procs = min(args.procs, len(counts))
+
+    if procs == 1:
+        merged = run_share(args, payload, counts, None)
     else:
-        avg_ms = 0.0
-        p95_ms = 0.0
-
-    print(f"Completed {completed}/{total} requests in {duration:.2f}s")
-    print(f"Average latency: {avg_ms:.2f} ms | p95: {p95_ms:.2f} ms")
-    print(f"Errors: {len(errors)}")
-    if errors:
-        for err in errors[:5]:
-            print(f"  - {err}")
+        # Worker i goes to process i % procs; children start together once all have spawned.
+        shares = [counts[index::procs] for index in range(procs)]
+        start_at = time.time() + 0.5 + 0.05 * procs
+        with ProcessPoolExecutor(max_workers=procs) as pool:
+            futures = [pool.submit(run_share, args, payload, share, start_at) for share in shares]
+            merged = WorkerStats(0.0)
+            for future in futures:
+                merged.merge(future.result())
+    duration = merged.duration
+
+    report = build_report(args, total, merged, duration)
+    summary = report["summary"]
+    latency = summary["latency_ms"]
+
+    print(f"Mode: {args.mode} | {describe_load(args)} | {concurrency} {args.engine} workers x {procs} process(es)")
+    target = "" if total == sys.maxsize else f"/{total}"
+    print(f"Completed {summary['completed']}{target} requests in {duration:.2f}s ({summary['throughput_rps']:.0f} req/s)")
+    print(
+        "Latency (ms): "
+        + " | ".join(f"{key}: {value:.2f}" for key, value in latency.items())
+    )
+    if merged.windows:
+        print("Per-second completions: " + ", ".join(str(count) for count in merged.windows))
+    print(f"Errors: {merged.error_count}")
+    for err, count in merged.errors.most_common(5):
+        print(f"  - {count} x {err}")
+
+    if args.json is not None:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote JSON report to {args.json}")
+    if args.csv is not None:
+        write_csv(args.csv, report)
+        print(f"Appended summary row to {args.csv}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""Performance regression suite for the TCP echo server.
+
+Each workload starts a fresh server on localhost, drives it with bench.py and
+records throughput, latency percentiles and the server's peak RSS. Results are
+compared with a JSON baseline; a metric that is worse than the baseline by more
+than its tolerance fails the run, and so does a workload with no baseline entry
+unless --update-baseline records one.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVER_PATH = ROOT / "server.py"
+BENCH_PATH = ROOT / "scripts" / "bench.py"
+PYTHON = sys.executable
+DEFAULT_BASELINE = ROOT / "tests" / "perf_baseline.json"
+
+EXIT_REGRESSION = 1
+EXIT_WORKLOAD_FAILED = 2
+EXIT_NO_BASELINE = 3
+
+# Latency changes smaller than this are noise on localhost, whatever the ratio.
+LATENCY_SLACK_MS = 0.05
+# metric -> True when a larger value is better
+METRICS = {
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "rss_mib": False,
+}
+
+
+@dataclass
+class Workload:
+    name: str
+    mode: str
+    description: str
+    count: int
+    bench_args: list[str] = field(default_factory=list)
+    idle: int = 0  # idle connections held open while the load runs
+    log_sample: float = 0.0  # server --log-sample; 0 keeps per-message logging out of the numbers
+
+
+WORKLOADS = [
+    Workload(
+        "tiny_lines",
+        "line",
+        "1-byte lines, 8 keepalive connections, one request in flight each",
+        40000,
+        ["--concurrency", "8", "--keepalive", "--payload", "x"],
+    ),
+    Workload(
+        "frames_64k",
+        "len",
+        "64 KiB frames, 8 keepalive connections",
+        4000,
+        ["--concurrency", "8", "--keepalive", "--payload-size", "65536"],
+    ),
+    Workload(
+        "pipelined_line",
+        "line",
+        "32-byte lines, 8 connections with 32 requests in flight each",
+        100000,
+        ["--concurrency", "8", "--pipeline", "32", "--payload-size", "32"],
+    ),
+    Workload(
+        "pipelined_len",
+        "len",
+        "32-byte frames, 8 connections with 32 requests in flight each",
+        100000,
+        ["--concurrency", "8", "--pipeline", "32", "--payload-size", "32"],
+    ),
+    Workload(
+        "idle_connections",
+        "line",
+        "tiny_lines load while 1000 idle connections stay open",
+        20000,
+        ["--concurrency", "8", "--keepalive", "--payload", "x"],
+        idle=1000,
+    ),
+    Workload(
+        "logged_lines",
+        "line",
+        "tiny_lines load with every echo logged",
+        40000,
+        ["--concurrency", "8", "--keepalive", "--payload", "x"],
+        log_sample=1.0,
+    ),
+]
+
+
+class WorkloadError(Exception):
+    pass
+
+
+def parse_args() -> argparse.Namespace:
+    names = [workload.name for workload in WORKLOADS]
+    parser = argparse.ArgumentParser(description="Echo server performance regression suite")
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "selectors", "asyncio"],
+        default="threads",
+        help="Server engine under test; baselines are kept per engine (default: threads)",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=DEFAULT_BASELINE,
+        help=f"Baseline JSON file (default: {DEFAULT_BASELINE.relative_to(ROOT)})",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store this run as the baseline instead of comparing against it; required when "
+        "the baseline file or an entry for a workload is missing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative drop in throughput or growth in RSS, e.g. 0.25 = 25%% (default: 0.25)",
+    )
+    parser.add_argument(
+        "--latency-tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed relative growth in p50/p99 latency, which is noisier (default: 0.5)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Run each workload this many times and keep the median of each metric (default: 3)",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiply every workload's request count, e.g. 0.1 for a quick run (default: 1.0)",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=names,
+        help="Run only this workload (repeatable)",
+    )
+    parser.add_argument("--json", type=Path, help="Also write this run's results to a JSON file")
+    args = parser.parse_args()
+    if args.tolerance < 0 or args.latency_tolerance < 0:
+        parser.error("tolerances must not be negative")
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    if args.scale <= 0:
+        parser.error("--scale must be positive")
+    return args
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, deadline: float) -> None:
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError):
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        time.sleep(0.05)
+    raise WorkloadError(f"Server on 127.0.0.1:{port} did not become ready")
+
+
+def peak_rss_mib(pid: int) -> Optional[float]:
+    """Peak resident set size of a process (VmHWM); None where /proc is unavailable."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text(encoding="ascii")
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) / 1024
+    return None
+
+
+@contextlib.contextmanager
+def server_process(mode: str, engine: str, log_sample: float) -> Iterator[tuple[subprocess.Popen[bytes], int]]:
+    port = find_free_port()
+    process = subprocess.Popen(
+        [
+            PYTHON,
+            str(SERVER_PATH),
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--mode",
+            mode,
+            "--engine",
+            engine,
+            "--timeout",
+            "300",
+            "--log-sample",
+            str(log_sample),
+        ],
+        cwd=str(ROOT),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        wait_for_port(port, time.monotonic() + 5.0)
+        yield process, port
+    finally:
+        process.terminate()
+        try:
+            process.communicate(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+
+
+@contextlib.contextmanager
+def idle_connections(port: int, count: int) -> Iterator[None]:
+    sockets: list[socket.socket] = []
+    try:
+        for _ in range(count):
+            sockets.append(socket.create_connection(("127.0.0.1", port), timeout=5.0))
+        yield
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def raise_fd_limit(needed: int) -> None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        with contextlib.suppress(ValueError, OSError):
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+def run_workload(workload: Workload, args: argparse.Namespace) -> dict[str, float]:
+    count = max(1, int(workload.count * args.scale))
+    with server_process(workload.mode, args.engine, workload.log_sample) as (process, port):
+        with idle_connections(port, workload.idle), tempfile.TemporaryDirectory() as tmp:
+            report_path = Path(tmp) / "report.json"
+            bench = subprocess.run(
+                [
+                    PYTHON,
+                    str(BENCH_PATH),
+                    "--port",
+                    str(port),
+                    "--mode",
+                    workload.mode,
+                    "--count",
+                    str(count),
+                    *workload.bench_args,
+                    "--json",
+                    str(report_path),
+                ],
+                cwd=str(ROOT),
+                capture_output=True,
+                text=True,
+                timeout=600,
+            )
+            if bench.returncode != 0 or not report_path.exists():
+                raise WorkloadError(f"bench.py exited {bench.returncode}: {bench.stderr.strip()[-500:]}")
+            summary = json.loads(report_path.read_text(encoding="utf-8"))["summary"]
+        rss = peak_rss_mib(process.pid)
+    if summary["errors"] or summary["completed"] != count:
+        raise WorkloadError(f"{summary['errors']} errors, {summary['completed']}/{count} requests completed")
+    result = {
+        "throughput_rps": summary["throughput_rps"],
+        "p50_ms": summary["latency_ms"]["p50"],
+        "p99_ms": summary["latency_ms"]["p99"],
+    }
+    if rss is not None:
+        result["rss_mib"] = round(rss, 1)
+    return result
+
+
+def median_results(runs: list[dict[str, float]]) -> dict[str, float]:
+    return {metric: round(statistics.median(run[metric] for run in runs), 3) for metric in runs[0]}
+
+
+def regression(metric: str, baseline: float, current: float, args: argparse.Namespace) -> bool:
+    if METRICS[metric]:
+        return current < baseline * (1 - args.tolerance)
+    if metric.endswith("_ms"):
+        return current > max(baseline * (1 + args.latency_tolerance), baseline + LATENCY_SLACK_MS)
+    return current > baseline * (1 + args.tolerance)
+
+
+def compare(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], args: argparse.Namespace
+) -> list[str]:
+    """Print one row per metric and return the regressed ones as "workload.metric"."""
+    regressed: list[str] = []
+    print(f"{'workload':<18} {'metric':<15} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metrics in results.items():
+        stored = baseline.get(name)
+        if stored is None:
+            print(f"{name:<18} (no baseline entry)")
+            continue
+        for metric, current in metrics.items():
+            if metric not in stored or metric not in METRICS:
+                continue
+            base = stored[metric]
+            change = (current - base) / base * 100 if base else 0.0
+            failed = regression(metric, base, current, args)
+            if failed:
+                regressed.append(f"{name}.{metric}")
+            flag = "  REGRESSION" if failed else ""
+            print(f"{name:<18} {metric:<15} {base:>12.3f} {current:>12.3f} {change:>+7.1f}%{flag}")
+    return regressed
+
+
+def load_baseline(path: Path) -> dict[str, dict[str, dict[str, float]]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def main() -> None:
+    args = parse_args()
+    selected = [workload for workload in WORKLOADS if not args.only or workload.name in args.only]
+    raise_fd_limit(max(workload.idle for workload in selected) + 1024)
+
+    results: dict[str, dict[str, float]] = {}
+    for workload in selected:
+        print(f"Running {workload.name}: {workload.description} ({workload.mode} mode, {args.engine} engine)")
+        try:
+            runs = [run_workload(workload, args) for _ in range(args.repeat)]
+        except (WorkloadError, OSError, subprocess.TimeoutExpired) as err:
+            print(f"Workload {workload.name} failed: {err}", file=sys.stderr)
+            sys.exit(EXIT_WORKLOAD_FAILED)
+        results[workload.name] = median_results(runs)
+        print("  " + " | ".join(f"{metric}: {value:g}" for metric, value in results[workload.name].items()))
+
+    if args.json is not None:
+        args.json.write_text(json.dumps({args.engine: results}, indent=2), encoding="utf-8")
+        print(f"Wrote results to {args.json}")
+
+    stored = load_baseline(args.baseline)
+    if args.update_baseline:
+        stored.setdefault(args.engine, {}).update(results)
+        args.baseline.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Stored baseline for the {args.engine} engine in {args.baseline}")
+        return
+
+    baseline = stored.get(args.engine, {})
+    regressed = compare(results, baseline, args)
+    if regressed:
+        print(f"Regressions: {', '.join(regressed)}", file=sys.stderr)
+        sys.exit(EXIT_REGRESSION)
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        # A deleted or renamed baseline must not pass silently
+        print(
+            f"No {args.engine} baseline for {', '.join(missing)} in {args.baseline}; "
+            "record one with --update-baseline",
+            file=sys.stderr,
+        )
+        sys.exit(EXIT_NO_BASELINE)
+    print(f"No regressions (tolerance {args.tolerance:.0%}, latency {args.latency_tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,23 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import bisect
+import collections
+import contextlib
+import http.server
+import json
 import os
+import queue
+import random
+import selectors
 import signal
 import socket
 import sys
 import threading
 import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional
 
 EXIT_SOCKET_CREATE = 10
 EXIT_BIND_FAILURE = 11
@@ -22,16 +31,54 @@ EXIT_UTF8_WARNING = 41  # informational only for server
 
 BUFFER_SIZE = 4096
 
-def _now_ts() -> str:
-    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+# Records buffered for the log writer before new ones are dropped (and counted).
+LOG_QUEUE_SIZE = 65536
+# Seconds between log writer flushes.
+LOG_FLUSH_INTERVAL = 0.05
+
+# Upper bounds (seconds) of the echo latency histogram buckets; +Inf is implicit.
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+# Values of the kind label on echo_errors_total.
+ERROR_KINDS = ("protocol", "timeout", "connection", "overload")
 
 
 class Logger:
-    """Thread-safe stdout logger with simple timestamped messages."""
+    """Structured stdout logger with a background writer.
 
-    def __init__(self, debug: bool = False) -> None:
-        self._lock = threading.Lock()
+    Callers only append a record to a bounded queue; a daemon thread formats
+    queued records (text or JSON lines) and writes each batch with one write.
+    Per-message events go through echo(), which applies --log-sample and the
+    per-remote --log-rate limit before anything is queued.
+    """
+
+    def __init__(
+        self,
+        debug: bool = False,
+        fmt: str = "text",
+        sample: float = 1.0,
+        rate: Optional[float] = None,
+    ) -> None:
         self.debug = debug
+        self.fmt = fmt
+        self.sample = sample
+        self.rate = rate
+        self._burst = max(rate or 0.0, 1.0)
+        self._buckets: dict[str, list[float]] = {}  # remote -> [tokens, last refill, suppressed]
+        self._ts_second = -1
+        self._ts_text = ""
+        self._start()
+
+    def _start(self) -> None:
+        self._queue: collections.deque[tuple[float, str, str, Optional[dict[str, object]]]] = collections.deque()
+        self._dropped = 0
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run_writer, name="log-writer", daemon=True)
+        self._writer.start()
 
     def info(self, message: str, **extra: object) -> None:
         self._log("INFO", message, extra)
@@ -39,22 +86,262 @@ class Logger:
     def error(self, message: str, **extra: object) -> None:
         self._log("ERROR", message, extra)
 
-    def debug_dump(self, label: str, data: bytes) -> None:
+    def echo(self, message: str, remote: str, **extra: object) -> None:
+        """Log a per-message event, subject to sampling and the per-remote rate limit."""
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return
+        if self.rate is not None:
+            now = time.monotonic()
+            bucket = self._buckets.get(remote)
+            if bucket is None:
+                bucket = self._buckets[remote] = [self._burst, now, 0]
+            else:
+                bucket[0] = min(self._burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                return
+            bucket[0] -= 1.0
+            if bucket[2]:
+                extra["suppressed"] = int(bucket[2])
+                bucket[2] = 0
+        self._log("INFO", message, {"remote": remote, **extra})
+
+    def forget(self, remote: str) -> None:
+        """Drop rate-limit state for a closed connection."""
+        self._buckets.pop(remote, None)
+
+    def debug_dump(self, label: str, data: bytes, size: Optional[int] = None) -> None:
+        """Log a hex preview of data; size overrides the length for streamed frames."""
         if not self.debug:
             return
         preview = data[:64]
         hex_preview = preview.hex()
-        self._log("DEBUG", f"{label} size={len(data)} hex={hex_preview}")
+        self._log("DEBUG", f"{label} size={len(data) if size is None else size} hex={hex_preview}")
 
     def _log(self, level: str, message: str, extra: Optional[dict[str, object]] = None) -> None:
+        # Hot path: no lock and no formatting, just a deque append (atomic under the GIL).
+        if len(self._queue) >= LOG_QUEUE_SIZE:
+            self._dropped += 1
+            return
+        self._queue.append((time.time(), level, message, extra))
+
+    def _timestamp(self, when: float) -> str:
+        second = int(when)
+        if second != self._ts_second:
+            self._ts_second = second
+            self._ts_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return self._ts_text
+
+    def _format(self, when: float, level: str, message: str, extra: Optional[dict[str, object]]) -> str:
+        if self.fmt == "json":
+            record: dict[str, object] = {"ts": self._timestamp(when), "level": level, "msg": message}
+            if extra:
+                record.update(extra)
+            return json.dumps(record, default=str, ensure_ascii=False) + "\n"
         suffix = ""
         if extra:
             kv = " ".join(f"{key}={value}" for key, value in extra.items())
             if kv:
                 suffix = f" {kv}"
-        line = f"{_now_ts()} {level} {message}{suffix}"
+        return f"{self._timestamp(when)} {level} {message}{suffix}\n"
+
+    def flush(self) -> None:
+        """Write everything queued so far from the calling thread."""
+        with self._write_lock:
+            queue = self._queue
+            lines: list[str] = []
+            while queue:
+                lines.append(self._format(*queue.popleft()))
+            dropped, self._dropped = self._dropped, 0
+            if dropped:
+                lines.append(self._format(time.time(), "ERROR", "Log queue full", {"dropped": dropped}))
+            if not lines:
+                return
+            try:
+                # One write per batch keeps output from forked workers sharing stdout unbroken.
+                sys.stdout.write("".join(lines))
+                sys.stdout.flush()
+            except (OSError, ValueError):
+                pass  # stdout closed; nothing sensible left to do with log lines
+
+    def _run_writer(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(LOG_FLUSH_INTERVAL)
+            self.flush()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        if self._writer.is_alive() and self._writer is not threading.current_thread():
+            self._writer.join(timeout=1.0)
+        self.flush()
+
+    def after_fork(self) -> None:
+        """Restart the writer in a forked child; the parent flushed before forking."""
+        self._buckets.clear()
+        self._start()
+
+
+class MetricsShard:
+    """Counters written by a single thread, so updates need no lock."""
+
+    __slots__ = (
+        "accepted",
+        "closed",
+        "bytes_in",
+        "bytes_out",
+        "messages",
+        "errors",
+        "latency",
+        "latency_sum",
+        "timers_fired",
+        "timers_rescheduled",
+    )
+
+    def __init__(self) -> None:
+        self.accepted = 0
+        self.closed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages = 0
+        self.errors = dict.fromkeys(ERROR_KINDS, 0)
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.timers_fired = 0
+        self.timers_rescheduled = 0
+
+    def echoed(self, messages: int, seconds: float) -> None:
+        """Count messages echoed together, each taking seconds from receive to send."""
+        self.messages += messages
+        self.latency[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += messages
+        self.latency_sum += seconds * messages
+
+    def merge(self, other: "MetricsShard") -> None:
+        self.accepted += other.accepted
+        self.closed += other.closed
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        self.messages += other.messages
+        for kind, count in other.errors.items():
+            self.errors[kind] += count
+        for index, count in enumerate(other.latency):
+            self.latency[index] += count
+        self.latency_sum += other.latency_sum
+        self.timers_fired += other.timers_fired
+        self.timers_rescheduled += other.timers_rescheduled
+
+
+class Metrics:
+    """Per-thread MetricsShards, summed into Prometheus text format on scrape.
+
+    The hot path only touches the calling thread's shard. Shards of threads
+    that have exited are folded into one retired shard so thread-per-client
+    serving does not grow the shard list without bound.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: list[tuple[threading.Thread, MetricsShard]] = []
+        self._retired = MetricsShard()
+        self._prune_at = 64
+
+    def shard(self) -> MetricsShard:
+        """Return the calling thread's shard, creating it on first use."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = MetricsShard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= self._prune_at:
+                    self._retire_dead()
+                    self._prune_at = max(64, len(self._shards) * 2)
+        return shard
+
+    def _retire_dead(self) -> None:
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._retired.merge(shard)
+        self._shards = live
+
+    def snapshot(self) -> MetricsShard:
+        total = MetricsShard()
         with self._lock:
-            print(line, flush=True)
+            self._retire_dead()
+            total.merge(self._retired)
+            for _thread, shard in self._shards:
+                total.merge(shard)
+        return total
+
+    def render(self) -> str:
+        total = self.snapshot()
+        lines: list[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list[tuple[str, object]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+        metric("echo_connections_accepted_total", "counter", "Connections accepted.", [("", total.accepted)])
+        metric("echo_connections_closed_total", "counter", "Connections closed.", [("", total.closed)])
+        metric("echo_connections_active", "gauge", "Connections currently open.", [("", total.accepted - total.closed)])
+        metric("echo_received_bytes_total", "counter", "Bytes received from clients.", [("", total.bytes_in)])
+        metric("echo_sent_bytes_total", "counter", "Bytes echoed back to clients.", [("", total.bytes_out)])
+        metric("echo_messages_total", "counter", "Lines or frames echoed.", [("", total.messages)])
+        metric(
+            "echo_errors_total",
+            "counter",
+            "Connections failed, by kind (protocol violation, timeout, reset or early close).",
+            [(f'{{kind="{kind}"}}', count) for kind, count in total.errors.items()],
+        )
+        metric(
+            "echo_idle_timers_fired_total",
+            "counter",
+            "Idle deadlines that expired in an event engine's timer wheel.",
+            [("", total.timers_fired)],
+        )
+        metric(
+            "echo_idle_timers_rescheduled_total",
+            "counter",
+            "Timer wheel entries found active when their slot came due and moved to a later slot.",
+            [("", total.timers_rescheduled)],
+        )
+        cumulative = 0
+        buckets: list[tuple[str, object]] = []
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), total.latency):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            buckets.append((f'_bucket{{le="{le}"}}', cumulative))
+        buckets.append(("_sum", repr(total.latency_sum)))
+        buckets.append(("_count", cumulative))
+        metric("echo_latency_seconds", "histogram", "Time from receiving a message to echoing it.", buckets)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Serves Metrics.render() at /metrics for the --metrics-port listener."""
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()  # type: ignore[attr-defined]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass  # scrapes are not echo traffic; keep them out of the server log
+
+
+class MetricsHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
 
 
 @dataclass
@@ -66,6 +353,16 @@ class ServerConfig:
     max_bytes: int
     max_clients: Optional[int]
     debug: bool
+    engine: str = "threads"
+    workers: int = 1
+    log_format: str = "text"
+    log_sample: float = 1.0
+    log_rate: Optional[float] = None
+    metrics_port: Optional[int] = None
+    drain_timeout: float = 10.0
+    queue_size: int = 64
+    queue_timeout: float = 5.0
+    overload: str = "reject"
 
 
 def parse_args(argv: list[str]) -> ServerConfig:
@@ -91,8 +388,85 @@ def parse_args(argv: list[str]) -> ServerConfig:
         default=None,
         help="Limit concurrent clients (optional)",
     )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=64,
+        help="Threads engine with --max-clients: connections waiting for a free handler (default: 64)",
+    )
+    parser.add_argument(
+        "--queue-timeout",
+        type=float,
+        default=5.0,
+        help="Seconds a queued connection may wait for a handler before it is turned away (default: 5)",
+    )
+    parser.add_argument(
+        "--overload",
+        choices=["reject", "wait", "shed-idle"],
+        default="reject",
+        help="When the admission queue is full: reject the newcomer, wait for room up to "
+        "--queue-timeout, or close the longest-idle client (default: reject)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "selectors", "asyncio"],
+        default="threads",
+        help="Connection engine: thread per client, a selectors loop or an asyncio loop (default: threads)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of forked worker processes sharing the port (default: 1, POSIX only)",
+    )
     parser.add_argument("--debug", action="store_true", help="Enable hex preview logging")
+    parser.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        default="text",
+        help="Log line format: timestamped text or JSON lines (default: text)",
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=float,
+        default=1.0,
+        help="Fraction of per-message echo events to log, e.g. 0.01 (default: 1.0)",
+    )
+    parser.add_argument(
+        "--log-rate",
+        type=float,
+        default=None,
+        help="Max per-message echo events logged per second per remote (default: unlimited)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve Prometheus-style metrics over HTTP on this port (worker i uses port + i)",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=10.0,
+        help="Seconds to let open connections finish their current message on shutdown (default: 10)",
+    )
     args = parser.parse_args(argv)
+    if not 0.0 <= args.log_sample <= 1.0:
+        parser.error("--log-sample must be between 0 and 1")
+    if args.log_rate is not None and args.log_rate <= 0:
+        parser.error("--log-rate must be positive")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.metrics_port is not None and not 0 < args.metrics_port < 65536:
+        parser.error("--metrics-port must be between 1 and 65535")
+    if args.max_clients is not None and args.max_clients < 1:
+        parser.error("--max-clients must be at least 1")
+    if args.queue_size < 1:
+        parser.error("--queue-size must be at least 1")
+    if args.queue_timeout <= 0:
+        parser.error("--queue-timeout must be positive")
+    if args.drain_timeout < 0:
+        parser.error("--drain-timeout must not be negative")
     return ServerConfig(
         host=args.host,
         port=args.port,
@@ -101,10 +475,20 @@ def parse_args(argv: list[str]) -> ServerConfig:
         max_bytes=args.max_bytes,
         max_clients=args.max_clients,
         debug=args.debug,
+        engine=args.engine,
+        workers=args.workers,
+        log_format=args.log_format,
+        log_sample=args.log_sample,
+        log_rate=args.log_rate,
+        metrics_port=args.metrics_port,
+        drain_timeout=args.drain_timeout,
+        queue_size=args.queue_size,
+        queue_timeout=args.queue_timeout,
+        overload=args.overload,
     )
 
 
-def create_socket(logger: Logger, config: ServerConfig) -> socket.socket:
+def create_socket(logger: Logger, config: ServerConfig, reuse_port: bool = False) -> socket.socket:
     try:
         addrinfo_list = socket.getaddrinfo(
             config.host, config.port, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP
@@ -121,8 +505,11 @@ def create_socket(logger: Logger, config: ServerConfig) -> socket.socket:
             # Reuse address for quick restarts on Unix-like systems.
             if hasattr(socket, "SO_REUSEADDR"):
                 sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                # Let several worker processes bind the same port; the kernel balances accepts.
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             sock.bind(sockaddr)
-            sock.listen()
+            sock.listen(socket.SOMAXCONN)
             sock.settimeout(1.0)  # short timeout to allow graceful shutdown checks
             logger.info("Server bound", host=sockaddr[0], port=sockaddr[1])
             return sock
@@ -143,12 +530,32 @@ class ProtocolError(Exception):
         super().__init__(message)
 
 
+class ClientSession:
+    """A serve_threads connection, tracked so a drain or the overload policy can close it between messages."""
+
+    __slots__ = ("conn", "remote", "mid_message", "last_active", "draining")
+
+    def __init__(self, conn: socket.socket, remote: str) -> None:
+        self.conn = conn
+        self.remote = remote
+        self.mid_message = False  # set by the handler while a message is partly received
+        self.last_active = time.monotonic()
+        self.draining = False
+
+    def close_when_idle(self) -> None:
+        """Wake the handler with a clean EOF at its next message boundary."""
+        self.draining = True
+        with contextlib.suppress(OSError):
+            self.conn.shutdown(socket.SHUT_RD)
+
+
 def send_all(conn: socket.socket, data: bytes) -> None:
+    view = memoryview(data)  # slicing a view after a partial send does not copy
     total_sent = 0
-    length = len(data)
+    length = len(view)
     while total_sent < length:
         try:
-            sent = conn.send(data[total_sent:])
+            sent = conn.send(view[total_sent:])
         except socket.timeout as err:
             raise TimeoutError("Send timeout") from err
         except OSError as err:  # includes ConnectionResetError
@@ -158,6 +565,32 @@ def send_all(conn: socket.socket, data: bytes) -> None:
         total_sent += sent
 
 
+def send_all_vectored(conn: socket.socket, buffers: list[memoryview]) -> None:
+    """Send several buffers back to back, gathered into one sendmsg call where supported."""
+    if not hasattr(conn, "sendmsg"):  # Windows
+        for data in buffers:
+            send_all(conn, data)
+        return
+    pending = [data for data in buffers if len(data)]
+    while pending:
+        try:
+            sent = conn.sendmsg(pending)
+        except socket.timeout as err:
+            raise TimeoutError("Send timeout") from err
+        except OSError as err:
+            raise ConnectionError("Send failed") from err
+        if sent == 0:
+            raise ConnectionError("Socket connection broken during send")
+        while sent:
+            head = pending[0]
+            if sent >= len(head):
+                sent -= len(head)
+                pending.pop(0)
+            else:
+                pending[0] = head[sent:]
+                sent = 0
+
+
 def read_exact(conn: socket.socket, count: int) -> Optional[bytes]:
     """Read exactly count bytes, returning None if EOF before any bytes were read."""
     chunks: list[bytes] = []
@@ -178,37 +611,83 @@ def read_exact(conn: socket.socket, count: int) -> Optional[bytes]:
     return b"".join(chunks)
 
 
-def handle_line_mode(conn: socket.socket, config: ServerConfig, logger: Logger, remote: str) -> None:
-    buffer = bytearray()
+def handle_line_mode(
+    conn: socket.socket,
+    config: ServerConfig,
+    logger: Logger,
+    stats: MetricsShard,
+    remote: str,
+    session: Optional[ClientSession] = None,
+) -> None:
+    """Echo newline-terminated messages, one gathered send per receive.
+
+    Bytes are received with recv_into into a reusable buffer that is compacted
+    in place (and grown up to max_bytes) instead of being trimmed per line, and
+    every complete line from a read goes back in a single memoryview send.
+    """
+    limit = config.max_bytes + 1  # allow newline
+    capacity = limit + 1  # one extra byte is enough to detect an overlong line
+    buffer = bytearray(min(BUFFER_SIZE, capacity))
+    view = memoryview(buffer)
+    start = end = scan = 0
     while True:
+        if end == len(buffer):
+            pending = end - start
+            if start:
+                buffer[:pending] = view[start:end]
+            else:
+                view.release()
+                grown = bytearray(min(len(buffer) * 2, capacity))
+                grown[:pending] = buffer
+                buffer = grown
+                view = memoryview(buffer)
+            scan -= start
+            start, end = 0, pending
+        if session is not None:
+            session.mid_message = end > start
         try:
-            chunk = conn.recv(BUFFER_SIZE)
+            nbytes = conn.recv_into(view[end:])
         except socket.timeout as err:
             raise TimeoutError("Receive timeout") from err
         except OSError as err:
             raise ConnectionError("Receive failed") from err
-        if not chunk:
-            if buffer:
+        if not nbytes:
+            if end > start:
                 raise ConnectionError("Peer closed connection mid-line")
             return
-        buffer.extend(chunk)
-        if len(buffer) > config.max_bytes + 1:  # allow newline
+        end += nbytes
+        received = time.perf_counter()
+        stats.bytes_in += nbytes
+        if session is not None:
+            session.last_active = time.monotonic()
+
+        batch_start = start
+        lines = 0
+        overlong = False
+        idx = buffer.find(b"\n", scan, end)
+        while idx != -1:
+            stop = idx + 1
+            if stop - start > limit:
+                overlong = True
+                break
+            if logger.debug:
+                logger.debug_dump("recv", bytes(view[start:stop]))
+            logger.echo("Echoed line", remote, bytes=stop - start)
+            lines += 1
+            start = stop
+            idx = buffer.find(b"\n", start, end)
+        scan = end
+        if start > batch_start:
+            send_all(conn, view[batch_start:start])
+            stats.bytes_out += start - batch_start
+            stats.echoed(lines, time.perf_counter() - received)
+            if logger.debug:
+                logger.debug_dump("send", bytes(view[batch_start:start]))
+        if overlong or end - start > limit:
             send_error_line_too_long(conn)
             raise ProtocolError("Line exceeds configured max bytes")
-        while True:
-            idx = buffer.find(b"\n")
-            if idx == -1:
-                break
-            message = bytes(buffer[: idx + 1])
-            del buffer[: idx + 1]
-            logger.debug_dump("recv", message)
-            send_all(conn, message)
-            logger.debug_dump("send", message)
-            logger.info(
-                "Echoed line",
-                remote=remote,
-                bytes=len(message),
-            )
+        if start == end:
+            start = end = scan = 0
 
 
 def send_error_line_too_long(conn: socket.socket) -> None:
@@ -220,47 +699,100 @@ def send_error_line_too_long(conn: socket.socket) -> None:
         pass
 
 
+# Largest slice of a length-prefixed payload held in memory while relaying it.
+RELAY_CHUNK_SIZE = 65536
+
+
 def handle_length_prefixed_mode(
-    conn: socket.socket, config: ServerConfig, logger: Logger, remote: str
+    conn: socket.socket,
+    config: ServerConfig,
+    logger: Logger,
+    stats: MetricsShard,
+    remote: str,
+    session: Optional[ClientSession] = None,
 ) -> None:
+    """Echo length-prefixed frames, relaying each payload as it arrives.
+
+    The payload is never assembled: chunks are received with recv_into into one
+    reusable buffer and sent straight back, the header going out with the first
+    chunk in a single gathered send. Memory per connection stays at
+    RELAY_CHUNK_SIZE whatever --max-bytes allows.
+    """
+    buffer = bytearray(min(RELAY_CHUNK_SIZE, max(config.max_bytes, 1)))
+    view = memoryview(buffer)
     while True:
         header = read_exact(conn, 4)
         if header is None:
             return
+        if session is not None:
+            session.mid_message = True
+            session.last_active = time.monotonic()
+        received = time.perf_counter()
+        stats.bytes_in += 4
         length = int.from_bytes(header, "big", signed=False)
         if length > config.max_bytes:
             logger.error("Length exceeds max", remote=remote, length=length)
             raise ProtocolError("Length exceeds configured max bytes")
-        payload = read_exact(conn, length)
-        if payload is None:
-            raise ConnectionError("Connection closed before payload was fully received")
-        message = header + payload
-        logger.debug_dump("recv", message)
-        send_all(conn, message)
-        logger.debug_dump("send", message)
-        logger.info("Echoed frame", remote=remote, bytes=len(message), payload=length)
+        pending_header: Optional[bytes] = header
+        preview = header  # header plus the start of the payload, for --debug
+        remaining = length
+        while remaining:
+            try:
+                nbytes = conn.recv_into(view, min(remaining, len(buffer)))
+            except socket.timeout as err:
+                raise TimeoutError("Receive timeout") from err
+            except OSError as err:
+                raise ConnectionError("Receive failed") from err
+            if not nbytes:
+                raise ConnectionError("Connection closed before payload was fully received")
+            stats.bytes_in += nbytes
+            chunk = view[:nbytes]
+            if pending_header is not None:
+                if logger.debug:
+                    preview = header + bytes(chunk[:60])
+                    logger.debug_dump("recv", preview, size=4 + length)
+                send_all_vectored(conn, [memoryview(pending_header), chunk])
+                pending_header = None
+            else:
+                send_all(conn, chunk)
+            stats.bytes_out += nbytes
+            remaining -= nbytes
+        if pending_header is not None:  # zero-length payload
+            logger.debug_dump("recv", header)
+            send_all(conn, header)
+        stats.bytes_out += 4
+        stats.echoed(1, time.perf_counter() - received)
+        if session is not None:
+            session.mid_message = False
+        logger.debug_dump("send", preview, size=4 + length)
+        logger.echo("Echoed frame", remote, bytes=4 + length, payload=length)
 
 
 def handle_client(
-    conn: socket.socket,
-    addr: tuple[str, int],
+    session: ClientSession,
     config: ServerConfig,
     logger: Logger,
-    semaphore: Optional[threading.Semaphore],
+    metrics: Metrics,
+    sessions: set[ClientSession],
 ) -> None:
-    remote = f"{addr[0]}:{addr[1]}"
+    conn = session.conn
+    remote = session.remote
     start = time.monotonic()
+    stats = metrics.shard()
     try:
         conn.settimeout(config.timeout)
         if config.mode == "line":
-            handle_line_mode(conn, config, logger, remote)
+            handle_line_mode(conn, config, logger, stats, remote, session)
         else:
-            handle_length_prefixed_mode(conn, config, logger, remote)
+            handle_length_prefixed_mode(conn, config, logger, stats, remote, session)
     except TimeoutError as err:
+        stats.errors["timeout"] += 1
         logger.error("Timeout", remote=remote, error=err)
     except ProtocolError as err:
+        stats.errors["protocol"] += 1
         logger.error("Protocol error", remote=remote, error=err)
     except ConnectionError as err:
+        stats.errors["connection"] += 1
         logger.error("Connection error", remote=remote, error=err)
     finally:
         try:
@@ -268,25 +800,1042 @@ def handle_client(
         except OSError:
             pass
         conn.close()
+        stats.closed += 1
         duration_ms = int((time.monotonic() - start) * 1000)
         logger.info("Connection closed", remote=remote, duration_ms=duration_ms)
-        if semaphore is not None:
-            semaphore.release()
+        logger.forget(remote)
+        sessions.discard(session)
 
 
-def serve_forever(config: ServerConfig, logger: Logger) -> None:
-    sock = create_socket(logger, config)
-    stop_event = threading.Event()
-    semaphore = threading.Semaphore(config.max_clients) if config.max_clients else None
-    active_threads: list[threading.Thread] = []
+class LineFramer:
+    """Incremental newline framer with the same limits as handle_line_mode.
+
+    feed() returns the lines completed so far; a violation is recorded in
+    ``error`` so callers can echo those lines before failing the connection.
+    """
+
+    __slots__ = ("max_bytes", "buffer", "error")
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.error: Optional[ProtocolError] = None
+
+    def feed(self, data: bytes) -> list[bytes]:
+        buffer = self.buffer
+        scan = len(buffer)  # the buffered tail holds no newline yet
+        buffer.extend(data)
+        limit = self.max_bytes + 1  # allow newline
+        messages: list[bytes] = []
+        start = 0
+        while True:
+            idx = buffer.find(b"\n", scan)
+            if idx == -1:
+                break
+            if idx + 1 - start > limit:
+                break
+            messages.append(bytes(buffer[start : idx + 1]))
+            start = scan = idx + 1
+        if start:
+            del buffer[:start]
+        if len(buffer) > limit:  # also covers breaking on an overlong complete line
+            self.error = ProtocolError("Line exceeds configured max bytes")
+        return messages
+
+    def close(self) -> None:
+        if self.buffer:
+            raise ConnectionError("Peer closed connection mid-line")
+
+
+class LengthPrefixedFramer:
+    """Incremental 4-byte length-prefix framer mirroring handle_length_prefixed_mode."""
+
+    __slots__ = ("max_bytes", "buffer", "expected", "error")
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.expected: Optional[int] = None
+        self.error: Optional[ProtocolError] = None
+
+    def feed(self, data: bytes) -> list[bytes]:
+        buffer = self.buffer
+        buffer.extend(data)
+        frames: list[bytes] = []
+        start = 0
+        while True:
+            available = len(buffer) - start
+            if self.expected is None:
+                if available < 4:
+                    break
+                length = int.from_bytes(buffer[start : start + 4], "big", signed=False)
+                if length > self.max_bytes:
+                    self.error = ProtocolError(f"Length exceeds configured max bytes (length={length})")
+                    break
+                self.expected = length
+            end = start + 4 + self.expected
+            if len(buffer) < end:
+                break
+            frames.append(bytes(buffer[start:end]))
+            start = end
+            self.expected = None
+        if start:
+            del buffer[:start]
+        return frames
+
+    def close(self) -> None:
+        if self.buffer:
+            raise ConnectionError("Connection closed mid-message")
+
+
+def make_framer(config: ServerConfig):
+    if config.mode == "line":
+        return LineFramer(config.max_bytes)
+    return LengthPrefixedFramer(config.max_bytes)
+
+
+class _EventConnection:
+    """Per-connection state owned by the selectors engine."""
+
+    __slots__ = ("sock", "remote", "framer", "outbox", "started", "last_active", "closing", "events")
+
+    def __init__(self, sock: socket.socket, remote: str, framer, now: float) -> None:
+        self.sock = sock
+        self.remote = remote
+        self.framer = framer
+        self.outbox = bytearray()
+        self.started = now
+        self.last_active = now
+        self.closing = False
+        self.events = selectors.EVENT_READ
+
+
+# Stop reading from a peer once this many echoed bytes are waiting to be written.
+OUTBOX_HIGH_WATER = 256 * 1024
+
+# Seconds between checks for connections that reached a message boundary while draining.
+DRAIN_POLL = 0.05
+# Seconds an event-engine connection must be quiet before a drain closes it, so that a
+# message already in the socket buffer is still echoed rather than answered with a reset.
+DRAIN_IDLE_GRACE = 0.1
+
+
+class TimerWheel:
+    """Hashed timing wheel of idle deadlines for the event engines.
+
+    Entries are objects with a ``last_active`` monotonic timestamp, so
+    recording activity is just that attribute store; the wheel is not
+    touched. When an entry's slot comes due it either expires or, if it was
+    active in the meantime, moves to the slot of its new deadline. expire()
+    visits only slots whose time has passed, so each tick costs the entries
+    due in it rather than one check per open connection.
+    """
+
+    def __init__(self, timeout: float, tick: float, now: float, stats: MetricsShard) -> None:
+        self.timeout = timeout
+        self.tick = tick
+        self.stats = stats
+        # One rotation covers the timeout, so a slot never mixes deadlines from different laps.
+        self.slots: list[set] = [set() for _ in range(int(timeout / tick) + 2)]
+        self.where: dict[object, int] = {}
+        self.current = int(now / tick)  # last tick already processed
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def add(self, entry) -> None:
+        self._place(entry, entry.last_active + self.timeout)
+
+    def remove(self, entry) -> None:
+        slot = self.where.pop(entry, None)
+        if slot is not None:
+            self.slots[slot].discard(entry)
+
+    def _place(self, entry, deadline: float) -> None:
+        due = max(-int(-deadline // self.tick), self.current + 1)  # first tick at or after the deadline
+        slot = due % len(self.slots)
+        self.slots[slot].add(entry)
+        self.where[entry] = slot
+
+    def expire(self, now: float) -> list:
+        """Return entries idle for at least timeout, dropping them from the wheel."""
+        target = int(now / self.tick)
+        count = len(self.slots)
+        if target - self.current > count:
+            self.current = target - count  # visiting every slot once is enough after a long stall
+        expired = []
+        rescheduled = 0
+        while self.current < target:
+            self.current += 1
+            slot = self.current % count
+            due = self.slots[slot]
+            if not due:
+                continue
+            self.slots[slot] = set()
+            for entry in due:
+                del self.where[entry]
+                deadline = entry.last_active + self.timeout
+                if deadline <= now:
+                    expired.append(entry)
+                else:
+                    self._place(entry, deadline)
+                    rescheduled += 1
+        self.stats.timers_fired += len(expired)
+        self.stats.timers_rescheduled += rescheduled
+        return expired
+
+
+class SelectorsEngine:
+    """Single-threaded event loop multiplexing every client on one selector."""
+
+    def __init__(
+        self,
+        config: ServerConfig,
+        logger: Logger,
+        metrics: Metrics,
+        sock: socket.socket,
+        stop_event: threading.Event,
+    ) -> None:
+        self.config = config
+        self.logger = logger
+        self.stats = metrics.shard()  # the engine runs on the thread that builds it
+        self.listener = sock
+        self.stop_event = stop_event
+        self.selector = selectors.DefaultSelector()
+        self.connections: dict[int, _EventConnection] = {}
+        self.accepting = False
+        self.high_water = max(OUTBOX_HIGH_WATER, config.max_bytes + 4)
+        # Expire often enough that an idle peer is closed within ~1.25x its timeout.
+        self.tick = min(1.0, max(0.05, config.timeout / 4))
+        self.wheel = TimerWheel(config.timeout, self.tick, time.monotonic(), self.stats)
+
+    def run(self) -> None:
+        self.listener.setblocking(False)
+        self._resume_accept()
+        next_sweep = time.monotonic() + self.tick
+        try:
+            while not self.stop_event.is_set():
+                self._poll(self.tick)
+                now = time.monotonic()
+                if now >= next_sweep:
+                    self._expire_idle(now)
+                    next_sweep = now + self.tick
+            self._drain()
+        finally:
+            for conn in list(self.connections.values()):
+                self._close(conn)
+            self.selector.close()
+
+    def _poll(self, timeout: float) -> None:
+        for key, mask in self.selector.select(timeout=timeout):
+            if key.data is None:
+                self._accept()
+                continue
+            conn: _EventConnection = key.data
+            if mask & selectors.EVENT_READ and not conn.closing:
+                self._on_readable(conn)
+            if mask & selectors.EVENT_WRITE and conn.sock.fileno() != -1:
+                self._flush(conn)
+
+    def _drain(self) -> None:
+        """Stop accepting and close each connection once it is between messages."""
+        self._pause_accept()
+        self.listener.close()
+        if self.connections:
+            self.logger.info("Draining connections", connections=len(self.connections), timeout=self.config.drain_timeout)
+        deadline = time.monotonic() + self.config.drain_timeout
+        while self.connections:
+            now = time.monotonic()
+            if now >= deadline:
+                self.logger.error("Drain deadline passed; closing connections", connections=len(self.connections))
+                return
+            quiet = now - DRAIN_IDLE_GRACE
+            for conn in list(self.connections.values()):
+                if not conn.closing and not conn.framer.buffer and conn.last_active <= quiet:
+                    self._finish(conn)
+            self._poll(min(DRAIN_POLL, deadline - now))
+            self._expire_idle(time.monotonic())
+
+    def _resume_accept(self) -> None:
+        if not self.accepting:
+            self.selector.register(self.listener, selectors.EVENT_READ, None)
+            self.accepting = True
+
+    def _pause_accept(self) -> None:
+        if self.accepting:
+            self.selector.unregister(self.listener)
+            self.accepting = False
+
+    def _accept(self) -> None:
+        max_clients = self.config.max_clients
+        while True:
+            if max_clients and len(self.connections) >= max_clients:
+                # Leave further clients in the kernel backlog until a slot frees up.
+                self._pause_accept()
+                return
+            try:
+                client, addr = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as err:
+                self.logger.error("Accept failed", error=err)
+                sys.exit(EXIT_LISTEN_ACCEPT_FAILURE)
+            client.setblocking(False)
+            self.stats.accepted += 1
+            conn = _EventConnection(client, f"{addr[0]}:{addr[1]}", make_framer(self.config), time.monotonic())
+            self.logger.info("Connection accepted", remote=conn.remote)
+            self.connections[client.fileno()] = conn
+            self.wheel.add(conn)
+            self.selector.register(client, selectors.EVENT_READ, conn)
+
+    def _on_readable(self, conn: _EventConnection) -> None:
+        try:
+            chunk = conn.sock.recv(BUFFER_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.stats.errors["connection"] += 1
+            self.logger.error("Connection error", remote=conn.remote, error=ConnectionError("Receive failed"))
+            self._close(conn)
+            return
+        conn.last_active = time.monotonic()
+        if not chunk:
+            try:
+                conn.framer.close()
+            except ConnectionError as err:
+                self.stats.errors["connection"] += 1
+                self.logger.error("Connection error", remote=conn.remote, error=err)
+                self._close(conn)
+                return
+            self._finish(conn)
+            return
+
+        received = time.perf_counter()
+        self.stats.bytes_in += len(chunk)
+        messages = conn.framer.feed(chunk)
+        label = "Echoed line" if self.config.mode == "line" else "Echoed frame"
+        for message in messages:
+            self.logger.debug_dump("recv", message)
+            conn.outbox += message
+            self.logger.debug_dump("send", message)
+            if self.config.mode == "line":
+                self.logger.echo(label, conn.remote, bytes=len(message))
+            else:
+                self.logger.echo(label, conn.remote, bytes=len(message), payload=len(message) - 4)
+        if conn.framer.error is not None:
+            self.stats.errors["protocol"] += 1
+            self.logger.error("Protocol error", remote=conn.remote, error=conn.framer.error)
+            if self.config.mode == "line":
+                conn.outbox += b"ERR 413 Line Too Long\n"
+            self._finish(conn)
+        elif messages:
+            self._flush(conn)
+        if messages:
+            self.stats.echoed(len(messages), time.perf_counter() - received)
+
+    def _flush(self, conn: _EventConnection) -> None:
+        if conn.outbox:
+            try:
+                sent = conn.sock.send(conn.outbox)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self.stats.errors["connection"] += 1
+                self.logger.error("Connection error", remote=conn.remote, error=ConnectionError("Send failed"))
+                self._close(conn)
+                return
+            if sent:
+                self.stats.bytes_out += sent
+                del conn.outbox[:sent]
+                conn.last_active = time.monotonic()
+        if not conn.outbox and conn.closing:
+            self._close(conn)
+            return
+        self._update_interest(conn)
+
+    def _update_interest(self, conn: _EventConnection) -> None:
+        events = 0
+        if not conn.closing and len(conn.outbox) < self.high_water:
+            events |= selectors.EVENT_READ
+        if conn.outbox:
+            events |= selectors.EVENT_WRITE
+        if events == conn.events:
+            return
+        if not events:
+            self.selector.unregister(conn.sock)
+        elif not conn.events:
+            self.selector.register(conn.sock, events, conn)
+        else:
+            self.selector.modify(conn.sock, events, conn)
+        conn.events = events
+
+    def _finish(self, conn: _EventConnection) -> None:
+        """Close once any queued output (echoes or error line) has been written."""
+        conn.closing = True
+        self._flush(conn)
+
+    def _expire_idle(self, now: float) -> None:
+        for conn in self.wheel.expire(now):
+            self.stats.errors["timeout"] += 1
+            self.logger.error("Timeout", remote=conn.remote, error=TimeoutError("Idle timeout"))
+            self._close(conn)
 
+    def _close(self, conn: _EventConnection) -> None:
+        fileno = conn.sock.fileno()
+        if fileno == -1:
+            return
+        if conn.events:
+            self.selector.unregister(conn.sock)
+        del self.connections[fileno]
+        self.wheel.remove(conn)
+        try:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        conn.sock.close()
+        self.stats.closed += 1
+        duration_ms = int((time.monotonic() - conn.started) * 1000)
+        self.logger.info("Connection closed", remote=conn.remote, duration_ms=duration_ms)
+        self.logger.forget(conn.remote)
+        if not self.accepting and not self.stop_event.is_set():
+            self._resume_accept()
+
+
+class EchoProtocol(asyncio.BufferedProtocol):
+    """Echo protocol reading straight into a reusable bytearray via get_buffer/buffer_updated.
+
+    Complete messages are written to the transport as memoryview slices of that
+    bytearray, so nothing is copied per message. Whenever the transport is left
+    holding unsent data the protocol moves on to a fresh bytearray, because the
+    transport may still reference the old one.
+    """
+
+    def __init__(self, engine: "AsyncioEngine", remote: str) -> None:
+        self.engine = engine
+        self.config = engine.config
+        self.logger = engine.logger
+        self.stats = engine.stats
+        self.remote = remote
+        self.line_mode = engine.config.mode == "line"
+        # Line mode needs one byte past max_bytes + newline to detect overflow.
+        self.capacity = self.config.max_bytes + (2 if self.line_mode else 4)
+        self.buffer = bytearray(min(BUFFER_SIZE, self.capacity))
+        self.start = 0  # first unconsumed byte
+        self.end = 0  # end of received data
+        self.scan = 0  # line mode: bytes before this offset hold no newline
+        self.transport: Optional[asyncio.Transport] = None
+        self.started = time.monotonic()
+        self.last_active = self.started
+        self.received = 0.0  # perf_counter() of the latest read, for echo latency
+        self.failed = False
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+        self.engine.connections.add(self)
+        self.engine.wheel.add(self)
+        self.stats.accepted += 1
+        self.logger.info("Connection accepted", remote=self.remote)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self.end == len(self.buffer):
+            self._make_room()
+        return memoryview(self.buffer)[self.end :]
+
+    def _make_room(self) -> None:
+        pending = self.end - self.start
+        size = len(self.buffer)
+        if self.start == 0:
+            size = min(max(size * 2, BUFFER_SIZE), self.capacity)
+            if size == len(self.buffer):
+                size += BUFFER_SIZE  # never hand out an empty buffer
+        fresh = bytearray(size) if size != len(self.buffer) else self.buffer
+        fresh[:pending] = self.buffer[self.start : self.end]
+        self.buffer = fresh
+        self.scan -= self.start
+        self.start = 0
+        self.end = pending
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self.end += nbytes
+        self.last_active = time.monotonic()
+        self.received = time.perf_counter()
+        self.stats.bytes_in += nbytes
+        try:
+            if self.line_mode:
+                self._echo_lines()
+            else:
+                self._echo_frames()
+        except ProtocolError as err:
+            self.failed = True
+            self.stats.errors["protocol"] += 1
+            self.logger.error("Protocol error", remote=self.remote, error=err)
+            if self.line_mode:
+                self.transport.write(b"ERR 413 Line Too Long\n")
+            self.transport.close()
+            return
+        if self.transport.get_write_buffer_size():
+            # The transport may hold views into self.buffer; continue in a new one.
+            pending = self.end - self.start
+            fresh = bytearray(max(BUFFER_SIZE, pending))
+            fresh[:pending] = self.buffer[self.start : self.end]
+            self.buffer = fresh
+            self.scan -= self.start
+            self.start = 0
+            self.end = pending
+        elif self.start == self.end:
+            self.start = self.end = self.scan = 0
+
+    def _echo(self, begin: int, stop: int, messages: int) -> None:
+        if stop > begin:
+            self.transport.write(memoryview(self.buffer)[begin:stop])
+            self.stats.bytes_out += stop - begin
+            self.stats.echoed(messages, time.perf_counter() - self.received)
+
+    def _echo_lines(self) -> None:
+        buffer = self.buffer
+        limit = self.config.max_bytes + 1  # allow newline
+        batch_start = start = self.start
+        end = self.end
+        lines = 0
+        try:
+            idx = buffer.find(b"\n", self.scan, end)
+            while idx != -1:
+                stop = idx + 1
+                if stop - start > limit:
+                    raise ProtocolError("Line exceeds configured max bytes")
+                if self.logger.debug:
+                    message = bytes(buffer[start:stop])
+                    self.logger.debug_dump("recv", message)
+                    self.logger.debug_dump("send", message)
+                self.logger.echo("Echoed line", self.remote, bytes=stop - start)
+                lines += 1
+                start = stop
+                idx = buffer.find(b"\n", start, end)
+        finally:
+            # Echo every complete line in one write, including those before an error.
+            self._echo(batch_start, start, lines)
+            self.start = start
+            self.scan = end
+        if end - start > limit:
+            raise ProtocolError("Line exceeds configured max bytes")
+
+    def _echo_frames(self) -> None:
+        buffer = self.buffer
+        batch_start = start = self.start
+        end = self.end
+        frames = 0
+        try:
+            while end - start >= 4:
+                length = int.from_bytes(buffer[start : start + 4], "big", signed=False)
+                if length > self.config.max_bytes:
+                    self.logger.error("Length exceeds max", remote=self.remote, length=length)
+                    raise ProtocolError("Length exceeds configured max bytes")
+                stop = start + 4 + length
+                if stop > end:
+                    break
+                if self.logger.debug:
+                    message = bytes(buffer[start:stop])
+                    self.logger.debug_dump("recv", message)
+                    self.logger.debug_dump("send", message)
+                self.logger.echo("Echoed frame", self.remote, bytes=4 + length, payload=length)
+                frames += 1
+                start = stop
+        finally:
+            self._echo(batch_start, start, frames)
+            self.start = start
+
+    def eof_received(self) -> bool:
+        if self.end > self.start:
+            self.failed = True
+            self.stats.errors["connection"] += 1
+            reason = "Peer closed connection mid-line" if self.line_mode else "Connection closed mid-message"
+            self.logger.error("Connection error", remote=self.remote, error=ConnectionError(reason))
+        return False  # let the transport close
+
+    def pause_writing(self) -> None:
+        # Stop reading while the peer is not draining echoes so buffers stay bounded.
+        self.transport.pause_reading()
+
+    def resume_writing(self) -> None:
+        self.last_active = time.monotonic()
+        self.transport.resume_reading()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if exc is not None and not self.failed:
+            self.stats.errors["connection"] += 1
+            self.logger.error("Connection error", remote=self.remote, error=exc)
+        self.engine.connection_closed(self)
+        self.stats.closed += 1
+        duration_ms = int((time.monotonic() - self.started) * 1000)
+        self.logger.info("Connection closed", remote=self.remote, duration_ms=duration_ms)
+        self.logger.forget(self.remote)
+
+
+class AsyncioEngine:
+    """asyncio event loop (uvloop when installed) serving EchoProtocol connections."""
+
+    def __init__(
+        self,
+        config: ServerConfig,
+        logger: Logger,
+        metrics: Metrics,
+        sock: socket.socket,
+        stop_event: threading.Event,
+    ) -> None:
+        self.config = config
+        self.logger = logger
+        self.stats = metrics.shard()  # shared by every protocol on this loop's thread
+        self.listener = sock
+        self.stop_event = stop_event
+        self.connections: set[EchoProtocol] = set()
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.tick = min(1.0, max(0.05, config.timeout / 4))
+        self.wheel = TimerWheel(config.timeout, self.tick, time.monotonic(), self.stats)
+
+    async def run(self) -> None:
+        self.listener.setblocking(False)
+        if self.config.max_clients:
+            self.slots = asyncio.Semaphore(self.config.max_clients)
+        accept_task = asyncio.get_running_loop().create_task(self._accept_loop())
+        try:
+            while not self.stop_event.is_set() and not accept_task.done():
+                await asyncio.sleep(self.tick)
+                self._expire_idle(time.monotonic())
+            if accept_task.done():
+                accept_task.result()  # surface accept failures
+            accept_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await accept_task
+            await self._drain()
+        finally:
+            accept_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await accept_task
+            for proto in list(self.connections):
+                proto.transport.abort()
+            await asyncio.sleep(0)  # let connection_lost callbacks run
+
+    async def _accept_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.slots is not None:
+                # Waiting here leaves new clients in the kernel backlog without blocking the loop.
+                await self.slots.acquire()
+            try:
+                client, addr = await loop.sock_accept(self.listener)
+            except OSError as err:
+                self.logger.error("Accept failed", error=err)
+                sys.exit(EXIT_LISTEN_ACCEPT_FAILURE)
+            # Shielded so that stopping this loop for a drain never drops a client already accepted.
+            await asyncio.shield(self._connect(client, f"{addr[0]}:{addr[1]}"))
+
+    async def _connect(self, client: socket.socket, remote: str) -> None:
+        try:
+            await asyncio.get_running_loop().connect_accepted_socket(lambda: EchoProtocol(self, remote), sock=client)
+        except OSError as err:
+            self.logger.error("Connection error", remote=remote, error=err)
+            client.close()
+            if self.slots is not None:
+                self.slots.release()
+
+    async def _drain(self) -> None:
+        """Close each connection once it is between messages, up to --drain-timeout."""
+        self.listener.close()
+        if not self.connections:
+            return
+        self.logger.info("Draining connections", connections=len(self.connections), timeout=self.config.drain_timeout)
+        deadline = time.monotonic() + self.config.drain_timeout
+        while self.connections:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            quiet = now - DRAIN_IDLE_GRACE
+            for proto in list(self.connections):
+                if proto.start == proto.end and proto.last_active <= quiet and not proto.transport.is_closing():
+                    proto.transport.close()  # queued echoes are flushed before the socket closes
+            await asyncio.sleep(DRAIN_POLL)
+        if self.connections:
+            self.logger.error("Drain deadline passed; closing connections", connections=len(self.connections))
+
+    def connection_closed(self, proto: EchoProtocol) -> None:
+        self.wheel.remove(proto)
+        if proto in self.connections:
+            self.connections.discard(proto)
+            if self.slots is not None:
+                self.slots.release()
+
+    def _expire_idle(self, now: float) -> None:
+        for proto in self.wheel.expire(now):
+            proto.failed = True
+            self.stats.errors["timeout"] += 1
+            self.logger.error("Timeout", remote=proto.remote, error=TimeoutError("Idle timeout"))
+            proto.transport.abort()
+
+
+def new_event_loop(logger: Logger) -> asyncio.AbstractEventLoop:
+    try:
+        import uvloop  # optional, drop-in faster loop
+    except ImportError:
+        return asyncio.new_event_loop()
+    logger.info("Using uvloop event loop")
+    return uvloop.new_event_loop()
+
+
+def raise_fd_limit(logger: Logger) -> None:
+    """Lift the soft open-file limit to the hard limit so one process can hold many sockets."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft >= hard:
+        return
+    target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except (ValueError, OSError) as err:
+        logger.error("Unable to raise open file limit", soft=soft, hard=hard, error=err)
+
+
+def install_signal_handlers(
+    stop_event: threading.Event, logger: Logger, on_restart: Optional[Callable[[], None]] = None
+) -> None:
     def signal_handler(_sig: int, _frame) -> None:
         logger.info("Received shutdown signal")
         stop_event.set()
 
+    def restart_handler(_sig: int, _frame) -> None:
+        logger.info("Received restart signal")
+        # A handoff waits on the successor, so keep it off the serving thread.
+        threading.Thread(target=on_restart, name="restart", daemon=True).start()
+
     signal.signal(signal.SIGINT, signal_handler)
     if hasattr(signal, "SIGTERM"):
         signal.signal(signal.SIGTERM, signal_handler)
+    if on_restart is not None and hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, restart_handler)
+
+
+# Environment variables through which a restarting server passes its listener to the successor.
+LISTEN_FD_ENV = "ECHO_LISTEN_FD"
+METRICS_FD_ENV = "ECHO_METRICS_FD"
+READY_FD_ENV = "ECHO_READY_FD"
+# Seconds to wait for a successor to report it is serving before abandoning a restart.
+HANDOFF_READY_TIMEOUT = 10.0
+
+_handoff_lock = threading.Lock()
+
+
+def inherit_listener(logger: Logger) -> Optional[socket.socket]:
+    """Adopt the listener passed down by a restarting predecessor, if any."""
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is None:
+        return None
+    try:
+        sock = socket.socket(fileno=int(fd))
+    except (ValueError, OSError) as err:
+        logger.error("Unable to use inherited listener", fd=fd, error=err)
+        sys.exit(EXIT_SOCKET_CREATE)
+    sock.settimeout(1.0)
+    host, port = sock.getsockname()[:2]
+    logger.info("Listener inherited", host=host, port=port, fd=fd)
+    return sock
+
+
+def inherit_metrics_listener(logger: Logger) -> Optional[socket.socket]:
+    """Adopt the metrics listener passed down by a restarting predecessor, if any."""
+    fd = os.environ.pop(METRICS_FD_ENV, None)
+    if fd is None:
+        return None
+    try:
+        return socket.socket(fileno=int(fd))
+    except (ValueError, OSError) as err:
+        logger.error("Unable to use inherited metrics listener", fd=fd, error=err)
+        return None
+
+
+def sd_notify(state: str) -> None:
+    """Send a state line to systemd when running under a Type=notify unit; a no-op otherwise."""
+    path = os.environ.get("NOTIFY_SOCKET")
+    if not path or not hasattr(socket, "AF_UNIX"):
+        return
+    if path.startswith("@"):
+        path = "\0" + path[1:]  # abstract namespace
+    with contextlib.suppress(OSError):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as notify:
+            notify.connect(path)
+            notify.sendall(state.encode())
+
+
+def notify_ready() -> None:
+    """Tell a restarting predecessor (or, on first start, systemd) that this process is serving."""
+    fd = os.environ.pop(READY_FD_ENV, None)
+    if fd is None:
+        sd_notify("READY=1")
+        return
+    with contextlib.suppress(ValueError, OSError):
+        os.write(int(fd), b"1" + str(os.getpid()).encode())
+        os.close(int(fd))
+
+
+def spawn_successor(sock: socket.socket, ready_fd: int, metrics_sock: Optional[socket.socket] = None) -> int:
+    """Double-fork and exec a fresh copy of this server; return its pid.
+
+    The successor is not our child, so it outlives this process without being
+    reaped or signalled along with it.
+    """
+    env = dict(os.environ)
+    env[LISTEN_FD_ENV] = str(sock.fileno())
+    env[READY_FD_ENV] = str(ready_fd)
+    if metrics_sock is not None:
+        env[METRICS_FD_ENV] = str(metrics_sock.fileno())
+    argv = [sys.executable, os.path.abspath(sys.argv[0]), *sys.argv[1:]]
+    pid_read, pid_write = os.pipe()
+    child = os.fork()
+    if child == 0:
+        # Only os calls between fork and exec: other threads' locks are not safe to take here.
+        try:
+            os.close(pid_read)
+            grandchild = os.fork()
+            if grandchild == 0:
+                os.close(pid_write)
+                os.set_inheritable(sock.fileno(), True)
+                os.set_inheritable(ready_fd, True)
+                if metrics_sock is not None:
+                    os.set_inheritable(metrics_sock.fileno(), True)
+                os.execve(sys.executable, argv, env)
+            os.write(pid_write, str(grandchild).encode())
+        finally:
+            os._exit(0)
+    os.close(pid_write)
+    os.waitpid(child, 0)
+    try:
+        return int(os.read(pid_read, 32) or b"0")
+    finally:
+        os.close(pid_read)
+
+
+def hand_off_listener(
+    sock: socket.socket,
+    logger: Logger,
+    stop_event: threading.Event,
+    metrics_server: Optional[MetricsHTTPServer] = None,
+) -> None:
+    """Exec a fresh server on an inherited copy of the listener, then drain once it serves.
+
+    Both processes share one listen queue, so connections arriving during the
+    switch wait in the backlog for whichever process accepts next. If the
+    successor fails to start, this process keeps serving. The metrics listener
+    is passed on the same way, so the port is never bound twice. Under systemd
+    the successor is reported as the unit's new main process before this one
+    exits.
+    """
+    if stop_event.is_set() or not _handoff_lock.acquire(blocking=False):
+        return
+    try:
+        read_fd, write_fd = os.pipe()
+        try:
+            pid = spawn_successor(sock, write_fd, metrics_server.socket if metrics_server is not None else None)
+        except OSError as err:
+            logger.error("Unable to start successor", error=err)
+            os.close(read_fd)
+            return
+        finally:
+            os.close(write_fd)
+        with selectors.DefaultSelector() as waiter:
+            waiter.register(read_fd, selectors.EVENT_READ)
+            ready = bool(waiter.select(HANDOFF_READY_TIMEOUT)) and os.read(read_fd, 32)[:1] == b"1"
+        os.close(read_fd)
+        if not ready:
+            logger.error("Successor did not start serving; restart abandoned", pid=pid)
+            if pid:
+                with contextlib.suppress(OSError):
+                    os.kill(pid, signal.SIGKILL)
+            return
+        sd_notify(f"MAINPID={pid}")
+        logger.info("Successor serving; draining", pid=pid)
+        stop_metrics_server(metrics_server)  # scrapes now reach the successor
+        stop_event.set()
+    finally:
+        _handoff_lock.release()
+
+
+def start_metrics_server(
+    config: ServerConfig, logger: Logger, metrics: Metrics, port: int, inherited: Optional[socket.socket] = None
+) -> Optional[MetricsHTTPServer]:
+    """Serve metrics from a daemon thread; a bind failure is logged but not fatal."""
+    try:
+        if inherited is not None:
+            server = MetricsHTTPServer(inherited.getsockname()[:2], MetricsHandler, bind_and_activate=False)
+            server.socket.close()
+            server.socket = inherited
+            server.server_address = inherited.getsockname()
+            port = server.server_address[1]
+        else:
+            server = MetricsHTTPServer((config.host, port), MetricsHandler)
+    except OSError as err:
+        logger.error("Unable to bind metrics listener", host=config.host, port=port, error=err)
+        return None
+    server.metrics = metrics  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Metrics listening", host=config.host, port=port)
+    return server
+
+
+def stop_metrics_server(server: Optional[MetricsHTTPServer]) -> None:
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+
+# Sent to clients turned away by the --max-clients admission policy (line mode only).
+BUSY_LINE = b"ERR 503 Server Busy\n"
+QUEUE_SWEEP_INTERVAL = 0.1  # how often queued sessions are checked against --queue-timeout
+
+
+def reject_client(
+    session: ClientSession, config: ServerConfig, logger: Logger, stats: MetricsShard, reason: str
+) -> None:
+    if config.mode == "line":
+        with contextlib.suppress(OSError):
+            session.conn.settimeout(0)
+            session.conn.send(BUSY_LINE)  # best effort; never block the caller on a slow peer
+    session.conn.close()
+    stats.errors["overload"] += 1
+    stats.closed += 1
+    logger.error("Connection rejected", remote=session.remote, reason=reason)
+
+
+class ClientPool:
+    """Fixed set of handler threads fed from a bounded admission queue.
+
+    Used by the threads engine when --max-clients is set. The accept loop
+    never blocks on a full pool, and the thread count stays fixed however many
+    clients come and go. When the queue is full, --overload wait and shed-idle
+    park up to --queue-size more sessions in an overflow list, which handler
+    threads and the sweeper move into the queue, oldest first, as room opens.
+    A sweeper thread turns away queued and parked sessions once they have
+    waited --queue-timeout, even while every handler is busy.
+    """
+
+    def __init__(
+        self, size: int, config: ServerConfig, logger: Logger, metrics: Metrics, sessions: set[ClientSession]
+    ) -> None:
+        self.config = config
+        self.logger = logger
+        self.metrics = metrics
+        self.sessions = sessions
+        self.serving: set[ClientSession] = set()
+        self.queue: queue.Queue[Optional[tuple[float, ClientSession]]] = queue.Queue(config.queue_size)
+        # Sessions waiting for room in the queue; lock order is overflow_lock, then queue.mutex.
+        self.overflow: collections.deque[tuple[float, ClientSession]] = collections.deque()
+        self.overflow_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"client-{index}", daemon=True)
+            for index in range(size)
+        ]
+        for thread in self.threads:
+            thread.start()
+        threading.Thread(target=self._sweep, name="queue-sweeper", daemon=True).start()
+
+    def submit(self, session: ClientSession, stats: MetricsShard) -> None:
+        item = (time.monotonic(), session)
+        self.sessions.add(session)
+        with self.overflow_lock:
+            if not self.overflow:  # otherwise parked sessions go first
+                try:
+                    self.queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    pass
+            policy = self.config.overload
+            if len(self.overflow) < self.config.queue_size and (
+                policy == "wait" or (policy == "shed-idle" and self._shed_idle(stats))
+            ):
+                self.overflow.append(item)
+                return
+        self.sessions.discard(session)
+        reject_client(session, self.config, self.logger, stats, "admission queue full")
+
+    def _shed_idle(self, stats: MetricsShard) -> bool:
+        idle = [s for s in list(self.serving) if not s.mid_message and not s.draining]
+        if not idle:
+            return False
+        victim = min(idle, key=lambda s: s.last_active)
+        stats.errors["overload"] += 1
+        idle_ms = int((time.monotonic() - victim.last_active) * 1000)
+        self.logger.error("Shedding idle connection", remote=victim.remote, idle_ms=idle_ms)
+        victim.close_when_idle()
+        return True
+
+    def _promote(self) -> None:
+        """Move parked sessions into the queue while it has room."""
+        with self.overflow_lock:
+            while self.overflow:
+                try:
+                    self.queue.put_nowait(self.overflow[0])
+                except queue.Full:
+                    return
+                self.overflow.popleft()
+
+    def _run(self) -> None:
+        stats = self.metrics.shard()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            self._promote()
+            queued_at, session = item
+            if time.monotonic() - queued_at > self.config.queue_timeout:
+                self.sessions.discard(session)
+                reject_client(session, self.config, self.logger, stats, "queued too long")
+                continue
+            self.serving.add(session)
+            try:
+                handle_client(session, self.config, self.logger, self.metrics, self.sessions)
+            finally:
+                self.serving.discard(session)
+
+    def _sweep(self) -> None:
+        stats = self.metrics.shard()
+        interval = min(QUEUE_SWEEP_INTERVAL, self.config.queue_timeout / 4)
+        while not self.stopping.wait(interval):
+            cutoff = time.monotonic() - self.config.queue_timeout
+            # queue.Queue cannot drop items from the middle; edit its deque under its own lock.
+            with self.queue.mutex:
+                waiting = self.queue.queue
+                expired = [item for item in waiting if item is not None and item[0] < cutoff]
+                if expired:
+                    kept = [item for item in waiting if item is None or item[0] >= cutoff]
+                    waiting.clear()
+                    waiting.extend(kept)
+                    self.queue.not_full.notify(len(expired))
+            with self.overflow_lock:
+                # Parked in arrival order, so the expired ones are at the front
+                while self.overflow and self.overflow[0][0] < cutoff:
+                    expired.append(self.overflow.popleft())
+            self._promote()
+            for _queued_at, session in expired:
+                self.sessions.discard(session)
+                reject_client(session, self.config, self.logger, stats, "queued too long")
+
+    def shutdown(self) -> None:
+        self.stopping.set()
+        for _thread in self.threads:
+            with contextlib.suppress(queue.Full):
+                self.queue.put(None, timeout=1.0)
+        deadline = time.monotonic() + 1.0
+        for thread in self.threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+
+def serve_threads(
+    config: ServerConfig, logger: Logger, metrics: Metrics, sock: socket.socket, stop_event: threading.Event
+) -> None:
+    sessions: set[ClientSession] = set()
+    stats = metrics.shard()
+    pool = ClientPool(config.max_clients, config, logger, metrics, sessions) if config.max_clients else None
 
     try:
         while not stop_event.is_set():
@@ -298,30 +1847,269 @@ def serve_forever(config: ServerConfig, logger: Logger) -> None:
                 logger.error("Accept failed", error=err)
                 sys.exit(EXIT_LISTEN_ACCEPT_FAILURE)
 
-            if semaphore is not None:
-                semaphore.acquire()
-
-            thread = threading.Thread(
+            stats.accepted += 1
+            session = ClientSession(conn, f"{addr[0]}:{addr[1]}")
+            logger.info("Connection accepted", remote=session.remote)
+            if pool is not None:
+                pool.submit(session, stats)
+                continue
+            sessions.add(session)
+            threading.Thread(
                 target=handle_client,
-                args=(conn, addr, config, logger, semaphore),
+                args=(session, config, logger, metrics, sessions),
                 daemon=True,
-            )
-            thread.start()
-            active_threads.append(thread)
+            ).start()
+    finally:
+        sock.close()
+        drain_threads(sessions, config, logger)
+        if pool is not None:
+            pool.shutdown()
+
+
+def drain_threads(sessions: set[ClientSession], config: ServerConfig, logger: Logger) -> None:
+    """Close each connection once it is between messages, forcing the rest at the deadline.
+
+    Shutting down the read side wakes a handler blocked in recv() with a clean
+    EOF, so it returns normally; handlers mid-message keep going until they
+    are back at a message boundary. Connections still queued for a pool
+    thread are served what they already sent, then closed the same way.
+    """
+    deadline = time.monotonic() + config.drain_timeout
+    if sessions:
+        logger.info("Draining connections", connections=len(sessions), timeout=config.drain_timeout)
+    while sessions and time.monotonic() < deadline:
+        for session in list(sessions):
+            if not session.mid_message and not session.draining:
+                session.close_when_idle()
+        time.sleep(DRAIN_POLL)
+    remaining = list(sessions)
+    if remaining:
+        logger.error("Drain deadline passed; closing connections", connections=len(remaining))
+        for session in remaining:
+            with contextlib.suppress(OSError):
+                session.conn.shutdown(socket.SHUT_RDWR)
+    # Handler threads finish quickly once their sockets are shut down.
+    settle = time.monotonic() + 1.0
+    while sessions and time.monotonic() < settle:
+        time.sleep(DRAIN_POLL)
+
+
+def serve_selectors(
+    config: ServerConfig, logger: Logger, metrics: Metrics, sock: socket.socket, stop_event: threading.Event
+) -> None:
+    raise_fd_limit(logger)
+    try:
+        SelectorsEngine(config, logger, metrics, sock, stop_event).run()
+    finally:
+        sock.close()
+
+
+# Seconds a crashed worker waits before respawning when it died right after starting.
+WORKER_RESTART_DELAY = 1.0
+# Seconds the supervisor waits, beyond --drain-timeout, for workers to exit after SIGTERM before killing them.
+WORKER_SHUTDOWN_GRACE = 5.0
+SUPERVISOR_POLL = 0.2
+
+
+def run_engine(
+    config: ServerConfig, logger: Logger, metrics: Metrics, sock: socket.socket, stop_event: threading.Event
+) -> None:
+    if config.engine == "selectors":
+        serve_selectors(config, logger, metrics, sock, stop_event)
+    elif config.engine == "asyncio":
+        serve_asyncio(config, logger, metrics, sock, stop_event)
+    else:
+        serve_threads(config, logger, metrics, sock, stop_event)
+
+
+def reuse_port_supported() -> bool:
+    if not hasattr(socket, "SO_REUSEPORT"):
+        return False
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    except OSError:
+        return False
+    return True
+
+
+def run_worker(index: int, config: ServerConfig, logger: Logger, shared_sock: Optional[socket.socket]) -> None:
+    """Body of a forked worker; never returns to the supervisor's stack."""
+    code = 0
+    logger.after_fork()
+    metrics_server = None
+    try:
+        sock = shared_sock if shared_sock is not None else create_socket(logger, config, reuse_port=True)
+        stop_event = threading.Event()
+        install_signal_handlers(stop_event, logger)
+        if hasattr(signal, "SIGHUP"):
+            # The supervisor ignores SIGHUP; a hangup sent to the process group must not kill the workers.
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        logger.info("Worker started", worker=index, pid=os.getpid())
+        metrics = Metrics()
+        if config.metrics_port is not None:
+            # One listener per worker: a shared port would hand each scrape to a random worker.
+            metrics_server = start_metrics_server(config, logger, metrics, config.metrics_port + index)
+        run_engine(config, logger, metrics, sock, stop_event)
+    except SystemExit as exc:
+        code = exc.code if isinstance(exc.code, int) else 1
+    except KeyboardInterrupt:
+        pass
+    except BaseException as err:  # noqa: BLE001 - report and let the supervisor restart us
+        logger.error("Worker crashed", worker=index, error=repr(err))
+        code = 1
+    finally:
+        stop_metrics_server(metrics_server)
+        logger.close()
+        os._exit(code)
+
+
+def stop_workers(workers: dict[int, int], logger: Logger, drain_timeout: float) -> None:
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + drain_timeout + WORKER_SHUTDOWN_GRACE
+    while workers and time.monotonic() < deadline:
+        try:
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            workers.clear()
+            break
+        if pid == 0:
+            time.sleep(0.05)
+            continue
+        workers.pop(pid, None)
+    for pid, index in list(workers.items()):
+        logger.error("Worker did not drain in time; killing", worker=index, pid=pid)
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+    workers.clear()
+
+
+def serve_workers(config: ServerConfig, logger: Logger) -> None:
+    """Fork config.workers processes and keep them alive until shutdown."""
+    shared_sock: Optional[socket.socket] = None
+    if not reuse_port_supported():
+        logger.info("SO_REUSEPORT unavailable; workers will share one listener")
+        shared_sock = create_socket(logger, config)
+
+    stop_event = threading.Event()
+    install_signal_handlers(
+        stop_event,
+        logger,
+        on_restart=lambda: logger.error("Restart handoff is not supported with --workers; ignoring SIGHUP"),
+    )
+    workers: dict[int, int] = {}  # pid -> worker index
+    started: dict[int, float] = {}  # worker index -> monotonic start time
+    restarts: dict[int, float] = {}  # worker index -> earliest respawn time
+
+    def spawn(index: int) -> None:
+        logger.flush()  # the child must not inherit (and re-write) queued records
+        pid = os.fork()
+        if pid == 0:
+            run_worker(index, config, logger, shared_sock)
+        workers[pid] = index
+        started[index] = time.monotonic()
+
+    exit_code = 0
+    try:
+        for index in range(config.workers):
+            spawn(index)
+        logger.info("Supervisor started", pid=os.getpid(), workers=config.workers, engine=config.engine)
+        while not stop_event.is_set():
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = 0, 0
+            if pid == 0:
+                now = time.monotonic()
+                for index, not_before in list(restarts.items()):
+                    if now >= not_before:
+                        del restarts[index]
+                        spawn(index)
+                stop_event.wait(SUPERVISOR_POLL)
+                continue
+            index = workers.pop(pid, None)
+            if index is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code in (EXIT_SOCKET_CREATE, EXIT_BIND_FAILURE):
+                logger.error("Worker could not bind; stopping pool", worker=index, pid=pid, code=code)
+                exit_code = code
+                break
+            logger.error("Worker exited; restarting", worker=index, pid=pid, code=code)
+            # Throttle crash loops so a worker failing at startup does not fork-bomb the host.
+            uptime = time.monotonic() - started[index]
+            delay = WORKER_RESTART_DELAY if uptime < WORKER_RESTART_DELAY else 0.0
+            restarts[index] = time.monotonic() + delay
+    finally:
+        stop_workers(workers, logger, config.drain_timeout)
+        if shared_sock is not None:
+            shared_sock.close()
+        logger.info("Supervisor stopped")
+    if exit_code:
+        sys.exit(exit_code)
+
+
+def serve_asyncio(
+    config: ServerConfig, logger: Logger, metrics: Metrics, sock: socket.socket, stop_event: threading.Event
+) -> None:
+    raise_fd_limit(logger)
+    loop = new_event_loop(logger)
+    try:
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(AsyncioEngine(config, logger, metrics, sock, stop_event).run())
     finally:
+        asyncio.set_event_loop(None)
+        loop.close()
         sock.close()
-        for thread in active_threads:
-            thread.join(timeout=1.0)
+
+
+def serve_forever(config: ServerConfig, logger: Logger) -> None:
+    if config.workers > 1:
+        if hasattr(os, "fork"):
+            serve_workers(config, logger)
+            return
+        logger.error("--workers requires os.fork(); running a single process", workers=config.workers)
+    sock = inherit_listener(logger) or create_socket(logger, config)
+    metrics_sock = inherit_metrics_listener(logger)
+    stop_event = threading.Event()
+    metrics = Metrics()
+    metrics_server = None
+    if config.metrics_port is not None:
+        metrics_server = start_metrics_server(config, logger, metrics, config.metrics_port, metrics_sock)
+    elif metrics_sock is not None:
+        metrics_sock.close()
+    install_signal_handlers(
+        stop_event, logger, on_restart=lambda: hand_off_listener(sock, logger, stop_event, metrics_server)
+    )
+    notify_ready()
+    try:
+        run_engine(config, logger, metrics, sock, stop_event)
+    finally:
+        stop_metrics_server(metrics_server)
 
 
 def main(argv: list[str]) -> None:
     config = parse_args(argv)
-    logger = Logger(debug=config.debug)
+    logger = Logger(
+        debug=config.debug,
+        fmt=config.log_format,
+        sample=config.log_sample,
+        rate=config.log_rate,
+    )
     try:
         serve_forever(config, logger)
     except KeyboardInterrupt:
         # Already handled via signal, ensure graceful exit.
         pass
+    finally:
+        logger.close()
 
 
 if __name__ == "__main__":
@@ -3,21 +3,34 @@
 """End-to-end tests for the TCP echo application."""
 from __future__ import annotations
 
+import argparse
 import contextlib
+import os
+import select
 import socket
 import subprocess
 import sys
+import tempfile
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable, Iterable, List
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 ROOT = Path(__file__).resolve().parents[1]
 SERVER_PATH = ROOT / "server.py"
 CLIENT_PATH = ROOT / "client.py"
 PYTHON = sys.executable
 EXIT_UTF8_WARNING = 41
+# Extra server.py flags applied to every ServerProcess (e.g. ["--engine", "selectors"]).
+SERVER_EXTRA_ARGS: List[str] = []
+# With one server process the runner binds an ephemeral port itself and hands the
+# listener over the way a SIGHUP restart does; worker pools bind per worker instead.
+INHERIT_LISTENER = os.name == "posix"
+LISTEN_FD_ENV = "ECHO_LISTEN_FD"
+READY_FD_ENV = "ECHO_READY_FD"
+SERVER_READY_TIMEOUT = 5.0
 
 
 @dataclass
@@ -25,12 +38,15 @@ class TestResult:
     name: str
     passed: bool
     detail: str = ""
+    seconds: float = 0.0
 
 
 class ServerProcess:
-    def __init__(self, mode: str, port: int, timeout: float = 5.0, max_bytes: int = 131072) -> None:
+    def __init__(
+        self, mode: str, port: Optional[int] = None, timeout: float = 5.0, max_bytes: int = 131072
+    ) -> None:
         self.mode = mode
-        self.port = port
+        self.port = port or 0
         self.timeout = timeout
         self.max_bytes = max_bytes
         self.process: subprocess.Popen[str] | None = None
@@ -38,6 +54,37 @@ class ServerProcess:
         self.stderr: str = ""
 
     def __enter__(self) -> "ServerProcess":
+        if INHERIT_LISTENER and not self.port:
+            self._start_on_inherited_listener()
+            return self
+        if not self.port:
+            self.port = find_free_port()
+        self._spawn({}, ())
+        wait_for_port("127.0.0.1", self.port, deadline=time.time() + 3.0)
+        return self
+
+    def _start_on_inherited_listener(self) -> None:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(128)
+        self.port = listener.getsockname()[1]
+        ready_r, ready_w = os.pipe()
+        try:
+            env = {LISTEN_FD_ENV: str(listener.fileno()), READY_FD_ENV: str(ready_w)}
+            self._spawn(env, (listener.fileno(), ready_w))
+        finally:
+            listener.close()
+            os.close(ready_w)
+        try:
+            readable, _, _ = select.select([ready_r], [], [], SERVER_READY_TIMEOUT)
+            ready = bool(readable) and os.read(ready_r, 1) == b"1"
+        finally:
+            os.close(ready_r)
+        if not ready:
+            self.__exit__(None, None, None)
+            raise RuntimeError(f"Server on 127.0.0.1:{self.port} did not become ready: {self.stderr.strip()}")
+
+    def _spawn(self, env: Dict[str, str], pass_fds: Tuple[int, ...]) -> None:
         args = [
             PYTHON,
             str(SERVER_PATH),
@@ -51,16 +98,17 @@ class ServerProcess:
             str(self.timeout),
             "--max-bytes",
             str(self.max_bytes),
+            *SERVER_EXTRA_ARGS,
         ]
         self.process = subprocess.Popen(
             args,
             cwd=str(ROOT),
+            env={**os.environ, **env},
+            pass_fds=pass_fds,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
         )
-        wait_for_port("127.0.0.1", self.port, deadline=time.time() + 3.0)
-        return self
 
     def __exit__(self, exc_type, exc, tb) -> None:
         if self.process is None:
@@ -73,6 +121,39 @@ class ServerProcess:
             self.stdout, self.stderr = self.process.communicate(timeout=2)
 
 
+_shared_servers: Dict[Tuple[str, float, int], ServerProcess] = {}
+_shared_locks: Dict[Tuple[str, float, int], threading.Lock] = {}
+_shared_guard = threading.Lock()
+
+
+def shared_server(mode: str, timeout: float = 5.0, max_bytes: int = 131072) -> ServerProcess:
+    """Return the running server for this configuration, starting it on first use.
+
+    Scenarios only open their own connections, so every scenario with the same
+    settings can share one server; stop_shared_servers() ends them all.
+    """
+    key = (mode, timeout, max_bytes)
+    with _shared_guard:
+        lock = _shared_locks.setdefault(key, threading.Lock())
+    with lock:
+        server = _shared_servers.get(key)
+        if server is None:
+            server = ServerProcess(mode, timeout=timeout, max_bytes=max_bytes).__enter__()
+            _shared_servers[key] = server
+        return server
+
+
+def stop_shared_servers() -> None:
+    with _shared_guard:
+        servers = list(_shared_servers.values())
+        _shared_servers.clear()
+    for server in servers:  # signal them all first so their drains overlap
+        if server.process is not None:
+            server.process.terminate()
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
 def find_free_port() -> int:
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
         sock.bind(("127.0.0.1", 0))
@@ -127,150 +208,137 @@ def send_len(host: str, port: int, payload: bytes) -> bytes:
 
 
 def run_line_mode_tests() -> Iterable[TestResult]:
-    results: List[TestResult] = []
-    port = find_free_port()
-    with ServerProcess("line", port) as _server:
-        try:
-            response = send_line("127.0.0.1", port, b"Hello\n")
-            results.append(TestResult("line_ascii", response == b"Hello\n"))
+    port = shared_server("line").port
+    try:
+        response = send_line("127.0.0.1", port, b"Hello\n")
+        yield TestResult("line_ascii", response == b"Hello\n")
 
-            response = send_line("127.0.0.1", port, "Hi TCP 😀!\n".encode("utf-8"))
-            results.append(TestResult("line_unicode", response == "Hi TCP 😀!\n".encode("utf-8")))
+        response = send_line("127.0.0.1", port, "Hi TCP 😀!\n".encode("utf-8"))
+        yield TestResult("line_unicode", response == "Hi TCP 😀!\n".encode("utf-8"))
 
-            response = send_line("127.0.0.1", port, b"\n")
-            results.append(TestResult("line_empty", response == b"\n"))
+        response = send_line("127.0.0.1", port, b"\n")
+        yield TestResult("line_empty", response == b"\n")
 
-            long_payload = ("A" * 8000 + "\n").encode("utf-8")
-            response = send_line("127.0.0.1", port, long_payload)
-            results.append(TestResult("line_long", response == long_payload))
+        long_payload = ("A" * 8000 + "\n").encode("utf-8")
+        response = send_line("127.0.0.1", port, long_payload)
+        yield TestResult("line_long", response == long_payload)
 
-            with socket.create_connection(("127.0.0.1", port), timeout=5.0) as conn:
-                conn.sendall(b"partial message without newline")
-            response = send_line("127.0.0.1", port, b"Ping\n")
-            results.append(TestResult("line_recovery", response == b"Ping\n"))
-        except Exception as err:  # noqa: BLE001
-            results.append(TestResult("line_mode_exception", False, detail=str(err)))
-    return results
+        with socket.create_connection(("127.0.0.1", port), timeout=5.0) as conn:
+            conn.sendall(b"partial message without newline")
+        response = send_line("127.0.0.1", port, b"Ping\n")
+        yield TestResult("line_recovery", response == b"Ping\n")
+    except Exception as err:  # noqa: BLE001
+        yield TestResult("line_mode_exception", False, detail=str(err))
 
 
 def run_length_mode_tests() -> Iterable[TestResult]:
-    results: List[TestResult] = []
-    port = find_free_port()
-    with ServerProcess("len", port, max_bytes=262144) as _server:
-        try:
-            payload = b"Hello length"
-            header = len(payload).to_bytes(4, "big")
-            response = send_len("127.0.0.1", port, payload)
-            results.append(TestResult("len_ascii", response == header + payload))
-
-            payload = "Hi TCP 😀!".encode("utf-8")
-            header = len(payload).to_bytes(4, "big")
-            response = send_len("127.0.0.1", port, payload)
-            results.append(TestResult("len_unicode", response == header + payload))
-
-            payload = b""
-            header = len(payload).to_bytes(4, "big")
-            response = send_len("127.0.0.1", port, payload)
-            results.append(TestResult("len_zero", response == header + payload))
-
-            payload = b"B" * 65536
-            header = len(payload).to_bytes(4, "big")
-            response = send_len("127.0.0.1", port, payload)
-            results.append(TestResult("len_large", response == header + payload))
-
-            payload = bytes([0x80, 0x81, 0x82, 0xFF])
-            header = len(payload).to_bytes(4, "big")
-            response = send_len("127.0.0.1", port, payload)
-            results.append(TestResult("len_invalid_utf8", response == header + payload))
-
-            frame = (300000).to_bytes(4, "big") + b"X" * 10
-            try:
-                with socket.create_connection(("127.0.0.1", port), timeout=5.0) as conn:
-                    conn.settimeout(5.0)
-                    try:
-                        conn.sendall(frame)
-                        conn.shutdown(socket.SHUT_WR)
-                        closed = conn.recv(1)
-                        success = closed == b""
-                        detail = "" if success else "Server kept connection open"
-                    except ConnectionResetError:
-                        success = True
-                        detail = "Connection reset (expected)"
-                    except OSError as send_err:
-                        success = False
-                        detail = str(send_err)
-            except Exception as err:  # noqa: BLE001
-                results.append(TestResult("len_too_large", False, detail=str(err)))
-            else:
-                results.append(TestResult("len_too_large", success, detail=detail))
-        except Exception as err:
-            results.append(TestResult("len_mode_exception", False, detail=str(err)))
-    return results
-
-
-def run_timeout_test() -> Iterable[TestResult]:
-    results: List[TestResult] = []
-    port = find_free_port()
-    with ServerProcess("line", port, timeout=1.0) as _server:
+    port = shared_server("len", max_bytes=262144).port
+    try:
+        payload = b"Hello length"
+        header = len(payload).to_bytes(4, "big")
+        response = send_len("127.0.0.1", port, payload)
+        yield TestResult("len_ascii", response == header + payload)
+
+        payload = "Hi TCP 😀!".encode("utf-8")
+        header = len(payload).to_bytes(4, "big")
+        response = send_len("127.0.0.1", port, payload)
+        yield TestResult("len_unicode", response == header + payload)
+
+        payload = b""
+        header = len(payload).to_bytes(4, "big")
+        response = send_len("127.0.0.1", port, payload)
+        yield TestResult("len_zero", response == header + payload)
+
+        payload = b"B" * 65536
+        header = len(payload).to_bytes(4, "big")
+        response = send_len("127.0.0.1", port, payload)
+        yield TestResult("len_large", response == header + payload)
+
+        payload = bytes([0x80, 0x81, 0x82, 0xFF])
+        header = len(payload).to_bytes(4, "big")
+        response = send_len("127.0.0.1", port, payload)
+        yield TestResult("len_invalid_utf8", response == header + payload)
+
+        frame = (300000).to_bytes(4, "big") + b"X" * 10
         try:
             with socket.create_connection(("127.0.0.1", port), timeout=5.0) as conn:
-                conn.sendall(b"no newline yet")
-                time.sleep(1.5)
-                conn.settimeout(0.5)
+                conn.settimeout(5.0)
                 try:
-                    data = conn.recv(1)
-                    success = data == b""
-                    detail = "" if success else "Data still readable"
+                    conn.sendall(frame)
+                    conn.shutdown(socket.SHUT_WR)
+                    closed = conn.recv(1)
+                    success = closed == b""
+                    detail = "" if success else "Server kept connection open"
                 except ConnectionResetError:
                     success = True
                     detail = "Connection reset (expected)"
-                except socket.timeout:
+                except OSError as send_err:
                     success = False
-                    detail = "Socket still open after timeout"
-                except OSError as err:
-                    success = False
-                    detail = str(err)
-                results.append(TestResult("timeout_enforced", success, detail=detail))
-        except Exception as err:
-            results.append(TestResult("timeout_exception", False, detail=str(err)))
-    return results
+                    detail = str(send_err)
+        except Exception as err:  # noqa: BLE001
+            yield TestResult("len_too_large", False, detail=str(err))
+        else:
+            yield TestResult("len_too_large", success, detail=detail)
+    except Exception as err:
+        yield TestResult("len_mode_exception", False, detail=str(err))
+
+
+def run_timeout_test() -> Iterable[TestResult]:
+    port = shared_server("line", timeout=1.0).port
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=5.0) as conn:
+            conn.sendall(b"no newline yet")
+            time.sleep(1.5)
+            conn.settimeout(0.5)
+            try:
+                data = conn.recv(1)
+                success = data == b""
+                detail = "" if success else "Data still readable"
+            except ConnectionResetError:
+                success = True
+                detail = "Connection reset (expected)"
+            except socket.timeout:
+                success = False
+                detail = "Socket still open after timeout"
+            except OSError as err:
+                success = False
+                detail = str(err)
+            yield TestResult("timeout_enforced", success, detail=detail)
+    except Exception as err:
+        yield TestResult("timeout_exception", False, detail=str(err))
 
 
 def run_concurrency_test() -> Iterable[TestResult]:
-    results: List[TestResult] = []
-    port = find_free_port()
-    with ServerProcess("line", port, timeout=5.0, max_bytes=65536) as _server:
-        errors: List[str] = []
+    port = shared_server("line", max_bytes=65536).port
+    errors: List[str] = []
 
-        def worker(idx: int) -> None:
-            payload = f"msg-{idx}\n".encode("utf-8")
-            try:
-                response = send_line("127.0.0.1", port, payload)
-                if response != payload:
-                    errors.append(f"Mismatch for worker {idx}")
-            except Exception as err:  # noqa: BLE001
-                errors.append(f"Worker {idx} error: {err}")
-
-        threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(16)]
-        for thread in threads:
-            thread.start()
-        for thread in threads:
-            thread.join()
-        results.append(TestResult("concurrency", not errors, detail=", ".join(errors)))
-    return results
+    def worker(idx: int) -> None:
+        payload = f"msg-{idx}\n".encode("utf-8")
+        try:
+            response = send_line("127.0.0.1", port, payload)
+            if response != payload:
+                errors.append(f"Mismatch for worker {idx}")
+        except Exception as err:  # noqa: BLE001
+            errors.append(f"Worker {idx} error: {err}")
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    yield TestResult("concurrency", not errors, detail=", ".join(errors))
 
 
 def run_client_hex_preview_test() -> Iterable[TestResult]:
-    results: List[TestResult] = []
-    port = find_free_port()
     stop_event = threading.Event()
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.bind(("127.0.0.1", 0))
+    srv.listen()
+    srv.settimeout(0.5)
+    port = srv.getsockname()[1]
 
     def invalid_utf8_server() -> None:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as srv:
-            srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            srv.bind(("127.0.0.1", port))
-            srv.listen()
-            srv.settimeout(0.5)
+        with srv:
             while not stop_event.is_set():
                 try:
                     conn, _addr = srv.accept()
@@ -285,7 +353,6 @@ def run_client_hex_preview_test() -> Iterable[TestResult]:
 
     thread = threading.Thread(target=invalid_utf8_server, daemon=True)
     thread.start()
-    wait_for_port("127.0.0.1", port, deadline=time.time() + 2.0)
 
     try:
         result = subprocess.run(
@@ -309,12 +376,110 @@ def run_client_hex_preview_test() -> Iterable[TestResult]:
         )
         condition = result.returncode == EXIT_UTF8_WARNING and "UTF-8 decode error" in result.stderr
         detail = result.stderr.strip()
-        results.append(TestResult("client_hex_preview", condition, detail=detail))
+        yield TestResult("client_hex_preview", condition, detail=detail)
     finally:
         stop_event.set()
         thread.join(timeout=1.0)
 
-    return results
+
+def run_client_stream_test() -> Iterable[TestResult]:
+    lines = b"".join(b"record %d\n" % idx for idx in range(2000))
+    frames = b"".join(len(p).to_bytes(4, "big") + p for p in (b"", b"a\nb", bytes(range(256)) * 8))
+    cases = [
+        ("client_stream_line", "line", "line", lines),
+        ("client_stream_len", "len", "len", frames),
+    ]
+    for name, mode, records, data in cases:
+        try:
+            port = shared_server(mode).port
+            result = subprocess.run(
+                [
+                    PYTHON,
+                    str(CLIENT_PATH),
+                    "--host",
+                    "127.0.0.1",
+                    "--port",
+                    str(port),
+                    "--mode",
+                    mode,
+                    "--input",
+                    "stdin",
+                    "--stream",
+                    "--records",
+                    records,
+                    "--window",
+                    "16",
+                ],
+                cwd=str(ROOT),
+                input=data,
+                capture_output=True,
+                timeout=30,
+            )
+            condition = result.returncode == 0 and result.stdout == data and b"Stream complete" in result.stderr
+            detail = "" if condition else result.stderr.decode("utf-8", "replace").strip()
+            yield TestResult(name, condition, detail=detail)
+        except Exception as err:  # noqa: BLE001
+            yield TestResult(name, False, detail=str(err))
+
+
+def run_client_library_test() -> Iterable[TestResult]:
+    sys.path.insert(0, str(ROOT))
+    import asyncio
+
+    from client import AsyncEchoClient, EchoClient
+
+    async def multiplexed(port: int, mode: str) -> bool:
+        async with AsyncEchoClient("127.0.0.1", port, mode, max_size=2, max_in_flight=8) as client:
+            payloads = [b"async %d" % idx for idx in range(500)]
+            echoes = await client.echo_many(payloads)
+            return echoes == payloads and len(client._conns) <= 2
+
+    for mode in ("line", "len"):
+        try:
+            port = shared_server(mode).port
+            with EchoClient("127.0.0.1", port, mode, max_size=2) as client:
+                payloads = [b"pooled %d" % idx for idx in range(200)]
+                reused = [client.echo(payload) for payload in payloads] == payloads and client._size == 1
+                pipelined = client.echo_many(payloads) == payloads
+            yield TestResult(f"client_library_pool_{mode}", reused and pipelined)
+            yield TestResult(f"client_library_async_{mode}", asyncio.run(multiplexed(port, mode)))
+        except Exception as err:  # noqa: BLE001
+            yield TestResult(f"client_library_{mode}", False, detail=str(err))
+
+
+def run_client_file_test() -> Iterable[TestResult]:
+    data = "".join(f"line {idx} héllo 😀\n" for idx in range(200_000)).encode("utf-8")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "payload.txt"
+        path.write_bytes(data)
+        for mode in ("line", "len"):
+            name = f"client_file_{mode}"
+            try:
+                port = shared_server(mode, max_bytes=len(data)).port
+                result = subprocess.run(
+                    [
+                        PYTHON,
+                        str(CLIENT_PATH),
+                        "--host",
+                        "127.0.0.1",
+                        "--port",
+                        str(port),
+                        "--mode",
+                        mode,
+                        "--input",
+                        "file",
+                        "--path",
+                        str(path),
+                    ],
+                    cwd=str(ROOT),
+                    capture_output=True,
+                    timeout=60,
+                )
+                condition = result.returncode == 0 and result.stdout == data
+                detail = "" if condition else result.stderr.decode("utf-8", "replace").strip()
+                yield TestResult(name, condition, detail=detail)
+            except Exception as err:  # noqa: BLE001
+                yield TestResult(name, False, detail=str(err))
 
 
 TEST_GROUPS: List[Callable[[], Iterable[TestResult]]] = [
@@ -323,19 +488,70 @@ TEST_GROUPS: List[Callable[[], Iterable[TestResult]]] = [
     run_timeout_test,
     run_concurrency_test,
     run_client_hex_preview_test,
+    run_client_stream_test,
+    run_client_library_test,
+    run_client_file_test,
 ]
 
 
-def main() -> None:
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="TCP echo end-to-end tests")
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "selectors", "asyncio"],
+        default="threads",
+        help="Server engine to run every scenario against (default: threads)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes per server (default: 1)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Scenario groups to run concurrently (default: 1)",
+    )
+    return parser.parse_args(argv)
+
+
+def run_group(group: Callable[[], Iterable[TestResult]]) -> List[TestResult]:
+    """Run one scenario group, timing each result from the end of the previous one."""
     results: List[TestResult] = []
-    for group in TEST_GROUPS:
-        results.extend(group())
+    started = time.perf_counter()
+    try:
+        for result in group():
+            now = time.perf_counter()
+            result.seconds = now - started
+            started = now
+            results.append(result)
+    except Exception as err:  # noqa: BLE001
+        results.append(TestResult(group.__name__, False, detail=str(err), seconds=time.perf_counter() - started))
+    return results
+
+
+def main() -> None:
+    args = parse_args(sys.argv[1:])
+    global INHERIT_LISTENER
+    SERVER_EXTRA_ARGS[:] = ["--engine", args.engine, "--workers", str(args.workers)]
+    INHERIT_LISTENER = INHERIT_LISTENER and args.workers <= 1
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+            grouped = list(pool.map(run_group, TEST_GROUPS))
+    finally:
+        stop_shared_servers()
+    elapsed = time.perf_counter() - started
+    results = [result for group in grouped for result in group]
 
     failed = [r for r in results if not r.passed]
     for result in results:
         status = "PASS" if result.passed else "FAIL"
         detail = f" ({result.detail})" if result.detail else ""
-        print(f"[{status}] {result.name}{detail}")
+        print(f"[{status}] {result.name} {result.seconds:.2f}s{detail}")
+    print(f"{len(results)} tests in {elapsed:.2f}s wall ({sum(r.seconds for r in results):.2f}s summed, jobs={args.jobs})")
 
     if failed:
         print(f"Test failures: {len(failed)}", file=sys.stderr)
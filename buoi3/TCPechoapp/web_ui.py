@@ -1,6 +1,12 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify
+import collections
+import itertools
+import json
+import socket
 import subprocess
 import threading
+import time
+import urllib.request
 from pathlib import Path
 import sys
 import shlex
@@ -12,17 +18,158 @@ app = Flask(__name__)
 # Track background processes started by the web UI
 processes = {}  # port -> Popen
 
-log_lines = []
+LOG_LIMIT = 1000
+LOG_PUSH_INTERVAL = 0.1  # batch log lines per SSE event at most this often
+STATS_INTERVAL = 1.0  # seconds per throughput/connection sample
+STATS_HISTORY = 120  # samples kept per server for the charts
+
+# Ring of (seq, line); seq numbers are contiguous, so a reader's cursor says how many lines are new.
+log_lines = collections.deque(maxlen=LOG_LIMIT)
+log_seq = 0
+log_cond = threading.Condition()
 
 def append_log(line: str):
-    log_lines.append(line)
-    # keep log reasonably bounded
-    if len(log_lines) > 1000:
-        del log_lines[0: len(log_lines) - 1000]
+    global log_seq
+    with log_cond:
+        log_seq += 1
+        log_lines.append((log_seq, line))
+        log_cond.notify_all()
+
+def lines_after(cursor: int):
+    """Lines newer than cursor still in the ring, and the new cursor. Call with log_cond held."""
+    fresh = min(log_seq - cursor, len(log_lines))
+    return [line for _seq, line in itertools.islice(log_lines, len(log_lines) - fresh, None)], log_seq
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ServerStats:
+    """One server's --metrics-port counters, sampled into a short history for the charts.
+
+    The server drops log records when its log queue is full, so the charts read
+    its counters rather than count log lines.
+    """
+
+    def __init__(self, metrics_port: int):
+        self.url = f'http://127.0.0.1:{metrics_port}/metrics'
+        self.history = collections.deque(maxlen=STATS_HISTORY)  # (unix time, bytes/s, messages/s, connections)
+        self._sampled = None  # (monotonic time, echoed bytes, messages) at the last scrape
+
+    def scrape(self):
+        """Unlabelled metric values by name, or None while the server is not answering."""
+        try:
+            with urllib.request.urlopen(self.url, timeout=STATS_INTERVAL / 2) as resp:
+                text = resp.read().decode()
+        except OSError:
+            return None
+        values = {}
+        for line in text.splitlines():
+            name, _, value = line.rpartition(' ')
+            if name and not line.startswith('#') and '{' not in name:
+                values[name] = float(value)
+        return values
+
+    def sample(self):
+        """Scrape the counters and return the next history entry, or None."""
+        values = self.scrape()
+        if values is None:
+            return None
+        now = time.monotonic()
+        sent = values.get('echo_sent_bytes_total', 0)
+        messages = values.get('echo_messages_total', 0)
+        then, sent_then, messages_then = self._sampled or (now, sent, messages)
+        elapsed = max(now - then, 1e-6)
+        self._sampled = (now, sent, messages)
+        return (
+            round(time.time(), 1),
+            round((sent - sent_then) / elapsed),
+            round((messages - messages_then) / elapsed),
+            int(values.get('echo_connections_active', 0)),
+        )
+
+
+server_stats = {}  # port -> ServerStats
+stats_lock = threading.Lock()
+sampler_started = False
+
+def ensure_sampler():
+    global sampler_started
+    with stats_lock:
+        if sampler_started:
+            return
+        sampler_started = True
+    def sampler():
+        while True:
+            time.sleep(STATS_INTERVAL)
+            with stats_lock:
+                tracked = list(server_stats.values())
+            for stats in tracked:  # scrape without holding the lock
+                entry = stats.sample()
+                if entry is not None:
+                    with stats_lock:
+                        stats.history.append(entry)
+    threading.Thread(target=sampler, daemon=True).start()
+
+def stats_payload(full: bool):
+    with stats_lock:
+        return {
+            port: list(stats.history) if full else list(stats.history)[-1:]
+            for port, stats in server_stats.items()
+        }
+
+def format_server_line(line: str):
+    """Render a JSON log record as 'ts LEVEL msg key=value'; returns (text, record or None)."""
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return line, None
+    if not isinstance(event, dict):
+        return line, None
+    extras = ' '.join(f'{k}={v}' for k, v in event.items() if k not in ('ts', 'level', 'msg'))
+    text = f"{event.get('ts', '')} {event.get('level', '')} {event.get('msg', '')}"
+    return (f'{text} {extras}' if extras else text), event
 
 @app.route('/')
 def index():
-    return render_template('index.html', log='\n'.join(log_lines), processes=processes)
+    return render_template('index.html', processes=processes)
+
+def sse(event: str, data, event_id=None):
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/events')
+def events():
+    """Server-sent events: new log lines since the client's cursor, plus per-server stats.
+
+    EventSource resends the last id it saw on reconnect, so a reconnecting page
+    only receives the lines it missed.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since', '0')
+    cursor = int(cursor) if cursor.isdigit() else 0
+
+    def stream(cursor):
+        yield 'retry: 2000\n\n'
+        yield sse('stats', stats_payload(full=True))
+        last_stats = time.monotonic()
+        while True:
+            with log_cond:
+                if log_seq == cursor:
+                    log_cond.wait(timeout=STATS_INTERVAL)
+                lines, cursor = lines_after(cursor)
+            if lines:
+                yield sse('log', lines, cursor)
+            now = time.monotonic()
+            if now - last_stats >= STATS_INTERVAL:
+                yield sse('stats', stats_payload(full=False))
+                last_stats = now
+            time.sleep(LOG_PUSH_INTERVAL)
+
+    return Response(stream(cursor), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/start_server', methods=['POST'])
 def start_server():
@@ -34,14 +181,23 @@ def start_server():
     if port in processes:
         append_log(f'Server already running on port {port}')
         return redirect(url_for('index'))
-    args = [PY, str(ROOT / 'server.py'), '--host', '127.0.0.1', '--port', port, '--mode', mode, '--debug']
+    metrics_port = free_port()
+    args = [PY, str(ROOT / 'server.py'), '--host', '127.0.0.1', '--port', port, '--mode', mode,
+            '--log-format', 'json', '--metrics-port', str(metrics_port)]
+    if request.form.get('debug'):
+        args.append('--debug')  # a hex dump per message; the charts do not depend on the log
     append_log(f'Starting server: {" ".join(args)}')
     p = subprocess.Popen(args, cwd=str(ROOT), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     processes[port] = p
+    stats = ServerStats(metrics_port)
+    with stats_lock:
+        server_stats[port] = stats
+    ensure_sampler()
     # start reader thread
     def reader(proc, port):
         for line in proc.stdout:
-            append_log(f'[server {port}] {line.rstrip()}')
+            text, _event = format_server_line(line.rstrip())
+            append_log(f'[server {port}] {text}')
     threading.Thread(target=reader, args=(p, port), daemon=True).start()
     return redirect(url_for('index'))
 
@@ -62,6 +218,8 @@ def stop_server():
         except Exception:
             pass
     processes.pop(port, None)
+    with stats_lock:
+        server_stats.pop(port, None)
     return redirect(url_for('index'))
 
 @app.route('/run_client', methods=['POST'])
@@ -120,7 +278,176 @@ def run_invalid_test_script():
 
 @app.route('/status')
 def status():
-    return jsonify({ 'processes': list(processes.keys()), 'log_tail': log_lines[-200:] })
+    with log_cond:
+        tail = [line for _seq, line in itertools.islice(log_lines, max(len(log_lines) - 200, 0), None)]
+    return jsonify({ 'processes': list(processes.keys()), 'log_tail': tail })
+
+# ---- Load-test launcher: bench.py runs as background jobs ----
+
+LOAD_DIR = ROOT / 'load_runs'  # one bench.py JSON report per finished run
+LOAD_LIMITS = {  # form field -> (minimum, maximum)
+    'concurrency': (1, 2000),
+    'payload_size': (0, 1048576),
+    'duration': (1, 600),
+    'pipeline': (1, 256),
+}
+
+load_jobs = collections.OrderedDict()  # run id -> job dict
+load_version = 0
+load_cond = threading.Condition()
+
+def touch_jobs():
+    """Wake /load/events streams; call with load_cond held after changing a job."""
+    global load_version
+    load_version += 1
+    load_cond.notify_all()
+
+def report_summary(report: dict):
+    config, summary = report['config'], report['summary']
+    return {
+        'port': config['port'], 'mode': config['mode'], 'concurrency': config['concurrency'],
+        'payload_bytes': config['payload_bytes'], 'load': config['load'], 'duration': config.get('duration'),
+        'started': summary['started'], 'completed': summary['completed'], 'errors': summary['errors'],
+        'throughput_rps': summary['throughput_rps'], 'latency_ms': summary['latency_ms'],
+    }
+
+def load_stored_runs():
+    """Rebuild the run history from reports saved by earlier sessions."""
+    if not LOAD_DIR.is_dir():
+        return
+    for path in sorted(LOAD_DIR.glob('*.json')):
+        try:
+            result = report_summary(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError, KeyError):
+            continue
+        load_jobs[path.stem] = {'id': path.stem, 'status': 'done', 'result': result, 'progress': None, 'output': []}
+
+def new_run_id():
+    base = time.strftime('%Y%m%d-%H%M%S')
+    run_id, n = base, 1
+    while run_id in load_jobs:
+        n += 1
+        run_id = f'{base}-{n}'
+    return run_id
+
+def parse_load_form(form):
+    port = form.get('port', '9093')
+    mode = form.get('mode', 'line')
+    if not port.isdigit() or not 1 <= int(port) <= 65535:
+        raise ValueError(f'Invalid port: {port}')
+    if mode not in ('line', 'len'):
+        raise ValueError(f'Invalid mode: {mode}')
+    params = {'port': int(port), 'mode': mode, 'keepalive': form.get('keepalive') == 'on'}
+    for name, (low, high) in LOAD_LIMITS.items():
+        raw = form.get(name, '')
+        try:
+            value = float(raw) if name == 'duration' else int(raw)
+        except ValueError:
+            raise ValueError(f'Invalid {name}: {raw!r}') from None
+        if not low <= value <= high:
+            raise ValueError(f'{name} must be between {low} and {high}')
+        params[name] = value
+    return params
+
+def run_load_job(job, args, report_path):
+    proc = job['proc']
+    for line in proc.stdout:
+        line = line.rstrip()
+        with load_cond:
+            if line.startswith('progress '):
+                fields = dict(part.split('=', 1) for part in line.split()[1:])
+                job['progress'] = {k: float(v) for k, v in fields.items()}
+            else:
+                job['output'] = (job['output'] + [line])[-20:]
+            touch_jobs()
+    code = proc.wait()
+    with load_cond:
+        job.pop('proc', None)
+        if job['status'] == 'stopping':
+            job['status'] = 'stopped'
+        elif code == 0 and report_path.exists():
+            try:
+                job['result'] = report_summary(json.loads(report_path.read_text(encoding='utf-8')))
+                job['status'] = 'done'
+            except (OSError, ValueError, KeyError) as e:
+                job['status'] = 'failed'
+                job['output'].append(f'Unreadable report: {e}')
+        else:
+            job['status'] = 'failed'
+            job['output'].append(f'bench.py exited with code {code}')
+        touch_jobs()
+    append_log(f"[load {job['id']}] {job['status']}")
+
+def jobs_snapshot():
+    return [{k: v for k, v in job.items() if k != 'proc'} for job in load_jobs.values()]
+
+@app.route('/load')
+def load_page():
+    return render_template('load.html', limits=LOAD_LIMITS, ports=list(processes.keys()))
+
+@app.route('/load/start', methods=['POST'])
+def start_load():
+    try:
+        params = parse_load_form(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    LOAD_DIR.mkdir(exist_ok=True)
+    with load_cond:
+        run_id = new_run_id()
+        report_path = LOAD_DIR / f'{run_id}.json'
+        args = [PY, str(ROOT / 'scripts' / 'bench.py'), '--host', '127.0.0.1', '--port', str(params['port']),
+                '--mode', params['mode'], '--concurrency', str(params['concurrency']),
+                '--payload-size', str(params['payload_size']), '--duration', str(params['duration']),
+                '--pipeline', str(params['pipeline']), '--progress', '--json', str(report_path)]
+        if params['keepalive']:
+            args.append('--keepalive')
+        proc = subprocess.Popen(args, cwd=str(ROOT), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        job = {'id': run_id, 'status': 'running', 'params': params, 'progress': None, 'result': None,
+               'output': [], 'proc': proc}
+        load_jobs[run_id] = job
+        touch_jobs()
+    append_log(f'[load {run_id}] Running: {" ".join(args)}')
+    threading.Thread(target=run_load_job, args=(job, args, report_path), daemon=True).start()
+    return jsonify({'id': run_id})
+
+@app.route('/load/stop', methods=['POST'])
+def stop_load():
+    run_id = request.form.get('id', '')
+    with load_cond:
+        job = load_jobs.get(run_id)
+        if job is None or 'proc' not in job:
+            return jsonify({'error': f'No running load job {run_id}'}), 404
+        job['status'] = 'stopping'
+        job['proc'].terminate()
+        touch_jobs()
+    return jsonify({'id': run_id})
+
+@app.route('/load/runs')
+def load_runs():
+    with load_cond:
+        return jsonify(jobs_snapshot())
+
+@app.route('/load/events')
+def load_events():
+    """Server-sent events carrying every job's state whenever one changes."""
+    def stream():
+        seen = -1
+        while True:
+            with load_cond:
+                if load_version == seen:
+                    load_cond.wait(timeout=15)
+                if load_version == seen:
+                    snapshot = None
+                else:
+                    seen = load_version
+                    snapshot = jobs_snapshot()
+            yield ': keepalive\n\n' if snapshot is None else sse('jobs', snapshot)
+            time.sleep(LOG_PUSH_INTERVAL)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+load_stored_runs()
 
 if __name__ == '__main__':
     app.run(debug=False, host='127.0.0.1', port=5000)
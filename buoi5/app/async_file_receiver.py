@@ -2,56 +2,252 @@ import asyncio
 import os
 import hashlib
 import base64
+import uuid
 from common import *
+from file_progress import *
+from chunk_store import *
 
 MAX_CHUNK_BYTES = 65536
+MAX_STREAMS = 16  # most parallel range connections accepted per transfer
+SAVE_EVERY_BYTES = 8 * 1_048_576  # persist the progress index at least this often
+MAX_MISSING_RANGES = 16384  # keeps the file_meta ACK under MAX_MESSAGE
 
-# Ongoing transfers: corr_id -> {'file': file_obj, 'size': int, 'sha256': hashlib, 'received': int, 'expected_sha256': str}
+# Ongoing transfers: corr_id -> {'key': str, 'name': str, 'path': str, 'size': int, 'ranges': list,
+#     'unsaved': int, 'sha256': hashlib or None, 'hashed': int, 'expected_sha256': str or None,
+#     'ranged': bool, 'fd': int or 'file': file_obj, 'writers': int, 'closed': bool,
+#     'chunks': list or None}
 ongoing = {}
 
+def open_ranged(filepath, size, truncate=True):
+    """Open a preallocated file for os.pwrite from several connections."""
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0) | (os.O_TRUNC if truncate else 0)
+    fd = os.open(filepath, flags, 0o644)
+    try:
+        if size and hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    except OSError:
+        os.ftruncate(fd, size)  # e.g. filesystems without fallocate support
+    return fd
+
+def write_at(f, offset, data):
+    if f.tell() != offset:
+        f.seek(offset)
+    f.write(data)
+
+def reuse_chunks(transfer, chunks):
+    """Copy the chunks the store already holds into the part file and return the bytes reused."""
+    reused = 0
+    offset = 0
+    for sha256, length in chunks:
+        if not covers(transfer['ranges'], offset, length):
+            data = read_chunk(sha256, length)
+            if data is not None:
+                if transfer['ranged']:
+                    os.pwrite(transfer['fd'], data, offset)
+                else:
+                    write_at(transfer['file'], offset, data)
+                add_range(transfer['ranges'], offset, length)
+                reused += length
+        offset += length
+    return reused
+
+def hash_file(filepath):
+    with open(filepath, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256')
+
+async def recv_chunk_list_async(reader, meta):
+    """Collect the chunk_list messages that follow a deduplicated file_meta."""
+    chunks = []
+    while len(chunks) < meta['chunk_count']:
+        msg = await recv_frame_async(reader)
+        if msg['type'] != 'chunk_list' or msg['corr_id'] != meta['corr_id']:
+            raise ValueError(f"Expected chunk_list for {meta['corr_id']}, got {msg['type']}")
+        chunks += msg['chunks']
+    return chunks
+
+async def start_transfer(msg, chunks=None):
+    """Open or resume the transfer a file_meta describes and build its ACK."""
+    loop = asyncio.get_event_loop()
+    filename = msg['name']
+    size = msg['size']
+    if chunks is not None and sum(length for _, length in chunks) != size:
+        return build_ack(False, msg['corr_id'], error='Chunk list does not add up to the file size',
+                         from_user='receiver')
+    key = msg.get('resume_key')
+    if not key or not KEY_PATTERN.fullmatch(key):
+        key = uuid.uuid4().hex  # older senders cannot resume
+    await loop.run_in_executor(None, lambda: os.makedirs(PARTIAL_DIR, exist_ok=True))
+    for corr_id in [corr_id for corr_id, transfer in ongoing.items() if transfer['key'] == key]:
+        # The sender reconnected before we noticed its old connection drop
+        await release_transfer(corr_id)
+    ranges = await loop.run_in_executor(None, load_progress, key, filename, size)
+    resume = ranges is not None
+    encoding = 'binary' if msg.get('encoding') == 'binary' else None
+    streams = min(msg.get('streams') or 1, MAX_STREAMS)
+    ranged = streams > 1 and encoding == 'binary' and hasattr(os, 'pwrite')
+    transfer = {
+        'key': key,
+        'name': filename,
+        'path': os.path.join(INBOX_DIR, filename),
+        'size': size,
+        'ranges': ranges or [],
+        'unsaved': 0,
+        # Hashed as it arrives only while bytes come in order from offset 0;
+        # otherwise the finished file is hashed in one pass
+        'sha256': None if resume or ranged else hashlib.sha256(),
+        'hashed': 0,
+        # None when the sender streams the file and sends the hash in file_end
+        'expected_sha256': msg['sha256'],
+        'ranged': ranged,
+        'writers': 0,
+        'closed': False,
+        # Range connections save from executor threads; keep the saves in order
+        'save_lock': asyncio.Lock()
+    }
+    if ranged:
+        transfer['fd'] = await loop.run_in_executor(None, open_ranged, part_path(key), size, not resume)
+    else:
+        transfer['file'] = await loop.run_in_executor(None, open, part_path(key), 'r+b' if resume else 'wb')
+    if chunks is not None:
+        transfer['chunks'] = chunks
+        if await loop.run_in_executor(None, reuse_chunks, transfer, chunks):
+            transfer['sha256'] = None
+    await save_transfer(transfer)
+    ongoing[msg['corr_id']] = transfer
+    missing = limit_ranges(missing_ranges(transfer['ranges'], size), MAX_MISSING_RANGES)
+    return build_ack(True, msg['corr_id'], from_user='receiver', encoding=encoding,
+                     streams=streams if ranged else None, missing=missing,
+                     resume_offset=missing[0][0] if missing else size)
+
+async def record_chunk(transfer, offset, length):
+    """Add written bytes to the index, saving it every SAVE_EVERY_BYTES."""
+    loop = asyncio.get_event_loop()
+    add_range(transfer['ranges'], offset, length)
+    transfer['unsaved'] += length
+    if transfer['unsaved'] >= SAVE_EVERY_BYTES:
+        transfer['unsaved'] = 0
+        if not transfer['ranged']:
+            await loop.run_in_executor(None, transfer['file'].flush)
+        await save_transfer(transfer)
+
+async def save_transfer(transfer):
+    """Save the range index of a transfer, one save at a time."""
+    loop = asyncio.get_event_loop()
+    async with transfer['save_lock']:
+        await loop.run_in_executor(None, save_progress, transfer['key'], transfer['name'], transfer['size'],
+                                   list(transfer['ranges']))
+
+def close_files(transfer):
+    """Mark a transfer closed and close its file once no pwrite is in flight."""
+    transfer['closed'] = True
+    if transfer['writers']:
+        return
+    if not transfer['ranged']:
+        transfer['file'].close()
+    elif transfer['fd'] is not None:
+        os.close(transfer['fd'])
+        transfer['fd'] = None
+
+async def release_transfer(corr_id):
+    """Close an unfinished transfer, keeping its progress for a later resume."""
+    transfer = ongoing.pop(corr_id, None)
+    if transfer is None:
+        return
+    close_files(transfer)
+    await save_transfer(transfer)
+
+async def finish_transfer(writer, corr_id):
+    """Close a completed transfer, move it into the inbox and ACK whether its SHA-256 matched."""
+    loop = asyncio.get_event_loop()
+    transfer = ongoing.pop(corr_id, None)
+    if transfer is None:
+        return
+    close_files(transfer)
+    key = transfer['key']
+    received = received_bytes(transfer['ranges'])
+    if received != transfer['size']:
+        await save_transfer(transfer)
+        ok, error = False, f"Size mismatch: {received} != {transfer['size']}"
+    else:
+        if transfer['sha256'] is None:
+            transfer['sha256'] = await loop.run_in_executor(None, hash_file, part_path(key))
+        ok = transfer['sha256'].hexdigest() == transfer['expected_sha256']
+        error = 'Checksum mismatch' if not ok else None
+        if ok:
+            await loop.run_in_executor(None, os.replace, part_path(key), transfer['path'])
+            if transfer.get('chunks'):
+                await loop.run_in_executor(None, remember_file, transfer['name'], transfer['chunks'])
+        await loop.run_in_executor(None, discard_progress, key)  # a corrupt file is not worth resuming
+    ack = build_ack(ok, corr_id, error=error, from_user='receiver')
+    await send_msg_async(writer, ack)
+
 async def handle_client(reader, writer):
     """Handle async file transfer client."""
     addr = writer.get_extra_info('peername')
     addr_str = f"{addr[0]}:{addr[1]}"
     print(f"Async file receiver client connected: {addr_str}")
     loop = asyncio.get_event_loop()
+    range_bytes = {}  # corr_id -> bytes of a ranged transfer received on this connection
+    started = set()  # corr_ids of transfers whose file_meta came on this connection
+    buf = bytearray(MAX_CHUNK_DATA)  # every binary chunk on this connection is read into it
     try:
         while True:
-            msg = await recv_msg_async(reader)
+            msg = await recv_frame_async(reader, buf)
             if msg['type'] == 'file_meta':
-                filename = msg['name']
-                size = msg['size']
-                expected_sha256 = msg['sha256']
-                filepath = os.path.join('./inbox', filename)
-                await loop.run_in_executor(None, os.makedirs, './inbox', exist_ok=True)
-                file_obj = await loop.run_in_executor(None, open, filepath, 'wb')
-                ongoing[msg['corr_id']] = {
-                    'file': file_obj,
-                    'size': size,
-                    'sha256': hashlib.sha256(),
-                    'received': 0,
-                    'expected_sha256': expected_sha256
-                }
-                ack = build_ack(True, msg['corr_id'], from_user='receiver')
-                await send_msg_async(writer, ack)
+                started.add(msg['corr_id'])
+                chunks = await recv_chunk_list_async(reader, msg) if msg.get('chunk_count') else None
+                await send_msg_async(writer, await start_transfer(msg, chunks))
             elif msg['type'] == 'file_chunk':
                 corr_id = msg['corr_id']
-                if corr_id in ongoing:
-                    transfer = ongoing[corr_id]
+                if corr_id not in ongoing:
+                    continue
+                transfer = ongoing[corr_id]
+                if 'data' in msg:
+                    chunk_bytes = msg['data']
+                else:
                     chunk_bytes = base64.b64decode(msg['bytes_b64'])
-                    await loop.run_in_executor(None, transfer['file'].write, chunk_bytes)
-                    transfer['sha256'].update(chunk_bytes)
-                    transfer['received'] += len(chunk_bytes)
-                    if transfer['received'] >= transfer['size']:
-                        await loop.run_in_executor(None, transfer['file'].close)
-                        actual_sha256 = transfer['sha256'].hexdigest()
-                        ok = actual_sha256 == transfer['expected_sha256']
-                        ack = build_ack(ok, corr_id, error='Checksum mismatch' if not ok else None, from_user='receiver')
-                        await send_msg_async(writer, ack)
-                        del ongoing[corr_id]
+                offset = msg['offset']
+                if offset + len(chunk_bytes) > transfer['size']:
+                    raise ValueError(f"Chunk at {offset} runs past the end of {transfer['name']}")
+                if transfer['ranged']:
+                    transfer['writers'] += 1
+                    try:
+                        await loop.run_in_executor(None, os.pwrite, transfer['fd'], chunk_bytes, offset)
+                    finally:
+                        transfer['writers'] -= 1
+                        if transfer['closed']:
+                            close_files(transfer)
+                    if not transfer['closed']:
+                        await record_chunk(transfer, offset, len(chunk_bytes))
+                    range_bytes[corr_id] = range_bytes.get(corr_id, 0) + len(chunk_bytes)
+                    continue
+                await loop.run_in_executor(None, write_at, transfer['file'], offset, chunk_bytes)
+                if transfer['sha256'] is not None:
+                    if offset == transfer['hashed']:
+                        transfer['sha256'].update(chunk_bytes)
+                        transfer['hashed'] += len(chunk_bytes)
+                    else:
+                        transfer['sha256'] = None
+                await record_chunk(transfer, offset, len(chunk_bytes))
+                if received_bytes(transfer['ranges']) >= transfer['size'] and transfer['expected_sha256']:
+                    await finish_transfer(writer, corr_id)
+            elif msg['type'] == 'range_end':
+                received = range_bytes.pop(msg['corr_id'], 0)
+                ok = received == msg['length']
+                error = f"Range at {msg['offset']}: received {received} of {msg['length']} bytes" if not ok else None
+                await send_msg_async(writer, build_ack(ok, msg['corr_id'], error=error, from_user='receiver'))
+            elif msg['type'] == 'file_end':
+                corr_id = msg['corr_id']
+                if corr_id in ongoing:
+                    ongoing[corr_id]['expected_sha256'] = msg['sha256']
+                    await finish_transfer(writer, corr_id)
     except Exception as e:
         print(f"Client {addr_str} error: {e}")
     finally:
+        for corr_id in started:
+            await release_transfer(corr_id)
         writer.close()
         await writer.wait_closed()
 
@@ -3,51 +3,154 @@ import os
 import hashlib
 import base64
 from common import *
+from chunk_store import chunk_file, CHUNK_LIST_BATCH
 
 MAX_CHUNK_BYTES = 65536
+READ_BLOCK_BYTES = 1_048_576  # disk reads per executor call
+RETRY_DELAY = 2.0  # seconds between reconnect attempts
 
-async def send_file_async(reader, writer, filepath, name, from_user, room):
-    """Send file asynchronously."""
+async def send_chunks_async(writer, f, corr_id, offset, length, binary, from_user, room, sha256=None):
+    """Send length bytes of f starting at offset, reading READ_BLOCK_BYTES per executor call."""
     loop = asyncio.get_event_loop()
-    if not await loop.run_in_executor(None, os.path.exists, filepath):
-        raise FileNotFoundError(f"File not found: {filepath}")
+    await loop.run_in_executor(None, f.seek, offset)
+    end = offset + length
+    while offset < end:
+        # Each block is a fresh bytes object because the transport may keep
+        # references to what it has not written yet
+        block = await loop.run_in_executor(None, f.read, min(READ_BLOCK_BYTES, end - offset))
+        if not block:
+            raise Exception(f"File shrank while sending: no data at offset {offset}")
+        if sha256 is not None:
+            sha256.update(block)
+        view = memoryview(block)
+        for start in range(0, len(block), MAX_CHUNK_BYTES):
+            chunk = view[start:start + MAX_CHUNK_BYTES]
+            if binary:
+                await send_file_chunk_async(writer, corr_id, offset, chunk)
+            else:
+                chunk_b64 = base64.b64encode(chunk).decode('ascii')
+                chunk_msg = build_file_chunk(offset, chunk_b64, from_user, room, corr_id)
+                await send_msg_async(writer, chunk_msg)
+            offset += len(chunk)
 
-    size = await loop.run_in_executor(None, os.path.getsize, filepath)
+async def send_ranges_async(address, filepath, corr_id, pieces, from_user, room):
+    """Send byte ranges in turn over one connection, waiting for the receiver's ACK after each."""
+    loop = asyncio.get_event_loop()
+    reader, writer = await asyncio.open_connection(*address)
+    f = await loop.run_in_executor(None, open, filepath, 'rb')
+    try:
+        for offset, length in pieces:
+            await send_chunks_async(writer, f, corr_id, offset, length, True, from_user, room)
+            await send_msg_async(writer, build_range_end(offset, length, from_user, room, corr_id))
+            ack = await recv_msg_async(reader)
+            if not ack.get('ok', False):
+                raise Exception(f"Range at {offset} failed: {ack.get('error', 'Unknown')}")
+    finally:
+        await loop.run_in_executor(None, f.close)
+        writer.close()
+        await writer.wait_closed()
+
+def hash_file(filepath):
     with open(filepath, 'rb') as f:
-        data = await loop.run_in_executor(None, f.read)
-    sha256 = hashlib.sha256(data).hexdigest()
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+async def send_file_async(reader, writer, filepath, name, from_user, room, streams=1, dedup=False):
+    """Send file asynchronously and return how many bytes went over the wire.
+
+    Reads READ_BLOCK_BYTES at a time in an executor, once and in order, and
+    hashes while sending; the SHA-256 follows the last chunk in a file_end
+    trailer. When the receiver already holds part of the file from an earlier
+    attempt, only the missing ranges are sent and the rest is only hashed.
+    Two paths read more than once: with streams > 1 the ranges are read out
+    of order over parallel connections, one per stream, so an executor hashes
+    the file in a separate sequential pass; and dedup reads the whole file up
+    front to announce its content-defined chunks and hash, then reads the
+    missing ranges again.
+    """
+    loop = asyncio.get_event_loop()
+    if not await loop.run_in_executor(None, os.path.exists, filepath):
+        raise FileNotFoundError(f"File not found: {filepath}")
 
-    meta = build_file_meta(name, size, sha256, from_user, room)
+    stat = await loop.run_in_executor(None, os.stat, filepath)
+    size = stat.st_size
+    chunks, sha256_hex = None, None
+    if dedup:
+        # One pass gives both the chunk list and the file hash
+        chunks, sha256_hex = await loop.run_in_executor(None, chunk_file, filepath)
+    meta = build_file_meta(name, size, sha256_hex, from_user, room, encoding='binary', streams=streams,
+                           resume_key=file_resume_key(name, size, stat.st_mtime_ns),
+                           chunk_count=len(chunks) if dedup else None)
     await send_msg_async(writer, meta)
+    if dedup:
+        for start in range(0, len(chunks), CHUNK_LIST_BATCH):
+            await send_msg_async(writer, build_chunk_list(chunks[start:start + CHUNK_LIST_BATCH], from_user, room,
+                                                          meta['corr_id']))
 
-    # Wait for ACK
+    # Wait for ACK; receivers without binary frame, range or resume support answer without those fields
     ack = await recv_msg_async(reader)
     if not ack.get('ok', False):
         raise Exception(f"Meta not acknowledged: {ack.get('error', 'Unknown')}")
+    binary = ack.get('encoding') == 'binary'
+    streams = ack.get('streams') or 1
+    missing = ack.get('missing')
+    if missing is None:
+        missing = [[0, size]] if size else []
+    sent = sum(length for _, length in missing)
 
-    # Send chunks
-    offset = 0
-    while offset < size:
-        chunk = data[offset:offset + MAX_CHUNK_BYTES]
-        chunk_b64 = base64.b64encode(chunk).decode('ascii')
-        chunk_msg = build_file_chunk(offset, chunk_b64, from_user, room, meta['corr_id'])
-        await send_msg_async(writer, chunk_msg)
-        offset += len(chunk)
+    if streams > 1 and missing:
+        address = writer.get_extra_info('peername')[:2]
+        digest = loop.run_in_executor(None, hash_file, filepath) if sha256_hex is None else None
+        await asyncio.gather(*(send_ranges_async(address, filepath, meta['corr_id'], pieces, from_user, room)
+                               for pieces in split_work(missing, streams, MAX_CHUNK_BYTES)))
+        if digest is not None:
+            sha256_hex = await digest
+    else:
+        # One pass in file order: the bytes the receiver already has are hashed but not sent
+        sha256 = hashlib.sha256() if sha256_hex is None else None
+        position = 0
+        f = await loop.run_in_executor(None, open, filepath, 'rb')
+        try:
+            for offset, length in missing + [[size, 0]]:
+                if sha256 is not None and offset > position:
+                    await loop.run_in_executor(None, hash_range, f, position, offset - position, sha256)
+                await send_chunks_async(writer, f, meta['corr_id'], offset, length, binary, from_user, room, sha256)
+                position = offset + length
+        finally:
+            await loop.run_in_executor(None, f.close)
+        if sha256 is not None:
+            sha256_hex = sha256.hexdigest()
+    await send_msg_async(writer, build_file_end(sha256_hex, from_user, room, meta['corr_id']))
 
     # Wait for final ACK
     final_ack = await recv_msg_async(reader)
     if not final_ack.get('ok', False):
         raise Exception(f"File transfer failed: {final_ack.get('error', 'Unknown')}")
+    return sent
 
-async def main(host='127.0.0.1', port=5050, filepath='', name='sender', room='default'):
-    """Main async file sender."""
-    reader, writer = await asyncio.open_connection(host, port)
+async def main(host='127.0.0.1', port=5050, filepath='', name='sender', room='default', streams=1, retries=0,
+               dedup=False):
+    """Main async file sender; retries resume where the receiver's progress left off."""
     filename = os.path.basename(filepath)
-    print(f"Sending file {filename} to {host}:{port}")
-    await send_file_async(reader, writer, filepath, filename, name, room)
-    print("File sent successfully")
-    writer.close()
-    await writer.wait_closed()
+    for attempt in range(retries + 1):
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            print(f"Sending file {filename} to {host}:{port}")
+            sent = await send_file_async(reader, writer, filepath, filename, name, room, streams, dedup)
+            break
+        except (OSError, asyncio.IncompleteReadError) as e:
+            if attempt == retries:
+                raise
+            print(f"Transfer interrupted ({e}), retrying in {RETRY_DELAY}s")
+            await asyncio.sleep(RETRY_DELAY)
+        finally:
+            if writer is not None:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+    print(f"File sent successfully ({sent} bytes transferred)")
 
 if __name__ == '__main__':
     import argparse
@@ -57,5 +160,8 @@ if __name__ == '__main__':
     parser.add_argument('--path', required=True, help='Path to file to send')
     parser.add_argument('--name', default='sender')
     parser.add_argument('--room', default='default')
+    parser.add_argument('--streams', type=int, default=1, help='Parallel connections for the file data')
+    parser.add_argument('--retries', type=int, default=0, help='Reconnect and resume this many times after a dropped connection')
+    parser.add_argument('--dedup', action='store_true', help='Skip chunks the receiver already holds')
     args = parser.parse_args()
-    asyncio.run(main(args.host, args.port, args.path, args.name, args.room))
\ No newline at end of file
+    asyncio.run(main(args.host, args.port, args.path, args.name, args.room, args.streams, args.retries, args.dedup))
\ No newline at end of file
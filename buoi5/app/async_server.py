@@ -1,6 +1,4 @@
 import asyncio
-import json
-import struct
 import time
 from common import *
 
@@ -16,24 +14,6 @@ async def broadcast(msg, exclude_writer=None):
     if tasks:
         await asyncio.gather(*tasks, return_exceptions=True)
 
-async def send_msg_async(writer, obj):
-    """Send JSON object asynchronously."""
-    payload = json.dumps(obj, ensure_ascii=False).encode('utf-8')
-    if len(payload) > MAX_MESSAGE:
-        raise ValueError(f"Message too large: {len(payload)}")
-    length = struct.pack('>I', len(payload))
-    writer.write(length + payload)
-    await writer.drain()
-
-async def recv_msg_async(reader):
-    """Receive JSON object asynchronously."""
-    length_bytes = await reader.readexactly(4)
-    length = struct.unpack('>I', length_bytes)[0]
-    if length > MAX_MESSAGE:
-        raise ValueError(f"Message too large: {length}")
-    payload = await reader.readexactly(length)
-    return json.loads(payload.decode('utf-8'))
-
 async def heartbeat():
     """Send pings to idle clients and disconnect unresponsive ones."""
     while True:
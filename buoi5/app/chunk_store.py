@@ -0,0 +1,147 @@
+"""Content-defined chunking and the receiver's chunk store for deduplicated transfers.
+
+Chunk boundaries depend only on the CDC_WINDOW bytes just before them, so an
+insertion or deletion in a file moves the boundaries near the edit and leaves
+the rest of the chunks, and their hashes, unchanged. Each window has an 8-bit
+buzhash: every byte maps to a random byte, rotated by its position, and the
+window XORs them together. A window whose buzhash is zero and whose CRC-32
+has the CDC_CONFIRM_MASK bits clear ends a chunk. The buzhash of every window
+in a block is built by doubling the window over one big integer, so it runs at
+C speed; the CRC-32 is only taken where the buzhash is zero.
+
+The store does not copy chunk data: it indexes the chunks of files already in
+the inbox, and every chunk read from it is checked against its hash.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+INDEX_PATH = os.path.join('./inbox', '.chunks.json')
+
+CDC_WINDOW = 64  # a power of two, for the doubling in rolling_hash
+CDC_TABLE = bytes(hashlib.sha256(bytes([i])).digest()[0] for i in range(256))
+CDC_ROTATED = [bytes(((v << r) | (v >> (8 - r))) & 0xff for v in CDC_TABLE) for r in range(8)]
+CDC_CONFIRM_MASK = 0xff  # with the 8-bit buzhash, one window in 2**16 ends a chunk
+CDC_MIN_BYTES = 16384
+CDC_MAX_BYTES = 262144
+READ_BLOCK_BYTES = 1_048_576
+
+# Entries per chunk_list message, which keeps each well under MAX_MESSAGE
+CHUNK_LIST_BATCH = 8192
+
+def rolling_hash(data):
+    """The buzhash of the CDC_WINDOW bytes ending at each position of data, one byte per position.
+
+    Byte i is rotated by i % 8 rather than by its distance from the end of the
+    window, so a window's hash comes out rotated by its end position; that
+    leaves zero hashes, the only ones cdc_chunks looks for, unchanged.
+    """
+    n = len(data)
+    mapped = bytearray(n)
+    for r in range(8):
+        mapped[r::8] = data[r::8].translate(CDC_ROTATED[r])
+    h = int.from_bytes(mapped, 'big')
+    span = 1
+    while span < CDC_WINDOW:
+        h ^= h >> (8 * span)  # fold in the window of span bytes before each one
+        span *= 2
+    return h.to_bytes(n, 'big')
+
+def cdc_chunks(f, file_sha256=None, min_size=CDC_MIN_BYTES, max_size=CDC_MAX_BYTES):
+    """Yield [sha256 hex, length] for the content-defined chunks of a binary file object."""
+    data = bytearray()
+    hashes = bytearray()  # rolling_hash of data
+    tail = b''  # the last CDC_WINDOW - 1 bytes read, which the next block's first windows span
+    pos = 0
+    eof = False
+    while True:
+        while not eof and len(data) - pos < max_size:
+            block = f.read(READ_BLOCK_BYTES)
+            if not block:
+                eof = True
+                break
+            if file_sha256 is not None:
+                file_sha256.update(block)
+            data += block
+            hashes += memoryview(rolling_hash(tail + block))[len(tail):]
+            tail = (tail + block)[-(CDC_WINDOW - 1):]
+        if pos == len(data):
+            return
+        stop = min(len(data), pos + max_size)
+        end = hashes.find(0, pos + max(min_size, CDC_WINDOW) - 1, stop)
+        while end >= 0 and zlib.crc32(data[end - CDC_WINDOW + 1:end + 1]) & CDC_CONFIRM_MASK:
+            end = hashes.find(0, end + 1, stop)
+        end = end + 1 if end >= 0 else stop
+        yield [hashlib.sha256(data[pos:end]).hexdigest(), end - pos]
+        pos = end
+        if pos >= READ_BLOCK_BYTES:
+            del data[:pos]
+            del hashes[:pos]
+            pos = 0
+
+def chunk_file(filepath):
+    """Chunk list and whole-file SHA-256 of a file, read once."""
+    sha256 = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        chunks = list(cdc_chunks(f, sha256))
+    return chunks, sha256.hexdigest()
+
+_lock = threading.Lock()
+_index = None  # inbox file name -> [[sha256, length], ...]
+_lookup = {}  # sha256 -> (inbox file name, offset, length)
+
+def _load_index():
+    global _index
+    if _index is not None:
+        return
+    try:
+        with open(INDEX_PATH, 'r', encoding='utf-8') as f:
+            _index = json.load(f)
+    except (OSError, ValueError):
+        _index = {}
+    _rebuild_lookup()
+
+def _rebuild_lookup():
+    _lookup.clear()
+    for name, chunks in _index.items():
+        offset = 0
+        for sha256, length in chunks:
+            _lookup.setdefault(sha256, (name, offset, length))
+            offset += length
+
+def read_chunk(sha256, length):
+    """Bytes of a chunk held in the inbox, or None when it is unknown or has changed."""
+    with _lock:
+        _load_index()
+        entry = _lookup.get(sha256)
+    if entry is None or entry[2] != length:
+        return None
+    name, offset, _ = entry
+    try:
+        with open(os.path.join(os.path.dirname(INDEX_PATH), name), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+    except OSError:
+        return None
+    if hashlib.sha256(data).hexdigest() != sha256:
+        return None
+    return data
+
+def remember_file(name, chunks):
+    """Index the chunks of a file that has just been stored in the inbox as name."""
+    with _lock:
+        _load_index()
+        _index[name] = chunks
+        _rebuild_lookup()
+        # Another receiver process may share the inbox, so the temp file needs a unique name
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(INDEX_PATH), prefix='.chunks', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(_index, f)
+            os.replace(tmp, INDEX_PATH)
+        except BaseException:
+            os.remove(tmp)
+            raise
\ No newline at end of file
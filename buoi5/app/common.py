@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import json
 import struct
 import socket
@@ -8,6 +10,13 @@ import uuid
 LEN_BYTES = 4
 MAX_MESSAGE = 1_048_576  # 1 MiB
 
+# Binary frames set the top bit of the length prefix; JSON lengths never reach it.
+BINARY_FLAG = 0x80000000
+FRAME_FILE_CHUNK = 0x01
+# Binary file chunk header: frame type, corr_id as 16 UUID bytes, file offset
+CHUNK_HEADER = struct.Struct('>B16sQ')
+MAX_CHUNK_DATA = MAX_MESSAGE - CHUNK_HEADER.size
+
 def send_msg(sock, obj):
     """Send a JSON object over the socket with length prefix."""
     payload = json.dumps(obj, ensure_ascii=False).encode('utf-8')
@@ -32,6 +41,209 @@ def recv_msg(sock):
         payload += chunk
     return json.loads(payload.decode('utf-8'))
 
+def recv_exact_into(sock, view):
+    """Fill a memoryview from the socket, raising if the peer closes early."""
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("Incomplete payload")
+        received += n
+
+def pack_chunk_header(corr_id, offset, data_len):
+    """Length prefix plus binary chunk header for data_len bytes of file data."""
+    if data_len > MAX_CHUNK_DATA:
+        raise ValueError(f"Chunk too large: {data_len} > {MAX_CHUNK_DATA}")
+    length = struct.pack('>I', BINARY_FLAG | (CHUNK_HEADER.size + data_len))
+    return length + CHUNK_HEADER.pack(FRAME_FILE_CHUNK, uuid.UUID(corr_id).bytes, offset)
+
+def parse_chunk_header(header, data_len):
+    """Turn a binary chunk header into a file_chunk message without the data."""
+    frame_type, corr_id, offset = CHUNK_HEADER.unpack(header)
+    if frame_type != FRAME_FILE_CHUNK:
+        raise ValueError(f"Unknown binary frame type: {frame_type}")
+    return {
+        'type': 'file_chunk',
+        'corr_id': str(uuid.UUID(bytes=corr_id)),
+        'offset': offset,
+        'size': data_len
+    }
+
+def split_ranges(size, streams, align=65536):
+    """Split size bytes into at most streams (offset, length) ranges on align boundaries."""
+    blocks = -(-size // align)
+    streams = max(1, min(streams, blocks))
+    ranges = []
+    offset = 0
+    for i in range(streams):
+        end = min(size, (blocks * (i + 1) // streams) * align)
+        if end > offset:
+            ranges.append((offset, end - offset))
+        offset = end
+    return ranges
+
+def split_missing(missing, streams, align=65536):
+    """Split [offset, length] ranges into about streams (offset, length) pieces."""
+    total = sum(length for _, length in missing)
+    pieces = []
+    for offset, length in missing:
+        share = max(1, round(streams * length / total))
+        pieces += [(offset + start, part) for start, part in split_ranges(length, share, align)]
+    return pieces
+
+def split_work(missing, streams, align=65536):
+    """Deal the pieces of split_missing into at most streams lists, in file order, of similar byte counts."""
+    pieces = split_missing(missing, streams, align)
+    total = sum(length for _, length in pieces)
+    work = [[] for _ in range(max(1, min(streams, len(pieces))))]
+    done = 0
+    for offset, length in pieces:
+        work[min(len(work) - 1, (done + length // 2) * len(work) // total)].append((offset, length))
+        done += length
+    return [pieces for pieces in work if pieces]
+
+def file_resume_key(name, size, mtime_ns):
+    """Id of one version of a file, so a retried transfer finds the receiver's progress."""
+    return hashlib.sha256(f"{name}\0{size}\0{mtime_ns}".encode('utf-8')).hexdigest()[:32]
+
+def sendall_vectored(sock, buffers):
+    """Send buffers back to back, gathered into sendmsg calls where supported, without joining them."""
+    if not hasattr(sock, 'sendmsg'):  # Windows
+        for data in buffers:
+            sock.sendall(data)
+        return
+    pending = [memoryview(data) for data in buffers if len(data)]
+    while pending:
+        sent = sock.sendmsg(pending)
+        while sent:
+            if sent >= len(pending[0]):
+                sent -= len(pending.pop(0))
+            else:
+                pending[0] = pending[0][sent:]
+                sent = 0
+
+def send_file_chunk(sock, corr_id, offset, data):
+    """Send raw file bytes as a binary chunk frame."""
+    sendall_vectored(sock, [pack_chunk_header(corr_id, offset, len(data)), data])
+
+def hash_range(f, offset, length, sha256, block_size=1_048_576):
+    """Feed length bytes of f starting at offset into sha256 through one reusable buffer."""
+    buf = bytearray(min(block_size, length))
+    view = memoryview(buf)
+    f.seek(offset)
+    while length > 0:
+        n = f.readinto(view[:min(len(buf), length)])
+        if not n:
+            raise Exception(f"File shrank while hashing: no data at offset {offset}")
+        sha256.update(view[:n])
+        offset += n
+        length -= n
+
+def recv_frame(sock, buf=None):
+    """Receive a JSON message or a binary file chunk.
+
+    Binary chunks come back as a file_chunk message whose 'data' is a memoryview
+    of buf, which is filled in place so the caller can reuse one buffer per
+    connection. buf must hold MAX_CHUNK_DATA bytes; one is allocated if omitted.
+    """
+    length_bytes = bytearray(LEN_BYTES)
+    recv_exact_into(sock, memoryview(length_bytes))
+    length = struct.unpack('>I', length_bytes)[0]
+    if not length & BINARY_FLAG:
+        if length > MAX_MESSAGE:
+            raise ValueError(f"Message too large: {length} > {MAX_MESSAGE}")
+        payload = bytearray(length)
+        recv_exact_into(sock, memoryview(payload))
+        return json.loads(payload.decode('utf-8'))
+    length &= ~BINARY_FLAG
+    if length < CHUNK_HEADER.size or length > MAX_MESSAGE:
+        raise ValueError(f"Invalid binary frame length: {length}")
+    header = bytearray(CHUNK_HEADER.size)
+    recv_exact_into(sock, memoryview(header))
+    msg = parse_chunk_header(header, length - CHUNK_HEADER.size)
+    if buf is None:
+        buf = bytearray(MAX_CHUNK_DATA)
+    data = memoryview(buf)[:msg['size']]
+    recv_exact_into(sock, data)
+    msg['data'] = data
+    return msg
+
+async def send_msg_async(writer, obj):
+    """Send JSON object asynchronously."""
+    payload = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    if len(payload) > MAX_MESSAGE:
+        raise ValueError(f"Message too large: {len(payload)}")
+    length = struct.pack('>I', len(payload))
+    writer.write(length + payload)
+    await writer.drain()
+
+async def recv_msg_async(reader):
+    """Receive JSON object asynchronously."""
+    length_bytes = await reader.readexactly(4)
+    length = struct.unpack('>I', length_bytes)[0]
+    if length > MAX_MESSAGE:
+        raise ValueError(f"Message too large: {length}")
+    payload = await reader.readexactly(length)
+    return json.loads(payload.decode('utf-8'))
+
+async def send_file_chunk_async(writer, corr_id, offset, data):
+    """Send raw file bytes as a binary chunk frame asynchronously."""
+    writer.write(pack_chunk_header(corr_id, offset, len(data)))
+    writer.write(data)
+    await writer.drain()
+
+async def readexactly_into(reader, view):
+    """Fill view from a StreamReader, copying out of the reader's own buffer.
+
+    Works like reader.readexactly(len(view)) without allocating a new bytes
+    object per call. Readers without that buffer fall back to readexactly.
+    """
+    buffer = getattr(reader, '_buffer', None)
+    if not isinstance(buffer, bytearray):
+        view[:] = await reader.readexactly(len(view))
+        return
+    filled = 0
+    while filled < len(view):
+        if reader.exception() is not None:
+            raise reader.exception()
+        if not buffer:
+            if reader.at_eof():
+                raise asyncio.IncompleteReadError(bytes(view[:filled]), len(view))
+            await reader._wait_for_data('readexactly_into')
+            continue
+        n = min(len(buffer), len(view) - filled)
+        with memoryview(buffer) as source:
+            view[filled:filled + n] = source[:n]
+        del buffer[:n]
+        reader._maybe_resume_transport()
+        filled += n
+
+async def recv_frame_async(reader, buf=None):
+    """Receive a JSON message or a binary file chunk.
+
+    Like recv_frame, binary chunks come back with 'data' as a memoryview of
+    buf, filled in place so one buffer serves a whole connection. buf must
+    hold MAX_CHUNK_DATA bytes; one is allocated if omitted.
+    """
+    length_bytes = await reader.readexactly(LEN_BYTES)
+    length = struct.unpack('>I', length_bytes)[0]
+    if not length & BINARY_FLAG:
+        if length > MAX_MESSAGE:
+            raise ValueError(f"Message too large: {length}")
+        payload = await reader.readexactly(length)
+        return json.loads(payload.decode('utf-8'))
+    length &= ~BINARY_FLAG
+    if length < CHUNK_HEADER.size or length > MAX_MESSAGE:
+        raise ValueError(f"Invalid binary frame length: {length}")
+    header = await reader.readexactly(CHUNK_HEADER.size)
+    msg = parse_chunk_header(header, length - CHUNK_HEADER.size)
+    if buf is None:
+        buf = bytearray(MAX_CHUNK_DATA)
+    data = memoryview(buf)[:msg['size']]
+    await readexactly_into(reader, data)
+    msg['data'] = data
+    return msg
+
 # Protocol helpers
 def build_chat(text, from_user, room='default', corr_id=None):
     return {
@@ -43,7 +255,12 @@ def build_chat(text, from_user, room='default', corr_id=None):
         'text': text
     }
 
-def build_file_meta(name, size, sha256, from_user, room='default', corr_id=None):
+def build_file_meta(name, size, sha256, from_user, room='default', corr_id=None, encoding='base64', streams=1,
+                    resume_key=None, chunk_count=None):
+    # encoding 'binary' asks the receiver for binary chunk frames and streams > 1 for
+    # parallel range connections; its ack says what it accepted. A receiver holding
+    # part of the file under resume_key, or in its chunk store when chunk_count
+    # chunk_list entries follow, acks with the ranges still missing.
     return {
         'type': 'file_meta',
         'ts': time.time(),
@@ -52,7 +269,11 @@ def build_file_meta(name, size, sha256, from_user, room='default', corr_id=None)
         'corr_id': corr_id or str(uuid.uuid4()),
         'name': name,
         'size': size,
-        'sha256': sha256
+        'sha256': sha256,
+        'encoding': encoding,
+        'streams': streams,
+        'resume_key': resume_key,
+        'chunk_count': chunk_count
     }
 
 def build_file_chunk(offset, bytes_b64, from_user, room='default', corr_id=None):
@@ -66,7 +287,42 @@ def build_file_chunk(offset, bytes_b64, from_user, room='default', corr_id=None)
         'bytes_b64': bytes_b64
     }
 
-def build_ack(ok, corr_id, error=None, from_user=None, room='default'):
+def build_chunk_list(chunks, from_user, room='default', corr_id=None):
+    # [sha256, length] of consecutive content-defined chunks, following a file_meta
+    return {
+        'type': 'chunk_list',
+        'ts': time.time(),
+        'from': from_user,
+        'room': room,
+        'corr_id': corr_id,
+        'chunks': chunks
+    }
+
+def build_file_end(sha256, from_user, room='default', corr_id=None):
+    # Trailer sent after the last chunk when file_meta went out without a sha256
+    return {
+        'type': 'file_end',
+        'ts': time.time(),
+        'from': from_user,
+        'room': room,
+        'corr_id': corr_id,
+        'sha256': sha256
+    }
+
+def build_range_end(offset, length, from_user, room='default', corr_id=None):
+    # Sent on a range connection after its last chunk; the receiver acks it
+    return {
+        'type': 'range_end',
+        'ts': time.time(),
+        'from': from_user,
+        'room': room,
+        'corr_id': corr_id,
+        'offset': offset,
+        'length': length
+    }
+
+def build_ack(ok, corr_id, error=None, from_user=None, room='default', encoding=None, streams=None,
+              missing=None, resume_offset=None):
     return {
         'type': 'ack',
         'ts': time.time(),
@@ -74,7 +330,11 @@ def build_ack(ok, corr_id, error=None, from_user=None, room='default'):
         'room': room,
         'corr_id': corr_id,
         'ok': ok,
-        'error': error
+        'error': error,
+        'encoding': encoding,
+        'streams': streams,
+        'missing': missing,
+        'resume_offset': resume_offset
     }
 
 def build_ping(from_user, room='default'):
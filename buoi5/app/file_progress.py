@@ -0,0 +1,103 @@
+"""Persistent progress for resumable file transfers.
+
+A transfer writes into PARTIAL_DIR/<key>.part and records the byte ranges it
+has written in PARTIAL_DIR/<key>.json, so a sender that reconnects with the
+same resume key only has to send what is missing. The part file is moved into
+the inbox once its SHA-256 has been verified.
+"""
+import json
+import os
+import re
+import tempfile
+
+INBOX_DIR = './inbox'
+PARTIAL_DIR = os.path.join(INBOX_DIR, '.partial')
+KEY_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+def add_range(ranges, offset, length):
+    """Merge [offset, offset + length) into a sorted list of [start, end) ranges in place."""
+    start, end = offset, offset + length
+    merged = []
+    placed = False
+    for s, e in ranges:
+        if e < start:
+            merged.append([s, e])
+        elif s > end:
+            if not placed:
+                merged.append([start, end])
+                placed = True
+            merged.append([s, e])
+        else:
+            start, end = min(s, start), max(e, end)
+    if not placed:
+        merged.append([start, end])
+    ranges[:] = merged
+
+def covers(ranges, offset, length):
+    """True when [offset, offset + length) lies inside one of the ranges."""
+    return any(start <= offset and offset + length <= end for start, end in ranges)
+
+def received_bytes(ranges):
+    return sum(end - start for start, end in ranges)
+
+def missing_ranges(ranges, size):
+    """[offset, length] pairs of [0, size) that ranges do not cover."""
+    missing = []
+    offset = 0
+    for start, end in ranges:
+        if start > offset:
+            missing.append([offset, start - offset])
+        offset = max(offset, end)
+    if offset < size:
+        missing.append([offset, size - offset])
+    return missing
+
+def limit_ranges(missing, limit):
+    """Merge the closest [offset, length] neighbours until at most limit ranges remain."""
+    gap = 65536
+    while len(missing) > limit:
+        merged = [list(missing[0])]
+        for offset, length in missing[1:]:
+            last = merged[-1]
+            if offset - (last[0] + last[1]) <= gap:
+                last[1] = offset + length - last[0]
+            else:
+                merged.append([offset, length])
+        missing = merged
+        gap *= 2
+    return missing
+
+def part_path(key):
+    return os.path.join(PARTIAL_DIR, key + '.part')
+
+def index_path(key):
+    return os.path.join(PARTIAL_DIR, key + '.json')
+
+def load_progress(key, name, size):
+    """Ranges already written for key, or None when there is nothing to resume."""
+    try:
+        with open(index_path(key), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('name') != name or index.get('size') != size or not os.path.exists(part_path(key)):
+        return None
+    return [[start, end] for start, end in index.get('ranges', []) if 0 <= start < end <= size]
+
+def save_progress(key, name, size, ranges):
+    """Atomically replace the index for key; the data it lists must already be written."""
+    fd, tmp = tempfile.mkstemp(dir=PARTIAL_DIR, prefix=key, suffix='.tmp')  # saves may overlap
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'name': name, 'size': size, 'ranges': ranges}, f)
+        os.replace(tmp, index_path(key))
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def discard_progress(key):
+    for path in (part_path(key), index_path(key)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
\ No newline at end of file
@@ -32,6 +32,7 @@ Examples:
   python main.py async-server --port 5050
   python main.py async-client --host 127.0.0.1 --port 5050 --name bob
   python main.py sync-file-send --path ./file.txt --host 127.0.0.1 --port 5050
+  python main.py async-file-send --path ./big.iso --streams 4 --port 5050
   python main.py sync-file-recv --port 5050
         """
     )
@@ -57,6 +58,9 @@ Examples:
     sync_file_send_parser.add_argument('--port', type=int, default=5050, help='Receiver port')
     sync_file_send_parser.add_argument('--name', default='sender', help='Sender name')
     sync_file_send_parser.add_argument('--room', default='default', help='Room')
+    sync_file_send_parser.add_argument('--streams', type=int, default=1, help='Parallel connections for the file data')
+    sync_file_send_parser.add_argument('--retries', type=int, default=0, help='Reconnect and resume this many times after a dropped connection')
+    sync_file_send_parser.add_argument('--dedup', action='store_true', help='Skip chunks the receiver already holds')
 
     # Sync File Receiver
     sync_file_recv_parser = subparsers.add_parser('sync-file-recv', help='Receive files synchronously')
@@ -82,6 +86,9 @@ Examples:
     async_file_send_parser.add_argument('--port', type=int, default=5050, help='Receiver port')
     async_file_send_parser.add_argument('--name', default='sender', help='Sender name')
     async_file_send_parser.add_argument('--room', default='default', help='Room')
+    async_file_send_parser.add_argument('--streams', type=int, default=1, help='Parallel connections for the file data')
+    async_file_send_parser.add_argument('--retries', type=int, default=0, help='Reconnect and resume this many times after a dropped connection')
+    async_file_send_parser.add_argument('--dedup', action='store_true', help='Skip chunks the receiver already holds')
 
     # Async File Receiver
     async_file_recv_parser = subparsers.add_parser('async-file-recv', help='Receive files asynchronously')
@@ -100,7 +107,8 @@ Examples:
     elif args.command == 'sync-client':
         sync_client_main(args.host, args.port, args.name, args.room)
     elif args.command == 'sync-file-send':
-        sync_file_sender_main(args.host, args.port, args.path, args.name, args.room)
+        sync_file_sender_main(args.host, args.port, args.path, args.name, args.room, args.streams, args.retries,
+                              args.dedup)
     elif args.command == 'sync-file-recv':
         sync_file_receiver_main(args.host, args.port)
     elif args.command == 'async-server':
@@ -111,7 +119,8 @@ Examples:
         asyncio.run(async_client_main(args.host, args.port, args.name, args.room))
     elif args.command == 'async-file-send':
         import asyncio
-        asyncio.run(async_file_sender_main(args.host, args.port, args.path, args.name, args.room))
+        asyncio.run(async_file_sender_main(args.host, args.port, args.path, args.name, args.room, args.streams, args.retries,
+                              args.dedup))
     elif args.command == 'async-file-recv':
         import asyncio
         asyncio.run(async_file_receiver_main(args.host, args.port))
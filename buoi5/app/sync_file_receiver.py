@@ -3,55 +3,251 @@ import threading
 import os
 import hashlib
 import base64
+import uuid
 from common import *
+from file_progress import *
+from chunk_store import *
 
 MAX_CHUNK_BYTES = 65536
+MAX_STREAMS = 16  # most parallel range connections accepted per transfer
+SAVE_EVERY_BYTES = 8 * 1_048_576  # persist the progress index at least this often
+MAX_MISSING_RANGES = 16384  # keeps the file_meta ACK under MAX_MESSAGE
 
-# Global for ongoing transfers (simplified for one file)
+# Ongoing transfers: corr_id -> {'key': str, 'name': str, 'path': str, 'size': int, 'ranges': list,
+#     'unsaved': int, 'sha256': hashlib or None, 'hashed': int, 'expected_sha256': str or None,
+#     'ranged': bool, 'fd': int or 'file': file_obj, 'writers': int, 'closed': bool,
+#     'chunks': list or None}
 ongoing = {}
 lock = threading.Lock()
 
+def open_ranged(filepath, size, truncate=True):
+    """Open a preallocated file for os.pwrite from several connections."""
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0) | (os.O_TRUNC if truncate else 0)
+    fd = os.open(filepath, flags, 0o644)
+    try:
+        if size and hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    except OSError:
+        os.ftruncate(fd, size)  # e.g. filesystems without fallocate support
+    return fd
+
+def write_at(f, offset, data):
+    if f.tell() != offset:
+        f.seek(offset)
+    f.write(data)
+
+def reuse_chunks(transfer, chunks):
+    """Copy the chunks the store already holds into the part file and return the bytes reused."""
+    reused = 0
+    offset = 0
+    for sha256, length in chunks:
+        if not covers(transfer['ranges'], offset, length):
+            data = read_chunk(sha256, length)
+            if data is not None:
+                if transfer['ranged']:
+                    os.pwrite(transfer['fd'], data, offset)
+                else:
+                    write_at(transfer['file'], offset, data)
+                add_range(transfer['ranges'], offset, length)
+                reused += length
+        offset += length
+    return reused
+
+def recv_chunk_list(sock, buf, meta):
+    """Collect the chunk_list messages that follow a deduplicated file_meta."""
+    chunks = []
+    while len(chunks) < meta['chunk_count']:
+        msg = recv_frame(sock, buf)
+        if msg['type'] != 'chunk_list' or msg['corr_id'] != meta['corr_id']:
+            raise ValueError(f"Expected chunk_list for {meta['corr_id']}, got {msg['type']}")
+        chunks += msg['chunks']
+    return chunks
+
+def start_transfer(msg, chunks=None):
+    """Open or resume the transfer a file_meta describes and build its ACK."""
+    filename = msg['name']
+    size = msg['size']
+    if chunks is not None and sum(length for _, length in chunks) != size:
+        return build_ack(False, msg['corr_id'], error='Chunk list does not add up to the file size',
+                         from_user='receiver')
+    key = msg.get('resume_key')
+    if not key or not KEY_PATTERN.fullmatch(key):
+        key = uuid.uuid4().hex  # older senders cannot resume
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+    with lock:
+        stale = [corr_id for corr_id, transfer in ongoing.items() if transfer['key'] == key]
+    for corr_id in stale:
+        # The sender reconnected before we noticed its old connection drop
+        release_transfer(corr_id)
+    ranges = load_progress(key, filename, size)
+    resume = ranges is not None
+    encoding = 'binary' if msg.get('encoding') == 'binary' else None
+    streams = min(msg.get('streams') or 1, MAX_STREAMS)
+    ranged = streams > 1 and encoding == 'binary' and hasattr(os, 'pwrite')
+    transfer = {
+        'key': key,
+        'name': filename,
+        'path': os.path.join(INBOX_DIR, filename),
+        'size': size,
+        'ranges': ranges or [],
+        'unsaved': 0,
+        # Hashed as it arrives only while bytes come in order from offset 0;
+        # otherwise the finished file is hashed in one pass
+        'sha256': None if resume or ranged else hashlib.sha256(),
+        'hashed': 0,
+        # None when the sender streams the file and sends the hash in file_end
+        'expected_sha256': msg['sha256'],
+        'ranged': ranged,
+        'writers': 0,
+        'closed': False
+    }
+    if ranged:
+        transfer['fd'] = open_ranged(part_path(key), size, truncate=not resume)
+    else:
+        transfer['file'] = open(part_path(key), 'r+b' if resume else 'wb')
+    if chunks is not None:
+        transfer['chunks'] = chunks
+        if reuse_chunks(transfer, chunks):
+            transfer['sha256'] = None
+    save_progress(key, filename, size, transfer['ranges'])
+    with lock:
+        ongoing[msg['corr_id']] = transfer
+    missing = limit_ranges(missing_ranges(transfer['ranges'], size), MAX_MISSING_RANGES)
+    return build_ack(True, msg['corr_id'], from_user='receiver', encoding=encoding,
+                     streams=streams if ranged else None, missing=missing,
+                     resume_offset=missing[0][0] if missing else size)
+
+def record_chunk(transfer, offset, length):
+    """Add written bytes to the index, saving it every SAVE_EVERY_BYTES. Call with lock held."""
+    add_range(transfer['ranges'], offset, length)
+    transfer['unsaved'] += length
+    if transfer['unsaved'] >= SAVE_EVERY_BYTES:
+        if not transfer['ranged']:
+            transfer['file'].flush()
+        save_progress(transfer['key'], transfer['name'], transfer['size'], transfer['ranges'])
+        transfer['unsaved'] = 0
+
+def close_files(transfer):
+    """Mark a transfer closed and close its file once no pwrite is in flight. Call with lock held."""
+    transfer['closed'] = True
+    if transfer['writers']:
+        return
+    if not transfer['ranged']:
+        transfer['file'].close()
+    elif transfer['fd'] is not None:
+        os.close(transfer['fd'])
+        transfer['fd'] = None
+
+def release_transfer(corr_id):
+    """Close an unfinished transfer, keeping its progress for a later resume."""
+    with lock:
+        transfer = ongoing.pop(corr_id, None)
+        if transfer is None:
+            return
+        close_files(transfer)
+        save_progress(transfer['key'], transfer['name'], transfer['size'], transfer['ranges'])
+
+def finish_transfer(sock, corr_id):
+    """Close a completed transfer, move it into the inbox and ACK whether its SHA-256 matched."""
+    with lock:
+        transfer = ongoing.pop(corr_id, None)
+        if transfer is None:
+            return
+        close_files(transfer)
+    key = transfer['key']
+    received = received_bytes(transfer['ranges'])
+    if received != transfer['size']:
+        save_progress(key, transfer['name'], transfer['size'], transfer['ranges'])
+        ok, error = False, f"Size mismatch: {received} != {transfer['size']}"
+    else:
+        if transfer['sha256'] is None:
+            with open(part_path(key), 'rb') as f:
+                transfer['sha256'] = hashlib.file_digest(f, 'sha256')
+        ok = transfer['sha256'].hexdigest() == transfer['expected_sha256']
+        error = 'Checksum mismatch' if not ok else None
+        if ok:
+            os.replace(part_path(key), transfer['path'])
+            if transfer.get('chunks'):
+                remember_file(transfer['name'], transfer['chunks'])
+        discard_progress(key)  # a corrupt file is not worth resuming
+    ack = build_ack(ok, corr_id, error=error, from_user='receiver')
+    send_msg(sock, ack)
+
 def handle_client(sock, addr):
     """Handle file transfer client."""
     client_id = f"{addr[0]}:{addr[1]}"
     print(f"File receiver client connected: {client_id}")
+    buf = bytearray(MAX_CHUNK_DATA)  # binary chunks are read straight into this
+    range_bytes = {}  # corr_id -> bytes of a ranged transfer received on this connection
+    started = set()  # corr_ids of transfers whose file_meta came on this connection
     try:
         while True:
-            msg = recv_msg(sock)
+            msg = recv_frame(sock, buf)
             if msg['type'] == 'file_meta':
-                filename = msg['name']
-                size = msg['size']
-                sha256_expected = msg['sha256']
-                filepath = os.path.join('./inbox', filename)
-                os.makedirs('./inbox', exist_ok=True)
-                with lock:
-                    ongoing[msg['corr_id']] = {
-                        'file': open(filepath, 'wb'),
-                        'size': size,
-                        'sha256': hashlib.sha256(),
-                        'received': 0
-                    }
-                ack = build_ack(True, msg['corr_id'], from_user='receiver')
-                send_msg(sock, ack)
+                started.add(msg['corr_id'])
+                chunks = recv_chunk_list(sock, buf, msg) if msg.get('chunk_count') else None
+                send_msg(sock, start_transfer(msg, chunks))
             elif msg['type'] == 'file_chunk':
+                corr_id = msg['corr_id']
+                if 'data' in msg:
+                    chunk_bytes = msg['data']
+                else:
+                    chunk_bytes = base64.b64decode(msg['bytes_b64'])
+                offset = msg['offset']
+                with lock:
+                    transfer = ongoing.get(corr_id)
+                    if transfer is None:
+                        continue
+                    if offset + len(chunk_bytes) > transfer['size']:
+                        raise ValueError(f"Chunk at {offset} runs past the end of {transfer['name']}")
+                    if transfer['ranged']:
+                        transfer['writers'] += 1
+                if transfer['ranged']:
+                    # Ranges cover disjoint offsets, so writes need no lock
+                    written = False
+                    try:
+                        os.pwrite(transfer['fd'], chunk_bytes, offset)
+                        written = True
+                    finally:
+                        with lock:
+                            transfer['writers'] -= 1
+                            if transfer['closed']:
+                                close_files(transfer)
+                            elif written:
+                                record_chunk(transfer, offset, len(chunk_bytes))
+                    range_bytes[corr_id] = range_bytes.get(corr_id, 0) + len(chunk_bytes)
+                    continue
+                with lock:
+                    write_at(transfer['file'], offset, chunk_bytes)
+                    if transfer['sha256'] is not None:
+                        if offset == transfer['hashed']:
+                            transfer['sha256'].update(chunk_bytes)
+                            transfer['hashed'] += len(chunk_bytes)
+                        else:
+                            transfer['sha256'] = None
+                    record_chunk(transfer, offset, len(chunk_bytes))
+                    done = received_bytes(transfer['ranges']) >= transfer['size'] and transfer['expected_sha256']
+                if done:
+                    finish_transfer(sock, corr_id)
+            elif msg['type'] == 'range_end':
+                received = range_bytes.pop(msg['corr_id'], 0)
+                ok = received == msg['length']
+                error = f"Range at {msg['offset']}: received {received} of {msg['length']} bytes" if not ok else None
+                send_msg(sock, build_ack(ok, msg['corr_id'], error=error, from_user='receiver'))
+            elif msg['type'] == 'file_end':
                 corr_id = msg['corr_id']
                 with lock:
-                    if corr_id in ongoing:
-                        transfer = ongoing[corr_id]
-                        chunk_bytes = base64.b64decode(msg['bytes_b64'])
-                        transfer['file'].write(chunk_bytes)
-                        transfer['sha256'].update(chunk_bytes)
-                        transfer['received'] += len(chunk_bytes)
-                        if transfer['received'] >= transfer['size']:
-                            transfer['file'].close()
-                            sha256_actual = transfer['sha256'].hexdigest()
-                            ok = sha256_actual == msg.get('sha256', '')  # Note: sha256 should be in meta, but for simplicity
-                            ack = build_ack(ok, corr_id, error='Checksum mismatch' if not ok else None, from_user='receiver')
-                            send_msg(sock, ack)
-                            del ongoing[corr_id]
+                    transfer = ongoing.get(corr_id)
+                if transfer is not None:
+                    transfer['expected_sha256'] = msg['sha256']
+                    finish_transfer(sock, corr_id)
     except Exception as e:
         print(f"Client {client_id} error: {e}")
     finally:
+        for corr_id in started:
+            release_transfer(corr_id)
         sock.close()
 
 def main(host='0.0.0.0', port=5050):
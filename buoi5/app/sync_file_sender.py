@@ -2,56 +2,138 @@ import socket
 import os
 import hashlib
 import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
 from common import *
+from chunk_store import chunk_file, CHUNK_LIST_BATCH
 
 MAX_CHUNK_BYTES = 65536
+RETRY_DELAY = 2.0  # seconds between reconnect attempts
 
-def send_file(sock, filepath, name, from_user, room):
-    """Send a file over the socket."""
-    if not os.path.exists(filepath):
-        raise FileNotFoundError(f"File not found: {filepath}")
+def send_chunks(sock, f, corr_id, offset, length, binary, from_user, room, sha256=None):
+    """Send length bytes of f starting at offset through one reusable buffer."""
+    buf = bytearray(MAX_CHUNK_BYTES)
+    view = memoryview(buf)
+    f.seek(offset)
+    end = offset + length
+    while offset < end:
+        n = f.readinto(view[:min(MAX_CHUNK_BYTES, end - offset)])
+        if not n:
+            raise Exception(f"File shrank while sending: no data at offset {offset}")
+        chunk = view[:n]
+        if sha256 is not None:
+            sha256.update(chunk)
+        if binary:
+            send_file_chunk(sock, corr_id, offset, chunk)
+        else:
+            chunk_b64 = base64.b64encode(chunk).decode('ascii')
+            chunk_msg = build_file_chunk(offset, chunk_b64, from_user, room, corr_id)
+            send_msg(sock, chunk_msg)
+        offset += n
+
+def send_ranges(address, filepath, corr_id, pieces, from_user, room):
+    """Send byte ranges in turn over one connection, waiting for the receiver's ACK after each."""
+    with socket.create_connection(address) as sock, open(filepath, 'rb') as f:
+        for offset, length in pieces:
+            send_chunks(sock, f, corr_id, offset, length, True, from_user, room)
+            send_msg(sock, build_range_end(offset, length, from_user, room, corr_id))
+            ack = recv_msg(sock)
+            if not ack.get('ok', False):
+                raise Exception(f"Range at {offset} failed: {ack.get('error', 'Unknown error')}")
 
-    size = os.path.getsize(filepath)
-    sha256 = hashlib.sha256()
+def hash_file(filepath):
     with open(filepath, 'rb') as f:
-        data = f.read()
-        sha256.update(data)
-    sha256_hex = sha256.hexdigest()
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+def send_file(sock, filepath, name, from_user, room, streams=1, dedup=False):
+    """Send a file over the socket and return how many bytes went over the wire.
 
-    meta = build_file_meta(name, size, sha256_hex, from_user, room)
+    The file is read once, in order, through a fixed-size buffer and hashed
+    as it goes; the SHA-256 follows the last chunk in a file_end trailer.
+    When the receiver already holds part of the file from an earlier attempt,
+    only the missing ranges are sent and the rest is only hashed. Two paths
+    read more than once: with streams > 1 the ranges are read out of order
+    over parallel connections, one per stream, so a separate sequential pass
+    hashes the file; and dedup reads the whole file up front to announce its
+    content-defined chunks and hash, then reads the missing ranges again.
+    """
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"File not found: {filepath}")
+
+    stat = os.stat(filepath)
+    size = stat.st_size
+    chunks, sha256_hex = None, None
+    if dedup:
+        # One pass gives both the chunk list and the file hash
+        chunks, sha256_hex = chunk_file(filepath)
+    meta = build_file_meta(name, size, sha256_hex, from_user, room, encoding='binary', streams=streams,
+                           resume_key=file_resume_key(name, size, stat.st_mtime_ns),
+                           chunk_count=len(chunks) if dedup else None)
     send_msg(sock, meta)
+    if dedup:
+        for start in range(0, len(chunks), CHUNK_LIST_BATCH):
+            send_msg(sock, build_chunk_list(chunks[start:start + CHUNK_LIST_BATCH], from_user, room, meta['corr_id']))
 
-    # Wait for ACK
+    # Wait for ACK; receivers without binary frame, range or resume support answer without those fields
     ack = recv_msg(sock)
     if not ack.get('ok', False):
         raise Exception(f"Meta not acknowledged: {ack.get('error', 'Unknown error')}")
+    binary = ack.get('encoding') == 'binary'
+    streams = ack.get('streams') or 1
+    missing = ack.get('missing')
+    if missing is None:
+        missing = [[0, size]] if size else []
+    sent = sum(length for _, length in missing)
 
-    # Send chunks
-    with open(filepath, 'rb') as f:
-        offset = 0
-        while offset < size:
-            chunk = f.read(MAX_CHUNK_BYTES)
-            if not chunk:
-                break
-            chunk_b64 = base64.b64encode(chunk).decode('ascii')
-            chunk_msg = build_file_chunk(offset, chunk_b64, from_user, room, meta['corr_id'])
-            send_msg(sock, chunk_msg)
-            offset += len(chunk)
+    if streams > 1 and missing:
+        work = split_work(missing, streams, MAX_CHUNK_BYTES)
+        address = sock.getpeername()[:2]
+        with ThreadPoolExecutor(max_workers=streams + 1) as pool:
+            digest = pool.submit(hash_file, filepath) if sha256_hex is None else None
+            sends = [pool.submit(send_ranges, address, filepath, meta['corr_id'], pieces, from_user, room)
+                     for pieces in work]
+            for future in sends:
+                future.result()
+            if digest is not None:
+                sha256_hex = digest.result()
+    else:
+        # One pass in file order: the bytes the receiver already has are hashed but not sent
+        sha256 = hashlib.sha256() if sha256_hex is None else None
+        position = 0
+        with open(filepath, 'rb') as f:
+            for offset, length in missing + [[size, 0]]:
+                if sha256 is not None and offset > position:
+                    hash_range(f, position, offset - position, sha256)
+                send_chunks(sock, f, meta['corr_id'], offset, length, binary, from_user, room, sha256)
+                position = offset + length
+        if sha256 is not None:
+            sha256_hex = sha256.hexdigest()
+    send_msg(sock, build_file_end(sha256_hex, from_user, room, meta['corr_id']))
 
     # Wait for final ACK
     final_ack = recv_msg(sock)
     if not final_ack.get('ok', False):
         raise Exception(f"File transfer failed: {final_ack.get('error', 'Unknown error')}")
+    return sent
 
-def main(host='127.0.0.1', port=5050, filepath='', name='sender', room='default'):
-    """Main sender function."""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect((host, port))
+def main(host='127.0.0.1', port=5050, filepath='', name='sender', room='default', streams=1, retries=0, dedup=False):
+    """Main sender function; retries resume where the receiver's progress left off."""
     filename = os.path.basename(filepath)
-    print(f"Sending file {filename} to {host}:{port}")
-    send_file(sock, filepath, filename, name, room)
-    print("File sent successfully")
-    sock.close()
+    for attempt in range(retries + 1):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect((host, port))
+            print(f"Sending file {filename} to {host}:{port}")
+            sent = send_file(sock, filepath, filename, name, room, streams, dedup)
+            break
+        except OSError as e:
+            if attempt == retries:
+                raise
+            print(f"Transfer interrupted ({e}), retrying in {RETRY_DELAY}s")
+            time.sleep(RETRY_DELAY)
+        finally:
+            sock.close()
+    print(f"File sent successfully ({sent} bytes transferred)")
 
 if __name__ == '__main__':
     import argparse
@@ -61,5 +143,8 @@ if __name__ == '__main__':
     parser.add_argument('--path', required=True, help='Path to file to send')
     parser.add_argument('--name', default='sender')
     parser.add_argument('--room', default='default')
+    parser.add_argument('--streams', type=int, default=1, help='Parallel connections for the file data')
+    parser.add_argument('--retries', type=int, default=0, help='Reconnect and resume this many times after a dropped connection')
+    parser.add_argument('--dedup', action='store_true', help='Skip chunks the receiver already holds')
     args = parser.parse_args()
-    main(args.host, args.port, args.path, args.name, args.room)
\ No newline at end of file
+    main(args.host, args.port, args.path, args.name, args.room, args.streams, args.retries, args.dedup)
\ No newline at end of file
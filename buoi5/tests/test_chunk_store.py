@@ -0,0 +1,64 @@
+import io
+import itertools
+import os
+import random
+import pytest
+from app import chunk_store
+from app.chunk_store import cdc_chunks, chunk_file, read_chunk, remember_file, CDC_MIN_BYTES, CDC_MAX_BYTES
+
+@pytest.fixture
+def inbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_store, 'INDEX_PATH', str(tmp_path / '.chunks.json'))
+    monkeypatch.setattr(chunk_store, '_index', None)
+    return tmp_path
+
+def test_cdc_chunks_cover_file():
+    data = os.urandom(3_000_000)
+    chunks = list(cdc_chunks(io.BytesIO(data)))
+    assert sum(length for _, length in chunks) == len(data)
+    assert all(CDC_MIN_BYTES <= length <= CDC_MAX_BYTES for _, length in chunks[:-1])
+
+def test_cdc_chunks_survive_insertion():
+    data = os.urandom(3_000_000)
+    edited = data[:1_500_000] + b'inserted' + data[1_500_000:]
+    before = {sha256 for sha256, _ in cdc_chunks(io.BytesIO(data))}
+    after = list(cdc_chunks(io.BytesIO(edited)))
+    changed = [length for sha256, length in after if sha256 not in before]
+    assert sum(changed) <= 2 * CDC_MAX_BYTES
+
+def test_cdc_chunks_survive_insertion_in_text():
+    rng = random.Random(1)
+    words = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 9))) for _ in range(2000)]
+    text = ' '.join(rng.choice(words) for _ in range(500_000)).encode()[:3_000_000]
+    edited = text[:1_500_000] + b'x' * 100 + text[1_500_000:]
+    before = list(cdc_chunks(io.BytesIO(text)))
+    after = list(cdc_chunks(io.BytesIO(edited)))
+    assert all(length < CDC_MAX_BYTES for _, length in before[:-1])
+    # Every chunk after the one holding the edit is unchanged
+    ends = list(itertools.accumulate(length for _, length in before))
+    edited_chunk = next(i for i, end in enumerate(ends) if end > 1_500_000)
+    unchanged = before[edited_chunk + 1:]
+    assert len(unchanged) > 5
+    assert after[-len(unchanged):] == unchanged
+    changed = [length for sha256, length in after if sha256 not in {sha256 for sha256, _ in before}]
+    assert sum(changed) <= 2 * CDC_MAX_BYTES
+
+def test_store_reads_verified_chunks(inbox):
+    path = inbox / 'file.bin'
+    path.write_bytes(os.urandom(500_000))
+    chunks, _ = chunk_file(str(path))
+    remember_file('file.bin', chunks)
+    sha256, length = chunks[1]
+    offset = chunks[0][1]
+    assert read_chunk(sha256, length) == path.read_bytes()[offset:offset + length]
+    assert read_chunk('0' * 64, length) is None
+    path.write_bytes(b'\0' * 500_000)  # the file changed since it was indexed
+    assert read_chunk(sha256, length) is None
+
+def test_remember_file_leaves_no_temp_files(inbox):
+    remember_file('a.bin', [['aa', 10]])
+    remember_file('b.bin', [['bb', 20]])
+    assert sorted(p.name for p in inbox.iterdir()) == ['.chunks.json']
+    chunk_store._index = None
+    assert read_chunk('bb', 20) is None  # reloaded from disk, but b.bin itself is missing
+    assert chunk_store._index == {'a.bin': [['aa', 10]], 'b.bin': [['bb', 20]]}
\ No newline at end of file
@@ -1,6 +1,12 @@
 import pytest
+import asyncio
 import hashlib
-from app.common import build_chat, build_file_meta, build_file_chunk, build_ack, build_ping, build_pong
+import socket
+import uuid
+from app.common import build_chat, build_file_meta, build_file_chunk, build_file_end, build_range_end, build_chunk_list, build_ack, build_ping, build_pong
+from app.common import send_msg, recv_frame, send_file_chunk, recv_frame_async, send_file_chunk_async, split_ranges, split_missing, split_work, file_resume_key, MAX_CHUNK_DATA
+from app.common import sendall_vectored, hash_range, send_msg_async, pack_chunk_header
+import io
 
 def test_build_chat():
     msg = build_chat("hello", "alice", "room1")
@@ -19,6 +25,7 @@ def test_build_file_meta():
     assert msg['sha256'] == 'sha256hash'
     assert msg['from'] == 'bob'
     assert msg['room'] == 'room1'
+    assert msg['encoding'] == 'base64'
 
 def test_build_file_chunk():
     msg = build_file_chunk(0, "b64data", "charlie", "room1", "corr123")
@@ -28,6 +35,61 @@ def test_build_file_chunk():
     assert msg['from'] == 'charlie'
     assert msg['corr_id'] == 'corr123'
 
+def test_build_file_end():
+    msg = build_file_end("sha256hash", "charlie", "room1", "corr123")
+    assert msg['type'] == 'file_end'
+    assert msg['sha256'] == 'sha256hash'
+    assert msg['corr_id'] == 'corr123'
+    assert msg['from'] == 'charlie'
+
+def test_build_range_end():
+    msg = build_range_end(65536, 1024, "charlie", "room1", "corr123")
+    assert msg['type'] == 'range_end'
+    assert msg['offset'] == 65536
+    assert msg['length'] == 1024
+    assert msg['corr_id'] == 'corr123'
+
+def test_split_ranges():
+    size = 10 * 65536 + 123
+    ranges = split_ranges(size, 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0
+    assert sum(length for _, length in ranges) == size
+    for (offset, length), (next_offset, _) in zip(ranges, ranges[1:]):
+        assert offset + length == next_offset
+        assert next_offset % 65536 == 0
+    assert split_ranges(100, 8) == [(0, 100)]
+    assert split_ranges(0, 4) == []
+
+def test_split_missing():
+    missing = [[0, 4 * 65536], [10 * 65536, 12 * 65536 + 7]]
+    pieces = split_missing(missing, 4)
+    assert sum(length for _, length in pieces) == 16 * 65536 + 7
+    assert pieces[0] == (0, 4 * 65536)
+    assert all(offset >= 10 * 65536 for offset, _ in pieces[1:])
+    assert len(pieces) == 4
+
+def test_split_work():
+    missing = [[i * 4 * 65536, 1000] for i in range(1000)]
+    work = split_work(missing, 4)
+    assert len(work) == 4
+    assert [piece for pieces in work for piece in pieces] == [tuple(gap) for gap in missing]
+    assert all(len(pieces) == 250 for pieces in work)
+    assert split_work([[0, 10 * 65536]], 4) == [[piece] for piece in split_missing([[0, 10 * 65536]], 4)]
+    assert split_work([[0, 100]], 4) == [[(0, 100)]]
+
+def test_file_resume_key():
+    key = file_resume_key("file.bin", 100, 123456789)
+    assert len(key) == 32
+    assert key == file_resume_key("file.bin", 100, 123456789)
+    assert key != file_resume_key("file.bin", 100, 123456790)
+
+def test_build_chunk_list():
+    msg = build_chunk_list([["aa", 10], ["bb", 20]], "charlie", "room1", "corr123")
+    assert msg['type'] == 'chunk_list'
+    assert msg['chunks'] == [["aa", 10], ["bb", 20]]
+    assert msg['corr_id'] == 'corr123'
+
 def test_build_ack():
     msg = build_ack(True, "corr123", "error msg", "dave")
     assert msg['type'] == 'ack'
@@ -53,4 +115,90 @@ def test_build_pong():
 def test_sha256():
     data = b"hello world"
     expected = "b94d27b9934d3e08a52e52d7da7dabfac484efe37a5380ee9088f7ace2efcde9"
-    assert hashlib.sha256(data).hexdigest() == expected
\ No newline at end of file
+    assert hashlib.sha256(data).hexdigest() == expected
+
+def test_binary_chunk_frames_between_json():
+    corr_id = str(uuid.uuid4())
+    data = bytes(range(256)) * 300
+    a, b = socket.socketpair()
+    with a, b:
+        send_msg(a, build_chat("before", "alice"))
+        send_file_chunk(a, corr_id, 1 << 33, data)
+        send_msg(a, build_chat("after", "alice"))
+        buf = bytearray(MAX_CHUNK_DATA)
+        assert recv_frame(b, buf)['text'] == "before"
+        chunk = recv_frame(b, buf)
+        assert chunk['type'] == 'file_chunk'
+        assert chunk['corr_id'] == corr_id
+        assert chunk['offset'] == 1 << 33
+        assert bytes(chunk['data']) == data
+        assert chunk['data'].obj is buf
+        assert recv_frame(b, buf)['text'] == "after"
+
+def test_sendall_vectored_partial_sends():
+    class TrickleSocket:
+        def __init__(self):
+            self.out = bytearray()
+        def sendmsg(self, buffers):
+            # Accept at most 5 bytes per call, possibly splitting a buffer
+            data = b''.join(bytes(b) for b in buffers)[:5]
+            self.out += data
+            return len(data)
+    sock = TrickleSocket()
+    sendall_vectored(sock, [b"header", b"", memoryview(b"payload bytes")])
+    assert bytes(sock.out) == b"headerpayload bytes"
+
+def test_hash_range():
+    data = bytes(range(256)) * 1000
+    sha256 = hashlib.sha256()
+    hash_range(io.BytesIO(data), 100, 5000, sha256, block_size=1024)
+    assert sha256.hexdigest() == hashlib.sha256(data[100:5100]).hexdigest()
+    with pytest.raises(Exception):
+        hash_range(io.BytesIO(data), len(data) - 10, 20, hashlib.sha256())
+
+def test_binary_chunk_too_large():
+    a, b = socket.socketpair()
+    with a, b, pytest.raises(ValueError):
+        send_file_chunk(a, str(uuid.uuid4()), 0, bytes(MAX_CHUNK_DATA + 1))
+
+def test_binary_chunk_frames_async():
+    async def scenario():
+        corr_id = str(uuid.uuid4())
+        a, b = socket.socketpair()
+        reader, reader_side = await asyncio.open_connection(sock=b)
+        _, writer = await asyncio.open_connection(sock=a)
+        await send_file_chunk_async(writer, corr_id, 65536, b"payload")
+        chunk = await recv_frame_async(reader)
+        writer.close()
+        reader_side.close()
+        return corr_id, chunk
+    corr_id, chunk = asyncio.run(scenario())
+    assert chunk['corr_id'] == corr_id
+    assert chunk['offset'] == 65536
+    assert chunk['data'] == b"payload"
+
+def test_binary_chunk_frames_async_reuse_buffer():
+    data = bytes(range(256)) * (MAX_CHUNK_DATA // 256)
+    async def scenario():
+        corr_id = str(uuid.uuid4())
+        a, b = socket.socketpair()
+        reader, reader_side = await asyncio.open_connection(sock=b)
+        _, writer = await asyncio.open_connection(sock=a)
+        buf = bytearray(MAX_CHUNK_DATA)
+        received = []
+        for offset in (0, len(data)):
+            _, chunk = await asyncio.gather(send_file_chunk_async(writer, corr_id, offset, data),
+                                            recv_frame_async(reader, buf))
+            assert chunk['data'].obj is buf
+            received.append(bytes(chunk['data']))
+        await send_msg_async(writer, build_chat("after", "alice"))
+        after = await recv_frame_async(reader, buf)
+        writer.write(pack_chunk_header(corr_id, 0, 10) + b"short")
+        writer.close()
+        with pytest.raises(asyncio.IncompleteReadError):
+            await recv_frame_async(reader, buf)
+        reader_side.close()
+        return received, after
+    received, after = asyncio.run(scenario())
+    assert received == [data, data]
+    assert after['text'] == "after"
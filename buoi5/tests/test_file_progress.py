@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app import file_progress
+from app.file_progress import add_range, missing_ranges, received_bytes, covers, limit_ranges
+from app.file_progress import load_progress, save_progress, discard_progress
+
+@pytest.fixture
+def partial_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_progress, 'PARTIAL_DIR', str(tmp_path))
+    return tmp_path
+
+def test_add_range_merges():
+    ranges = []
+    add_range(ranges, 100, 50)
+    add_range(ranges, 0, 50)
+    assert ranges == [[0, 50], [100, 150]]
+    add_range(ranges, 50, 50)
+    assert ranges == [[0, 150]]
+    add_range(ranges, 300, 10)
+    add_range(ranges, 140, 170)
+    assert ranges == [[0, 310]]
+
+def test_missing_ranges():
+    ranges = [[0, 50], [100, 150]]
+    assert missing_ranges(ranges, 200) == [[50, 50], [150, 50]]
+    assert missing_ranges([], 10) == [[0, 10]]
+    assert missing_ranges([[0, 10]], 10) == []
+    assert received_bytes(ranges) == 100
+    assert covers(ranges, 100, 50)
+    assert not covers(ranges, 40, 20)
+
+def test_limit_ranges():
+    missing = [[i * 100000, 10] for i in range(100)]
+    limited = limit_ranges(missing, 10)
+    assert len(limited) <= 10
+    assert limited[0][0] == 0
+    assert limited[-1][0] + limited[-1][1] == 99 * 100000 + 10
+    assert limit_ranges(missing, 100) == missing
+
+def test_progress_roundtrip(partial_dir):
+    key = 'a' * 32
+    (partial_dir / (key + '.part')).write_bytes(b'x' * 10)
+    save_progress(key, 'file.bin', 200, [[0, 10]])
+    assert load_progress(key, 'file.bin', 200) == [[0, 10]]
+    assert load_progress(key, 'file.bin', 300) is None
+    assert load_progress(key, 'other.bin', 200) is None
+    discard_progress(key)
+    assert load_progress(key, 'file.bin', 200) is None
+    assert list(partial_dir.iterdir()) == []
+
+def test_overlapping_saves(partial_dir):
+    key = 'b' * 32
+    (partial_dir / (key + '.part')).write_bytes(b'')
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: save_progress(key, 'file.bin', 1000, [[0, i]]), range(1, 200)))
+    assert load_progress(key, 'file.bin', 1000)[0][0] == 0
+    assert sorted(p.name for p in partial_dir.iterdir()) == [key + '.json', key + '.part']
\ No newline at end of file
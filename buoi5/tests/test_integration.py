@@ -1,8 +1,15 @@
+import hashlib
+import json
+import os
+import re
 import subprocess
+import sys
 import time
 import socket
 import threading
-from app.common import send_msg, recv_msg, build_chat
+import pytest
+from app.common import send_msg, recv_msg, build_chat, build_file_meta, send_file_chunk, file_resume_key, MAX_CHUNK_DATA
+from app.chunk_store import CDC_MAX_BYTES
 
 def test_integration():
     # Start sync server in subprocess
@@ -21,6 +28,92 @@ def test_integration():
     server.wait()
     assert True  # Placeholder
 
-def test_file_transfer():
-    # Placeholder for file transfer test
-    assert True
\ No newline at end of file
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+PAIRS = [('sync', 'sync'), ('async', 'async'), ('sync', 'async'), ('async', 'sync')]
+FILE_BYTES = 3_000_000
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def receiver(request, tmp_path):
+    """Start a file receiver in tmp_path, whose inbox is tmp_path/inbox, and return its port."""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(APP_DIR, f'{request.param}_file_receiver.py'),
+                                '--host', '127.0.0.1', '--port', str(port)],
+                               cwd=tmp_path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    yield port
+    process.terminate()
+    process.wait()
+
+def send(kind, port, path, *args):
+    """Run a file sender to completion and return how many bytes it put on the wire."""
+    result = subprocess.run([sys.executable, os.path.join(APP_DIR, f'{kind}_file_sender.py'),
+                             '--port', str(port), '--path', str(path), *args],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return int(re.search(r'\((\d+) bytes transferred\)', result.stdout).group(1))
+
+def assert_received(tmp_path, path):
+    received = tmp_path / 'inbox' / path.name
+    assert hashlib.sha256(received.read_bytes()).hexdigest() == hashlib.sha256(path.read_bytes()).hexdigest()
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'outbox' / 'file.bin'
+    path.parent.mkdir()
+    path.write_bytes(os.urandom(FILE_BYTES))
+    return path
+
+@pytest.mark.parametrize('receiver,sender', PAIRS, indirect=['receiver'])
+def test_file_transfer(receiver, sender, source, tmp_path):
+    assert send(sender, receiver, source) == FILE_BYTES
+    assert_received(tmp_path, source)
+
+@pytest.mark.parametrize('receiver,sender', PAIRS, indirect=['receiver'])
+def test_file_transfer_streams(receiver, sender, source, tmp_path):
+    assert send(sender, receiver, source, '--streams', '4') == FILE_BYTES
+    assert_received(tmp_path, source)
+
+@pytest.mark.parametrize('receiver,sender', PAIRS, indirect=['receiver'])
+def test_file_transfer_resume(receiver, sender, source, tmp_path):
+    # Send the first half by hand and drop the connection, like an interrupted sender
+    half = FILE_BYTES // 2
+    stat = os.stat(source)
+    key = file_resume_key(source.name, stat.st_size, stat.st_mtime_ns)
+    meta = build_file_meta(source.name, stat.st_size, None, 'tester', encoding='binary', resume_key=key)
+    data = source.read_bytes()
+    with socket.create_connection(('127.0.0.1', receiver)) as sock:
+        send_msg(sock, meta)
+        assert recv_msg(sock)['ok']
+        for offset in range(0, half, MAX_CHUNK_DATA):
+            send_file_chunk(sock, meta['corr_id'], offset, data[offset:min(offset + MAX_CHUNK_DATA, half)])
+    index = tmp_path / 'inbox' / '.partial' / (key + '.json')
+    deadline = time.monotonic() + 10
+    while not (index.exists() and json.loads(index.read_text())['ranges'] == [[0, half]]):
+        assert time.monotonic() < deadline, 'receiver did not save the partial transfer'
+        time.sleep(0.05)
+
+    assert send(sender, receiver, source, '--streams', '2') == FILE_BYTES - half
+    assert_received(tmp_path, source)
+    assert not index.exists()
+
+@pytest.mark.parametrize('receiver,sender', PAIRS, indirect=['receiver'])
+def test_file_transfer_dedup(receiver, sender, source, tmp_path):
+    assert send(sender, receiver, source, '--dedup') == FILE_BYTES
+    edited = bytearray(source.read_bytes())
+    edited[FILE_BYTES // 2:FILE_BYTES // 2] = b'inserted'
+    source.write_bytes(edited)
+    assert send(sender, receiver, source, '--dedup', '--streams', '2') < 4 * CDC_MAX_BYTES
+    assert_received(tmp_path, source)
\ No newline at end of file